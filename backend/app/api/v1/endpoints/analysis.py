@@ -1,15 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
-import time
+import uuid
 from datetime import datetime
 
-from app.services.llm_service import llm_service
+from app.services.llm_service import analysis_outcome, llm_service
 from app.services.reference_range_service import reference_range_service
-from app.core.security import get_current_user
+from app.services.admission_control import admission_controller, AdmissionRejected
+from app.services.analysis_job_service import analysis_job_queue, QueueFullError
+from app.services.analysis_persistence_service import analysis_writer, build_analysis_record
+from app.services.trend_service import trend_service
+from app.models.database import AnalysisType
+from app.core import metrics
+from app.core.http_cache import cached_response
+from app.core.config import settings
+from app.core.security import get_current_user, require_admin_token
 from app.models.user import User
 
 router = APIRouter()
@@ -21,6 +32,12 @@ class TestResult(BaseModel):
     unit: str
     reference_range: Optional[str] = None
     status: Optional[str] = None  # normal, high, low, critical
+    test_date: Optional[datetime] = None
+    
+    @field_serializer('test_date', when_used='unless-none')
+    def serialize_test_date(self, test_date: datetime) -> str:
+        # dict() çıktısı JSON'a (kuyruk, önbellek, veritabanı) doğrudan yazılabilsin
+        return test_date.isoformat()
 
 class PatientInfo(BaseModel):
     age: int
@@ -37,18 +54,56 @@ class BloodTestRequest(BaseModel):
     symptoms: Optional[List[str]] = []
     previous_results: Optional[List[TestResult]] = []
 
+class BatchPanel(BloodTestRequest):
+    panel_id: Optional[str] = None
+
+class BatchAnalysisRequest(BaseModel):
+    panels: List[BatchPanel]
+
+class PatientTestResultsRequest(BaseModel):
+    test_results: List[TestResult]
+
 class AnalysisResponse(BaseModel):
     analysis_id: str
     status: str
     results: Dict
     created_at: str
 
+class AnalysisJobResponse(BaseModel):
+    analysis_id: str
+    status: str
+    analysis_type: str
+    created_at: str
+
 class ReferenceRangeResponse(BaseModel):
     test_name: str
     reference_range: Dict
     evaluation: Dict
 
-@router.post("/analyze/blood-test", response_model=AnalysisResponse)
+async def admit_request(user_id, analysis_type: str, cost: int = 1, hold_slot: bool = True, quota: str = 'request'):
+    """Kabul kontrolünü uygular; reddedilen istek 429/503 ve Retry-After ile döner"""
+    try:
+        return await admission_controller.acquire(user_id, analysis_type, cost=cost, hold_slot=hold_slot, quota=quota)
+    except AdmissionRejected as e:
+        logger.info(f"İstek reddedildi ({e.reason}) - {analysis_type} - Kullanıcı: {user_id}")
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+def admission(analysis_type: str):
+    """
+    LLM uç noktaları için kabul kontrolü bağımlılığı
+
+    Slot, yanıt (akışlı yanıtlarda akışın sonu dahil) tamamlanınca bırakılır.
+    """
+    async def dependency(current_user: User = Depends(get_current_user)):
+        ticket = await admit_request(current_user.id, analysis_type)
+        try:
+            yield
+        finally:
+            await admission_controller.release(ticket)
+    return dependency
+
+@router.post("/analyze/blood-test", response_model=AnalysisResponse, dependencies=[Depends(admission(AnalysisType.BLOOD_TEST))])
 async def analyze_blood_test(
     request: BloodTestRequest,
     background_tasks: BackgroundTasks,
@@ -58,6 +113,7 @@ async def analyze_blood_test(
     Kan tahlili sonuçlarını AI ile analiz eder
     """
     try:
+        metrics.observe_request_parsing(AnalysisType.BLOOD_TEST)
         logger.info(f"Kan tahlili analizi başlatıldı - Kullanıcı: {current_user.id}")
         
         # Test sonuçlarını dict formatına çevir
@@ -69,17 +125,25 @@ async def analyze_blood_test(
             test_results=test_results,
             patient_info=patient_info
         )
+        if request.previous_results:
+            analysis_result['trends'] = trend_service.compare_results(
+                current_results=test_results,
+                previous_results=[result.dict() for result in request.previous_results]
+            )
+        analysis_id = f"analysis_{uuid.uuid4().hex}"
         
         # Background task olarak veritabanına kaydet
         background_tasks.add_task(
             save_analysis_to_db,
+            analysis_id=analysis_id,
             user_id=current_user.id,
             analysis_result=analysis_result,
-            test_data={"test_results": test_results, "patient_info": patient_info}
+            test_data={"test_results": test_results, "patient_info": patient_info},
+            processing_time=metrics.request_elapsed()
         )
         
         return AnalysisResponse(
-            analysis_id=f"analysis_{current_user.id}_{int(time.time())}",
+            analysis_id=analysis_id,
             status="completed",
             results=analysis_result,
             created_at=datetime.now().isoformat()
@@ -89,15 +153,117 @@ async def analyze_blood_test(
         logger.error(f"Kan tahlili analizi hatası: {e}")
         raise HTTPException(status_code=500, detail="Analiz sırasında bir hata oluştu")
 
-@router.post("/analyze/risk-assessment", response_model=Dict)
+@router.post("/analyze/blood-test/stream", dependencies=[Depends(admission(AnalysisType.BLOOD_TEST))])
+async def stream_blood_test_analysis(
+    request: BloodTestRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Kan tahlili analizini Server-Sent Events olarak akıtır
+    
+    Referans değerlendirmesi hemen gönderilir, LLM çıktısı geldikçe akar.
+    """
+    metrics.observe_request_parsing(AnalysisType.BLOOD_TEST)
+    logger.info(f"Akışlı kan tahlili analizi başlatıldı - Kullanıcı: {current_user.id}")
+    
+    test_results = [result.dict() for result in request.test_results]
+    patient_info = request.patient_info.dict()
+    
+    async def event_stream():
+        async for event, data in llm_service.stream_blood_test_analysis(
+            test_results=test_results,
+            patient_info=patient_info
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/analyze/batch", dependencies=[Depends(admission(AnalysisType.BLOOD_TEST))])
+async def analyze_blood_test_batch(
+    request: BatchAnalysisRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Çok sayıda kan tahlili panelini analiz eder
+    
+    Sonuçlar NDJSON olarak, her panel tamamlandıkça gönderilir. LLM analizi
+    yapılamayıp fallback yanıtı dönen panelin durumu 'failed' olur. Her panel
+    sonucu kaydedilir; analysis_id ile GET /analysis/{analysis_id} sorgulanabilir.
+    """
+    if len(request.panels) > settings.BATCH_MAX_PANELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Tek istekte en fazla {settings.BATCH_MAX_PANELS} panel gönderilebilir"
+        )
+    
+    # İstek bağımlılıkta bir jeton harcadı; paneller ayrı toplu kotadan düşülür
+    await admit_request(current_user.id, AnalysisType.BLOOD_TEST, cost=len(request.panels), hold_slot=False, quota='batch')
+    
+    metrics.observe_request_parsing(AnalysisType.BLOOD_TEST)
+    logger.info(f"Toplu analiz başlatıldı - {len(request.panels)} panel - Kullanıcı: {current_user.id}")
+    
+    panels = [
+        {
+            "test_results": [result.dict() for result in panel.test_results],
+            "patient_info": panel.patient_info.dict()
+        }
+        for panel in request.panels
+    ]
+    
+    async def ndjson_stream():
+        # Bağımlılığın tuttuğu slota ek olarak her paralel panel için bir slot alınır;
+        # eşzamanlılık kullanıcı ve öncelik sınıfının kalan payını aşmaz
+        wanted = min(settings.BATCH_LLM_CONCURRENCY, len(panels))
+        extra_tickets = await admission_controller.acquire_extra_slots(current_user.id, AnalysisType.BLOOD_TEST, wanted - 1)
+        concurrency = wanted if extra_tickets is None else len(extra_tickets) + 1
+        try:
+            async for index, analysis_result in llm_service.analyze_blood_test_batch(
+                panels, max_concurrency=concurrency
+            ):
+                analysis_id = f"analysis_{uuid.uuid4().hex}"
+                await save_analysis_to_db(
+                    analysis_id=analysis_id,
+                    user_id=current_user.id,
+                    analysis_result=analysis_result,
+                    test_data=panels[index],
+                    processing_time=metrics.request_elapsed()
+                )
+                # Fallback yanıtı dönen paneller 'failed' olur; laboratuvar sistemi bunları yeniden gönderebilir
+                status, error_message = analysis_outcome(analysis_result)
+                yield json.dumps({
+                    "index": index,
+                    "panel_id": request.panels[index].panel_id,
+                    "analysis_id": analysis_id,
+                    "status": status,
+                    "error": error_message,
+                    "results": analysis_result,
+                    "created_at": datetime.now().isoformat()
+                }, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Toplu analiz hatası: {e}")
+            yield json.dumps({"status": "error", "detail": "Toplu analiz sırasında bir hata oluştu"}) + "\n"
+        finally:
+            for ticket in extra_tickets or []:
+                await admission_controller.release(ticket)
+    
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+@router.post("/analyze/risk-assessment", response_model=Dict, dependencies=[Depends(admission(AnalysisType.RISK_ASSESSMENT))])
 async def assess_health_risks(
     request: BloodTestRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
     """
     Sağlık risklerini değerlendirir
     """
     try:
+        metrics.observe_request_parsing(AnalysisType.RISK_ASSESSMENT)
         logger.info(f"Risk değerlendirmesi başlatıldı - Kullanıcı: {current_user.id}")
         
         test_results = [result.dict() for result in request.test_results]
@@ -107,9 +273,20 @@ async def assess_health_risks(
             test_results=test_results,
             patient_info=patient_info
         )
+        analysis_id = f"analysis_{uuid.uuid4().hex}"
+        background_tasks.add_task(
+            save_analysis_to_db,
+            analysis_id=analysis_id,
+            user_id=current_user.id,
+            analysis_result=risk_assessment,
+            test_data={"test_results": test_results, "patient_info": patient_info},
+            analysis_type=AnalysisType.RISK_ASSESSMENT,
+            processing_time=metrics.request_elapsed()
+        )
         
         return {
             "status": "success",
+            "analysis_id": analysis_id,
             "risk_assessment": risk_assessment,
             "timestamp": datetime.now().isoformat()
         }
@@ -118,15 +295,17 @@ async def assess_health_risks(
         logger.error(f"Risk değerlendirmesi hatası: {e}")
         raise HTTPException(status_code=500, detail="Risk değerlendirmesi sırasında bir hata oluştu")
 
-@router.post("/analyze/doctor-insights", response_model=Dict)
+@router.post("/analyze/doctor-insights", response_model=Dict, dependencies=[Depends(admission(AnalysisType.DOCTOR_INSIGHTS))])
 async def generate_doctor_insights(
     request: BloodTestRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
     """
     Doktorlar için klinik değerlendirme desteği
     """
     try:
+        metrics.observe_request_parsing(AnalysisType.DOCTOR_INSIGHTS)
         logger.info(f"Doktor insights oluşturuluyor - Kullanıcı: {current_user.id}")
         
         test_results = [result.dict() for result in request.test_results]
@@ -137,9 +316,20 @@ async def generate_doctor_insights(
             symptoms=request.symptoms or [],
             patient_info=patient_info
         )
+        analysis_id = f"analysis_{uuid.uuid4().hex}"
+        background_tasks.add_task(
+            save_analysis_to_db,
+            analysis_id=analysis_id,
+            user_id=current_user.id,
+            analysis_result=doctor_insights,
+            test_data={"test_results": test_results, "patient_info": patient_info, "symptoms": request.symptoms or []},
+            analysis_type=AnalysisType.DOCTOR_INSIGHTS,
+            processing_time=metrics.request_elapsed()
+        )
         
         return {
             "status": "success",
+            "analysis_id": analysis_id,
             "doctor_insights": doctor_insights,
             "timestamp": datetime.now().isoformat()
         }
@@ -148,15 +338,102 @@ async def generate_doctor_insights(
         logger.error(f"Doktor insights hatası: {e}")
         raise HTTPException(status_code=500, detail="Doktor insights oluşturulurken bir hata oluştu")
 
-@router.post("/analyze/patient-education", response_model=Dict)
+@router.post("/analyze/full", response_model=Dict, dependencies=[Depends(admission(AnalysisType.FULL))])
+async def analyze_full(
+    request: BloodTestRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Kan tahlili, risk değerlendirmesi ve doktor insights'ı tek istekte üretir
+    """
+    try:
+        metrics.observe_request_parsing(AnalysisType.FULL)
+        logger.info(f"Birleşik analiz başlatıldı - Kullanıcı: {current_user.id}")
+        
+        test_results = [result.dict() for result in request.test_results]
+        patient_info = request.patient_info.dict()
+        
+        full_analysis = await llm_service.analyze_full(
+            test_results=test_results,
+            symptoms=request.symptoms or [],
+            patient_info=patient_info
+        )
+        analysis_id = f"analysis_{uuid.uuid4().hex}"
+        background_tasks.add_task(
+            save_analysis_to_db,
+            analysis_id=analysis_id,
+            user_id=current_user.id,
+            analysis_result=full_analysis,
+            test_data={"test_results": test_results, "patient_info": patient_info, "symptoms": request.symptoms or []},
+            analysis_type=AnalysisType.FULL,
+            processing_time=metrics.request_elapsed()
+        )
+        
+        return {
+            "status": "partial" if full_analysis["failed_analyses"] else "success",
+            "analysis_id": analysis_id,
+            "analysis": full_analysis,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Birleşik analiz hatası: {e}")
+        raise HTTPException(status_code=500, detail="Birleşik analiz sırasında bir hata oluştu")
+
+@router.post("/analyze/jobs/{analysis_type}", response_model=AnalysisJobResponse, status_code=202)
+async def submit_analysis_job(
+    analysis_type: str,
+    request: BloodTestRequest,
+    priority: int = Query(5, ge=0, le=9, description="Küçük değer önce işlenir"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Analizi kuyruğa alır; sonuç GET /analysis/{analysis_id} ile sorgulanır
+    """
+    if analysis_type not in analysis_job_queue.analysis_types:
+        raise HTTPException(status_code=404, detail=f"Desteklenmeyen analiz türü: {analysis_type}")
+    
+    # İşler worker havuzunda çalışır; burada yalnızca hız sınırı uygulanır
+    await admit_request(current_user.id, analysis_type, hold_slot=False)
+    
+    try:
+        job = await analysis_job_queue.submit(
+            user_id=current_user.id,
+            analysis_type=analysis_type,
+            input_data={
+                "test_results": [result.dict() for result in request.test_results],
+                "patient_info": request.patient_info.dict(),
+                "symptoms": request.symptoms or []
+            },
+            priority=priority
+        )
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Analiz kuyruğu dolu, lütfen daha sonra tekrar deneyin",
+                            headers={"Retry-After": "5"})
+    except Exception as e:
+        logger.error(f"Analiz işi kuyruğa alınamadı: {e}")
+        raise HTTPException(status_code=500, detail="Analiz işi oluşturulurken bir hata oluştu")
+    
+    logger.info(f"Analiz işi kuyruğa alındı - {job['analysis_id']} - Kullanıcı: {current_user.id}")
+    return AnalysisJobResponse(
+        analysis_id=job['analysis_id'],
+        status=job['status'],
+        analysis_type=analysis_type,
+        created_at=job['created_at']
+    )
+
+@router.post("/analyze/patient-education", response_model=Dict, dependencies=[Depends(admission(AnalysisType.PATIENT_EDUCATION))])
 async def generate_patient_education(
     request: Dict,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
     """
     Hasta eğitim materyali oluşturur
     """
     try:
+        metrics.observe_request_parsing(AnalysisType.PATIENT_EDUCATION)
         logger.info(f"Hasta eğitimi oluşturuluyor - Kullanıcı: {current_user.id}")
         
         diagnosis = request.get("diagnosis", "")
@@ -168,9 +445,20 @@ async def generate_patient_education(
             treatment_plan=treatment_plan,
             patient_language=patient_language
         )
+        analysis_id = f"analysis_{uuid.uuid4().hex}"
+        background_tasks.add_task(
+            save_analysis_to_db,
+            analysis_id=analysis_id,
+            user_id=current_user.id,
+            analysis_result=education_material,
+            test_data={"diagnosis": diagnosis, "treatment_plan": treatment_plan, "patient_language": patient_language},
+            analysis_type=AnalysisType.PATIENT_EDUCATION,
+            processing_time=metrics.request_elapsed()
+        )
         
         return {
             "status": "success",
+            "analysis_id": analysis_id,
             "education_material": education_material,
             "language": patient_language,
             "timestamp": datetime.now().isoformat()
@@ -189,7 +477,19 @@ async def get_analysis_result(
     Daha önce yapılan analiz sonucunu getirir
     """
     try:
-        # Veritabanından analiz sonucunu getir
+        # Önce iş kuyruğu kaydına, sonra veritabanına bak
+        job = await analysis_job_queue.get_job(analysis_id, current_user.id)
+        if job:
+            return {
+                "status": job['status'],
+                "analysis_id": job['analysis_id'],
+                "analysis_type": job['analysis_type'],
+                "analysis": job['output_data'],
+                "error": job['error_message'],
+                "created_at": job['created_at'],
+                "completed_at": job['completed_at']
+            }
+        
         analysis_result = await get_analysis_from_db(analysis_id, current_user.id)
         
         if not analysis_result:
@@ -200,10 +500,85 @@ async def get_analysis_result(
             "analysis": analysis_result
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analiz sonucu getirme hatası: {e}")
         raise HTTPException(status_code=500, detail="Analiz sonucu getirilirken bir hata oluştu")
 
+@router.post("/analyze/trends", response_model=Dict)
+async def analyze_trends(
+    request: BloodTestRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Güncel ve önceki sonuçlardan test bazında trend hesaplar
+    """
+    try:
+        trends = trend_service.compare_results(
+            current_results=[result.dict() for result in request.test_results],
+            previous_results=[result.dict() for result in request.previous_results or []]
+        )
+        return {
+            "status": "success",
+            "trends": trends,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Trend analizi hatası: {e}")
+        raise HTTPException(status_code=500, detail="Trend analizi sırasında bir hata oluştu")
+
+@router.post("/patients/{patient_id}/test-results", response_model=Dict, status_code=201)
+async def record_patient_test_results(
+    patient_id: int,
+    request: PatientTestResultsRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Hasta test sonuçlarını kaydeder ve trend özetlerini günceller
+    """
+    try:
+        recorded = await trend_service.record_test_results(
+            patient_id=patient_id,
+            results=[result.dict() for result in request.test_results]
+        )
+        return {"status": "success", "recorded": recorded}
+    except Exception as e:
+        logger.error(f"Test sonucu kayıt hatası: {e}")
+        raise HTTPException(status_code=500, detail="Test sonuçları kaydedilirken bir hata oluştu")
+
+@router.get("/patients/{patient_id}/trends", response_model=Dict)
+async def get_patient_trends(
+    patient_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Hastanın tüm testleri için trend özetini getirir
+    """
+    try:
+        trends = await trend_service.get_patient_trends(patient_id)
+        return {"status": "success", "patient_id": patient_id, "trends": trends}
+    except Exception as e:
+        logger.error(f"Trend getirme hatası: {e}")
+        raise HTTPException(status_code=500, detail="Trendler getirilirken bir hata oluştu")
+
+@router.get("/patients/{patient_id}/trends/{test_name}", response_model=Dict)
+async def get_patient_test_history(
+    patient_id: int,
+    test_name: str,
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Bir testin son sonuçlarını zaman sırasıyla getirir
+    """
+    try:
+        history = await trend_service.get_test_history(patient_id, test_name, limit=limit)
+        return {"status": "success", "patient_id": patient_id, "test_name": test_name, "history": history}
+    except Exception as e:
+        logger.error(f"Test geçmişi getirme hatası: {e}")
+        raise HTTPException(status_code=500, detail="Test geçmişi getirilirken bir hata oluştu")
+
 @router.post("/evaluate-test", response_model=ReferenceRangeResponse)
 async def evaluate_single_test(
     test_name: str,
@@ -244,49 +619,84 @@ async def evaluate_single_test(
         logger.error(f"Test değerlendirme hatası: {e}")
         raise HTTPException(status_code=500, detail="Test değerlendirmesi sırasında bir hata oluştu")
 
+@router.get("/reference-ranges/version", response_model=Dict)
+async def get_reference_ranges_version():
+    """
+    Kullanılan referans aralığı setinin sürümünü döndürür
+    """
+    return {"version": reference_range_service.version}
+
+@router.post("/reference-ranges/reload", response_model=Dict, dependencies=[Depends(require_admin_token)])
+async def reload_reference_ranges(current_user: User = Depends(get_current_user)):
+    """
+    Referans aralıklarını dosyadan yeniden yükler (yeniden başlatma gerekmez)
+    
+    X-Admin-Token başlığında ADMIN_API_TOKEN gerekir.
+    
+    Yeni sürüm doğrulanır ve istek yolunun dışında derlenir; geçersizse
+    mevcut sürüm kullanılmaya devam eder. Diğer worker'lar değişikliği
+    dosya izleyicisi ile alır.
+    """
+    try:
+        result = await asyncio.to_thread(reference_range_service.reload)
+        logger.info(f"Referans aralıkları yeniden yüklendi - {result['version']} - Kullanıcı: {current_user.id}")
+        return {"status": "success", **result}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Referans aralıkları yeniden yükleme hatası: {e}")
+        raise HTTPException(status_code=500, detail="Referans aralıkları yeniden yüklenirken bir hata oluştu")
+
 @router.get("/reference-ranges/tests", response_model=List[Dict])
-async def get_available_tests():
+async def get_available_tests(request: Request):
     """
     Mevcut testleri listeler
+
+    Yanıt referans verisi sürümü başına bir kez kodlanır; ETag ile
+    koşullu istekler 304 döner, gzip Accept-Encoding'e göre seçilir.
     """
     try:
-        tests = reference_range_service.get_all_tests()
-        return tests
+        return cached_response(request, reference_range_service.catalog.tests, settings.REFERENCE_CACHE_MAX_AGE)
     except Exception as e:
         logger.error(f"Test listesi getirme hatası: {e}")
         raise HTTPException(status_code=500, detail="Test listesi getirilirken bir hata oluştu")
 
 @router.get("/reference-ranges/categories", response_model=List[str])
-async def get_test_categories():
+async def get_test_categories(request: Request):
     """
     Test kategorilerini listeler
     """
     try:
-        categories = list(reference_range_service.reference_data.get('blood_tests', {}).keys())
-        return categories
+        return cached_response(request, reference_range_service.catalog.categories, settings.REFERENCE_CACHE_MAX_AGE)
     except Exception as e:
         logger.error(f"Kategori listesi getirme hatası: {e}")
         raise HTTPException(status_code=500, detail="Kategori listesi getirilirken bir hata oluştu")
 
 @router.get("/reference-ranges/category/{category}", response_model=List[Dict])
-async def get_tests_by_category(category: str):
+async def get_tests_by_category(category: str, request: Request):
     """
     Kategoriye göre testleri listeler
     """
     try:
-        tests = reference_range_service.get_tests_by_category(category)
-        return tests
+        return cached_response(request, reference_range_service.catalog.category(category), settings.REFERENCE_CACHE_MAX_AGE)
     except Exception as e:
         logger.error(f"Kategori testleri getirme hatası: {e}")
         raise HTTPException(status_code=500, detail="Kategori testleri getirilirken bir hata oluştu")
 
 # Helper fonksiyonlar
-async def save_analysis_to_db(user_id: int, analysis_result: Dict, test_data: Dict):
-    """Analiz sonucunu veritabanına kaydeder"""
-    # TODO: Veritabanı kayıt işlemi
-    logger.info(f"Analiz sonucu veritabanına kaydedildi - Kullanıcı: {user_id}")
+async def save_analysis_to_db(analysis_id: str, user_id: int, analysis_result: Dict, test_data: Dict,
+                              analysis_type: str = AnalysisType.BLOOD_TEST, processing_time: Optional[float] = None):
+    """Analiz sonucunu toplu yazma tamponuna ekler"""
+    analysis_writer.enqueue(build_analysis_record(
+        analysis_id=analysis_id,
+        user_id=user_id,
+        analysis_type=analysis_type,
+        analysis_result=analysis_result,
+        test_data=test_data,
+        processing_time=processing_time
+    ))
+    logger.info(f"Analiz sonucu kayıt kuyruğuna alındı - {analysis_id} - Kullanıcı: {user_id}")
 
 async def get_analysis_from_db(analysis_id: str, user_id: int) -> Optional[Dict]:
     """Veritabanından analiz sonucunu getirir"""
-    # TODO: Veritabanı sorgu işlemi
-    return None 
\ No newline at end of file
+    return await analysis_writer.get(analysis_id, user_id) 
\ No newline at end of file
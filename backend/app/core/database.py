@@ -1,8 +1,77 @@
 import logging
+from typing import Optional
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.core.security import MOCK_USER_ID, MOCK_USERNAME
+from app.models.database import Base, User
 
 logger = logging.getLogger(__name__)
 
-async def init_db():
-    """Veritabanı başlatma (mock)"""
-    logger.info("Mock veritabanı başlatıldı")
-    return True 
\ No newline at end of file
+engine: Optional[AsyncEngine] = None
+async_session_factory: Optional[async_sessionmaker] = None
+
+def get_async_database_url(database_url: str) -> str:
+    """Senkron veritabanı URL'ini async sürücü URL'ine çevirir"""
+    if database_url.startswith("postgresql://"):
+        return database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if database_url.startswith("sqlite://"):
+        return database_url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return database_url
+
+def create_engine_from_settings() -> AsyncEngine:
+    """Ayarlara göre bağlantı havuzlu async engine oluşturur"""
+    url = get_async_database_url(settings.DATABASE_URL)
+    if url.startswith("sqlite"):
+        # SQLite dosya tabanlıdır, havuz boyutu ayarları uygulanmaz
+        return create_async_engine(url, echo=False)
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+
+def ensure_mock_user(connection):
+    """
+    Mock kimlik doğrulamanın kullanıcısını oluşturur
+
+    analyses.user_id users tablosuna yabancı anahtardır; kullanıcı yoksa
+    her analiz kaydı kısıt ihlaliyle reddedilirdi.
+    """
+    if connection.execute(select(User.id).where(User.id == MOCK_USER_ID)).first() is not None:
+        return
+    connection.execute(insert(User).values(id=MOCK_USER_ID, username=MOCK_USERNAME, role="patient"))
+    if connection.dialect.name == "postgresql":
+        # Açık id ile eklenen satır sequence'i ilerletmez; sonraki kullanıcılar çakışmasın
+        connection.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT MAX(id) FROM users))"))
+
+async def init_db() -> bool:
+    """Veritabanı engine'ini başlatır ve tabloları oluşturur"""
+    global engine, async_session_factory
+    try:
+        engine = create_engine_from_settings()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(ensure_mock_user)
+        async_session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        logger.info("Veritabanı başlatıldı")
+        return True
+    except Exception as e:
+        logger.error(f"Veritabanı başlatılamadı, kalıcı kayıt devre dışı: {e}")
+        if engine is not None:
+            await engine.dispose()
+        engine = None
+        async_session_factory = None
+        return False
+
+async def close_db():
+    """Bağlantı havuzunu kapatır"""
+    global engine, async_session_factory
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    async_session_factory = None
@@ -0,0 +1,93 @@
+"""
+Önceden kodlanmış yanıtlar için HTTP önbellek yardımcıları
+
+ETag / If-None-Match koşullu istekleri (304) ve Accept-Encoding'e göre
+gzip varyantı seçimi. Yanıt gövdesi istek yolunda yeniden üretilmez.
+"""
+import gzip
+import hashlib
+import json
+from typing import Iterable, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+    # Sıkıştırma kazancı yoksa (küçük gövde) None
+    gzip_body: Optional[bytes]
+    gzip_etag: Optional[str]
+
+def encode_payload(content, gzip_min_size: int = 512) -> CachedPayload:
+    """İçeriği FastAPI'nin JSONResponse biçimiyle kodlar ve gzip varyantını hazırlar"""
+    body = json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    gzip_body = None
+    if len(body) >= gzip_min_size:
+        # mtime=0: aynı içerik her süreçte aynı bayt dizisini (ve ETag'i) üretir
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            gzip_body = compressed
+    return CachedPayload(
+        body=body,
+        etag=f'"{digest}"',
+        gzip_body=gzip_body,
+        gzip_etag=f'"{digest}-gzip"' if gzip_body is not None else None
+    )
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Accept-Encoding başlığı gzip'e (q > 0) izin veriyor mu"""
+    if not accept_encoding:
+        return False
+    wildcard = None
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding in ('gzip', 'x-gzip'):
+            return quality > 0
+        if coding == '*':
+            wildcard = quality > 0
+    return bool(wildcard)
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[Optional[str]]) -> bool:
+    """If-None-Match için zayıf karşılaştırma (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    current = {etag for etag in etags if etag}
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in current:
+            return True
+    return False
+
+def cached_response(request: Request, payload: CachedPayload, max_age: int) -> Response:
+    """
+    Hazır yükten 200 (gerekirse gzip) veya 304 yanıtı oluşturur
+
+    Her iki varyantın ETag'i de geçerli sayılır; istemcinin elindeki
+    kopya hangi kodlamayla alınmış olursa olsun 304 dönebilir.
+    """
+    use_gzip = payload.gzip_body is not None and accepts_gzip(request.headers.get('accept-encoding'))
+    etag = payload.gzip_etag if use_gzip else payload.etag
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={max_age}',
+        'Vary': 'Accept-Encoding'
+    }
+    if etag_matches(request.headers.get('if-none-match'), (payload.etag, payload.gzip_etag)):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(content=payload.gzip_body, media_type='application/json', headers=headers)
+    return Response(content=payload.body, media_type='application/json', headers=headers)
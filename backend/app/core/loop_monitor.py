@@ -0,0 +1,187 @@
+"""
+Event loop gecikmesi ölçümü ve bloklayan çağrı tespiti
+
+Arka plandaki görev interval kadar uyur ve uyanma gecikmesini ölçer;
+gecikme, loop'un bu sürede başka bir geri çağrı tarafından bloklandığını
+gösterir. Ölçüm başına tek bir zamanlayıcı kurulur.
+
+Bloklama tespiti (isteğe bağlı) ayrı bir izleyici thread'i kullanır:
+thread loop'a call_soon_threadsafe ile sinyal gönderir; yanıt
+block_threshold içinde gelmezse loop thread'inin o anki yığın izi
+(bloklayan kod) ve işlenmekte olan istekler loglanır. Loop sağlıklıyken
+maliyet, eşik süresinin yarısında bir uyanmadır; yığın izi yalnızca
+bloklama anında alınır.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bloklama logunda listelenecek en fazla istek
+MAX_REPORTED_REQUESTS = 10
+
+class LoopLagMonitor:
+    """Son window örneğin gecikmesini tutar; block_threshold verilirse bloklayan çağrıları loglar"""
+
+    def __init__(self, interval: float = 0.5, window: int = 10, block_threshold: Optional[float] = None):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        # İzleyici thread durumu
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_watchdog = threading.Event()
+        self._ping_sent_at: Optional[float] = None
+        self._block_reported = False
+        # İşlenmekte olan istekler (LoopMonitorMiddleware doldurur): kimlik -> (istek, başlangıç)
+        self._active_requests: Dict[int, Tuple[str, float]] = {}
+        self._stats = {'blocks': 0, 'longest_block_ms': 0.0}
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+        if self._watchdog is None and self.block_threshold:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._stop_watchdog.clear()
+            self._ping_sent_at = None
+            self._block_reported = False
+            # daemon: bloklanmış bir loop süreç kapanışını da engellemesin
+            self._watchdog = threading.Thread(target=self._watch, name='loop-block-detector', daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        watchdog, self._watchdog = self._watchdog, None
+        if watchdog is not None:
+            self._stop_watchdog.set()
+            watchdog.join(timeout=1.0)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self._samples.append(lag)
+            metrics.EVENT_LOOP_LAG.observe(lag)
+
+    def _watch(self):
+        """İzleyici thread: loop'un sinyale yanıt verme süresini denetler"""
+        check_interval = self.block_threshold / 2
+        while not self._stop_watchdog.wait(check_interval):
+            sent_at = self._ping_sent_at
+            if sent_at is None:
+                self._ping_sent_at = time.monotonic()
+                try:
+                    self._loop.call_soon_threadsafe(self._pong)
+                except RuntimeError:
+                    # Loop kapandı
+                    return
+                continue
+            blocked = time.monotonic() - sent_at
+            if blocked >= self.block_threshold and not self._block_reported:
+                self._block_reported = True
+                self._report_block(blocked)
+
+    def _pong(self):
+        """Loop üzerinde çalışır; bloklama bittiyse toplam süresini loglar"""
+        sent_at, self._ping_sent_at = self._ping_sent_at, None
+        if self._block_reported and sent_at is not None:
+            self._block_reported = False
+            duration = time.monotonic() - sent_at
+            self._stats['longest_block_ms'] = max(self._stats['longest_block_ms'], round(duration * 1000, 1))
+            logger.warning(f"Event loop {duration:.3f} sn bloklandı")
+
+    def _report_block(self, blocked: float):
+        """İzleyici thread'de çalışır; loop thread'inin yığın izini loglar"""
+        self._stats['blocks'] += 1
+        metrics.EVENT_LOOP_BLOCKS.inc()
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = self._format_stack(frame) if frame is not None else 'yığın izi alınamadı\n'
+        now = time.perf_counter()
+        # tuple() kopyası GIL altında tek adımda alınır; loop thread'i sözlüğü değiştirse de güvenli
+        requests = sorted(tuple(self._active_requests.values()), key=lambda item: item[1])[:MAX_REPORTED_REQUESTS]
+        request_text = ', '.join(f"{name} ({now - started:.2f} sn)" for name, started in requests) or 'yok'
+        logger.warning(f"Event loop {blocked:.3f} sn'dir yanıt vermiyor (eşik {self.block_threshold:.3f} sn). "
+                       f"İşlenen istekler: {request_text}\nBloklayan kod:\n{stack}")
+
+    @staticmethod
+    def _format_stack(frame) -> str:
+        """Loop'un kendi çerçeveleri (thread, run_forever, _run_once) atlanır; çalışan geri çağrıdan başlar"""
+        frames = traceback.extract_stack(frame)
+        for index in range(len(frames) - 1, -1, -1):
+            if frames[index].filename.endswith(os.path.join('asyncio', 'events.py')):
+                frames = frames[index + 1:]
+                break
+        return ''.join(traceback.format_list(frames))
+
+    def request_started(self, key: int, name: str):
+        self._active_requests[key] = (name, time.perf_counter())
+
+    def request_finished(self, key: int):
+        self._active_requests.pop(key, None)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def lag(self) -> float:
+        """Son ölçülen gecikme (saniye)"""
+        return self._samples[-1] if self._samples else 0.0
+
+    @property
+    def max_lag(self) -> float:
+        """Penceredeki en büyük gecikme (saniye)"""
+        return max(self._samples, default=0.0)
+
+    def get_stats(self) -> Dict:
+        return {
+            'running': self.running,
+            'lag_ms': round(self.lag * 1000, 1),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'block_detection': self._watchdog is not None,
+            **self._stats
+        }
+
+class LoopMonitorMiddleware:
+    """Bloklama loglarında görünmesi için işlenmekte olan istekleri kaydeden ASGI middleware"""
+
+    def __init__(self, app, monitor: Optional[LoopLagMonitor] = None):
+        self.app = app
+        self.monitor = monitor or loop_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        key = id(scope)
+        self.monitor.request_started(key, f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.request_finished(key)
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL,
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD if settings.LOOP_BLOCK_DETECTION_ENABLED else None
+)
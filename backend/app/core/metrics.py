@@ -0,0 +1,170 @@
+"""
+Prometheus metrikleri (prometheus_client)
+
+Sayaç, gösterge ve histogramlar prometheus_client'ın varsayılan kaydında
+tutulur; /metrics uç noktası render() çıktısını döndürür.
+PROMETHEUS_MULTIPROC_DIR ayarlıysa (gunicorn/uvicorn çok worker) her worker
+değerlerini bu dizine yazar ve render() tüm worker'ları toplar; göstergeler
+bu yüzden okuma anında hesaplanmaz, değiştikleri yerde güncellenir.
+"""
+import contextvars
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# İstek ve analiz bağlamı: aşama ölçümleri analiz türünü buradan alır
+_analysis_type: contextvars.ContextVar[str] = contextvars.ContextVar('analysis_type', default='none')
+_request_started_at: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('request_started_at', default=None)
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+def render() -> bytes:
+    """Metrikleri Prometheus metin formatında döndürür; çok süreçli modda tüm worker'lar toplanır"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP istek süresi', ('method', 'route', 'status'), buckets=DEFAULT_BUCKETS)
+HTTP_REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'İşlenmekte olan HTTP istekleri', multiprocess_mode='livesum')
+STAGE_SECONDS = Histogram(
+    'analysis_stage_duration_seconds', 'Analiz aşaması süresi', ('stage', 'analysis_type'), buckets=DEFAULT_BUCKETS)
+ANALYSIS_SECONDS = Histogram(
+    'analysis_duration_seconds', 'Analizin toplam süresi', ('analysis_type',), buckets=DEFAULT_BUCKETS)
+FALLBACK_RESPONSES = Counter(
+    'llm_fallback_responses_total', 'LLM yerine dönen fallback yanıtları', ('analysis_type',))
+PARSE_FAILURES = Counter(
+    'llm_parse_failures_total', 'JSON olarak çözümlenemeyen LLM yanıtları', ('analysis_type',))
+TEMPLATE_RESPONSES = Counter(
+    'llm_template_fast_path_total', 'Şablon hızlı yolu kontrolleri (hit: LLM çağrılmadı)', ('analysis_type', 'outcome'))
+PARSE_RESULTS = Counter(
+    'llm_parse_results_total', 'LLM yanıtı çözümleme sonuçları (ok, repaired, reasked, failed)', ('prompt_type', 'outcome'))
+LLM_REQUESTS = Counter('llm_requests_total', 'LLM backend çağrıları', ('backend', 'outcome'))
+LLM_RETRIES = Counter('llm_retries_total', 'Geçici hata sonrası yeniden denenen LLM çağrıları', ('backend',))
+LLM_HEDGES = Counter(
+    'llm_hedged_requests_total', 'p95 aşıldığında başlatılan ikinci istekler (launched) ve önce bitenler (won)', ('backend', 'outcome'))
+# Çok süreçli modda en kötü worker'ın durumu raporlanır
+LLM_CIRCUIT_STATE = Gauge(
+    'llm_circuit_state', 'LLM devre kesici durumu (0 kapalı, 1 yarı açık, 2 açık)', multiprocess_mode='livemax')
+LLM_TOKENS = Counter('llm_tokens_total', 'LLM token kullanımı (tahmini)', ('backend', 'direction'))
+PROMPT_TOKENS = Histogram(
+    'llm_prompt_tokens', 'Gönderilen prompt token sayısı (tahmini)', ('prompt_type',),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+PROMPT_TRIMS = Counter(
+    'llm_prompt_trimmed_total', 'Token bütçesi nedeniyle kısaltılan prompt\'lar', ('prompt_type',))
+ADMISSION_DECISIONS = Counter(
+    'admission_decisions_total',
+    'Kabul kontrolü kararları (admitted, rate_limited, user_limit, overloaded, too_large, store_error)',
+    ('analysis_type', 'outcome'))
+LLM_IN_FLIGHT = Gauge('llm_requests_in_flight', 'Çalışan LLM çağrıları', multiprocess_mode='livesum')
+LLM_QUEUE_DEPTH = Gauge('llm_queue_depth', 'Eşzamanlılık sınırında bekleyen LLM çağrıları', multiprocess_mode='livesum')
+ANALYSIS_JOBS_QUEUED = Gauge('analysis_jobs_queued', 'Kuyrukta bekleyen analiz işleri', multiprocess_mode='livesum')
+ANALYSIS_JOBS_RUNNING = Gauge('analysis_jobs_running', 'Çalışan analiz işleri', multiprocess_mode='livesum')
+ANALYSIS_WRITE_BUFFER = Gauge(
+    'analysis_write_buffer_size', 'Veritabanına yazılmayı bekleyen analizler', multiprocess_mode='livesum')
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds', 'Event loop gecikmesi (zamanlayıcı uyanma gecikmesi)',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+EVENT_LOOP_BLOCKS = Counter('event_loop_blocks_total', 'Eşikten uzun süre bloklanan event loop olayları')
+
+@contextmanager
+def stage_timer(stage: str, analysis_type: Optional[str] = None) -> Iterator[None]:
+    """Bloğun süresini aşama histogramına yazar; analiz türü verilmezse bağlamdan alınır"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage, analysis_type=analysis_type or _analysis_type.get()).observe(time.perf_counter() - start)
+
+def timed_stage(stage: str):
+    """Senkron fonksiyonlar için stage_timer dekoratörü"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def analysis_scope(analysis_type: str) -> Iterator[None]:
+    """Bloğu bir analiz türüne bağlar ve toplam süresini ölçer"""
+    token = _analysis_type.set(analysis_type)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ANALYSIS_SECONDS.labels(analysis_type=analysis_type).observe(time.perf_counter() - start)
+        try:
+            _analysis_type.reset(token)
+        except ValueError:
+            # Async generator başka bir bağlamda kapatıldıysa token geçersizdir
+            pass
+
+def analyzed(analysis_type: str):
+    """Async servis metotları için analysis_scope dekoratörü"""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with analysis_scope(analysis_type):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_analysis_type() -> str:
+    return _analysis_type.get()
+
+def observe_request_parsing(analysis_type: str):
+    """İsteğin gelişinden uç nokta gövdesine kadar geçen süreyi (gövde okuma + doğrulama) kaydeder"""
+    started_at = _request_started_at.get()
+    if started_at is not None:
+        STAGE_SECONDS.labels(stage='request_parsing', analysis_type=analysis_type).observe(time.perf_counter() - started_at)
+
+def request_elapsed() -> Optional[float]:
+    """Geçerli HTTP isteğinin başlangıcından bu yana geçen saniye"""
+    started_at = _request_started_at.get()
+    return None if started_at is None else time.perf_counter() - started_at
+
+class MetricsMiddleware:
+    """HTTP istek süresini rota şablonu bazında ölçen ASGI middleware"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        token = _request_started_at.set(time.perf_counter())
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get('route')
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope['method'],
+                route=getattr(route, 'path', 'unmatched'),
+                status=status['code']
+            ).observe(time.perf_counter() - _request_started_at.get())
+            _request_started_at.reset(token)
@@ -1,10 +1,19 @@
 import logging
+import secrets
 from typing import Optional
 
+from fastapi import Header, HTTPException
+
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Mock kimlik doğrulamanın döndürdüğü kullanıcı; init_db users tablosunda oluşturur
+MOCK_USER_ID = 1
+MOCK_USERNAME = "test_user"
+
 class User:
-    def __init__(self, id: int = 1, username: str = "test_user"):
+    def __init__(self, id: int = MOCK_USER_ID, username: str = MOCK_USERNAME):
         self.id = id
         self.username = username
 
@@ -14,4 +23,12 @@ async def get_current_user() -> User:
 
 def verify_token(token: str) -> bool:
     """Mock token doğrulama"""
-    return True 
\ No newline at end of file
+    return True
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Operasyon uç noktalarını ADMIN_API_TOKEN ile korur; ayar boşsa uç nokta kapalıdır"""
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Bu işlem için ADMIN_API_TOKEN yapılandırılmalıdır")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, settings.ADMIN_API_TOKEN):
+        logger.warning("Geçersiz yönetici token'ı ile operasyon isteği reddedildi")
+        raise HTTPException(status_code=401, detail="Geçersiz yönetici token'ı")
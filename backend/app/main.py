@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
@@ -9,10 +9,18 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+from app.core import metrics
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import init_db, close_db
+from app.core.loop_monitor import LoopMonitorMiddleware, loop_monitor
 from app.api.v1.api import api_router
 from app.core.security import verify_token
+from app.services.llm_service import llm_service
+from app.services.admission_control import admission_controller
+from app.services.analysis_job_service import analysis_job_queue
+from app.services.analysis_persistence_service import analysis_writer
+from app.services.health_service import health_service
+from app.services.reference_range_service import reference_range_service
 
 # Security
 security = HTTPBearer()
@@ -22,14 +30,26 @@ async def lifespan(app: FastAPI):
     """Uygulama başlangıç ve kapanış işlemleri"""
     # Başlangıç
     logger.info("🚀 Sağlık Analiz Merkezi API başlatılıyor...")
-    await init_db()
-    logger.info("✅ Veritabanı bağlantısı kuruldu")
+    loop_monitor.start()
+    if await init_db():
+        logger.info("✅ Veritabanı bağlantısı kuruldu")
+    await analysis_writer.start()
     logger.info("🤖 LLM servisleri hazırlanıyor...")
+    await analysis_job_queue.start()
+    reference_range_service.start_watcher(settings.REFERENCE_RANGES_RELOAD_INTERVAL)
     
     yield
     
     # Kapanış
     logger.info("🛑 API kapatılıyor...")
+    await reference_range_service.stop_watcher()
+    await analysis_job_queue.stop()
+    await analysis_writer.stop()
+    await admission_controller.store.close()
+    if llm_service.response_cache:
+        llm_service.response_cache.close()
+    await close_db()
+    await loop_monitor.stop()
 
 # FastAPI uygulaması
 app = FastAPI(
@@ -50,6 +70,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# İstek süresi metrikleri
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Bloklama loglarında işlenmekte olan istekler
+if settings.LOOP_BLOCK_DETECTION_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
 # API router'ı ekle
 app.include_router(api_router, prefix="/api/v1")
 
@@ -63,18 +90,59 @@ async def root():
         "docs": "/docs"
     }
 
+def llm_status() -> str:
+    if not llm_service.is_configured():
+        return "not_configured"
+    # Devre açıkken analizler fallback yanıtlarıyla döner
+    return {"closed": "ready", "half_open": "recovering", "open": "degraded"}[llm_service.resilience.breaker.state]
+
 @app.get("/health")
 async def health_check():
-    """Sağlık kontrolü"""
+    """
+    Sağlık kontrolü ve ayrıntılı servis sayaçları
+
+    Durum canlılıktır: yanıt veren süreç "healthy" döner. Bağımlılık durumu
+    "readiness" altında raporlanır; trafik kararı için /health/ready kullanılır.
+    """
+    readiness = await health_service.readiness()
     return {
         "status": "healthy",
+        "ready": readiness["ready"],
         "services": {
-            "database": "connected",
-            "llm": "ready",
-            "ai_analyzer": "active"
-        }
+            "database": readiness["checks"]["database"]["state"],
+            "llm": llm_status(),
+            "event_loop": readiness["checks"]["event_loop"]["status"]
+        },
+        "readiness": readiness,
+        "llm_backend": llm_service.backend.name,
+        "llm_concurrency": llm_service.get_concurrency_stats(),
+        "llm_cache": llm_service.get_cache_stats(),
+        "llm_fast_path": llm_service.get_fast_path_stats(),
+        "llm_resilience": llm_service.get_resilience_stats(),
+        "admission": admission_controller.get_stats(),
+        "analysis_queue": analysis_job_queue.get_stats(),
+        "event_loop": loop_monitor.get_stats(),
+        "reference_data_version": reference_range_service.version
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """Canlılık sondası: süreç ve event loop yanıt veriyor"""
+    return health_service.liveness()
+
+@app.get("/health/ready")
+async def readiness_check(response: Response):
+    """Hazır olma sondası: bağımlılıklardan biri başarısızsa 503"""
+    readiness = await health_service.readiness()
+    if not readiness["ready"]:
+        response.status_code = 503
+    return readiness
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus metin formatında metrikler"""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, ForeignKey, JSON, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -70,6 +70,38 @@ class TestResult(Base):
     # İlişkiler
     patient = relationship("Patient", back_populates="test_results")
     analysis_results = relationship("AnalysisResult", back_populates="test_result")
+    
+    # Hasta bazlı zaman serisi sorguları için
+    __table_args__ = (
+        Index("ix_test_results_patient_test_date", "patient_id", "test_name", "test_date"),
+    )
+
+class TestTrendSummary(Base):
+    """Hasta/test bazında artımlı trend özeti (her yeni sonuçta güncellenir)"""
+    __tablename__ = "test_trend_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    test_name = Column(String)
+    result_count = Column(Integer, default=0)
+    origin_date = Column(DateTime)  # Eğim hesabında t=0 noktası
+    first_date = Column(DateTime)
+    last_date = Column(DateTime)
+    last_value = Column(Float)
+    previous_date = Column(DateTime, nullable=True)
+    previous_value = Column(Float, nullable=True)
+    min_value = Column(Float)
+    max_value = Column(Float)
+    # En küçük kareler eğimi için birikimli toplamlar (t: origin_date'ten bu yana gün)
+    sum_t = Column(Float, default=0.0)
+    sum_v = Column(Float, default=0.0)
+    sum_tt = Column(Float, default=0.0)
+    sum_tv = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("patient_id", "test_name", name="uq_test_trend_summaries_patient_test"),
+    )
 
 class Analysis(Base):
     """AI Analiz modeli"""
@@ -79,8 +111,8 @@ class Analysis(Base):
     analysis_id = Column(String, unique=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     patient_id = Column(Integer, ForeignKey("patients.id"))
-    analysis_type = Column(String)  # blood_test, risk_assessment, doctor_insights
-    status = Column(String, default="pending")  # pending, completed, failed
+    analysis_type = Column(String)  # blood_test, risk_assessment, doctor_insights, full
+    status = Column(String, default="pending")  # pending, running, completed, failed
     input_data = Column(JSON)
     output_data = Column(JSON)
     llm_model_used = Column(String)
@@ -156,6 +188,14 @@ class AuditLog(Base):
     created_at = Column(DateTime, default=func.now())
 
 # Enum değerleri için sabitler
+class TrendFlag:
+    STABLE = "stable"
+    INCREASING = "increasing"
+    DECREASING = "decreasing"
+    RAPID_INCREASE = "rapid_increase"
+    RAPID_DECREASE = "rapid_decrease"
+    INSUFFICIENT_DATA = "insufficient_data"
+
 class TestStatus:
     NORMAL = "normal"
     HIGH = "high"
@@ -164,7 +204,10 @@ class TestStatus:
 
 class AnalysisStatus:
     PENDING = "pending"
+    RUNNING = "running"
     COMPLETED = "completed"
+    # Analizin bir kısmı (birleşik analizde bazı dallar) fallback yanıtıyla tamamlandı
+    COMPLETED_WITH_FALLBACK = "completed_with_fallback"
     FAILED = "failed"
 
 class UserRole:
@@ -176,4 +219,5 @@ class AnalysisType:
     BLOOD_TEST = "blood_test"
     RISK_ASSESSMENT = "risk_assessment"
     DOCTOR_INSIGHTS = "doctor_insights"
+    FULL = "full"
     PATIENT_EDUCATION = "patient_education" 
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""
+LLM uç noktaları için kabul kontrolü
+
+İstek LLM işine başlamadan önce sırayla şu kontrollerden geçer:
+1. Global eşzamanlı istek sınırı: her öncelik sınıfı bu sınırın yalnızca
+   kendi payını kullanabilir; yoğunlukta önce düşük öncelik reddedilir (503)
+2. Kullanıcı başına eşzamanlı istek sınırı (429)
+3. Kullanıcı başına token bucket hız sınırı (429)
+Toplu analiz panelleri istek kovasından değil, ayrı ve daha büyük bir toplu
+kotadan (quota='batch') düşülür. Reddedilen istek kuyrukta beklemez,
+Retry-After ile hemen döner. Maliyeti burst'ü aşan istek kovaya hiç
+sığmayacağı için beklemeden 413 ile reddedilir.
+"""
+import logging
+import math
+from typing import Dict, List, NamedTuple, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.database import AnalysisType
+from app.services.admission_stores import AdmissionStore, AdmissionStoreError, create_admission_store
+
+logger = logging.getLogger(__name__)
+
+# Sınıfın kullanabileceği global kapasite payı
+PRIORITY_SHARES = {'high': 1.0, 'normal': 0.8, 'low': 0.5}
+
+ANALYSIS_PRIORITIES = {
+    AnalysisType.DOCTOR_INSIGHTS: 'high',
+    AnalysisType.BLOOD_TEST: 'normal',
+    AnalysisType.RISK_ASSESSMENT: 'normal',
+    AnalysisType.FULL: 'normal',
+    AnalysisType.PATIENT_EDUCATION: 'low',
+}
+
+GLOBAL_KEY = 'inflight:global'
+
+class AdmissionRejected(Exception):
+    """İstek kabul edilmediğinde fırlatılır; uç nokta status_code ve Retry-After ile yanıtlar"""
+
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: Optional[int]):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+class AdmissionTicket(NamedTuple):
+    """Kabul edilen isteğin tuttuğu slot; release ile bırakılır"""
+    user_key: str
+    global_key: str
+
+class AdmissionController:
+    """
+    Kullanıcı kimliğine göre hız ve eşzamanlılık sınırlarını uygular
+
+    Depo erişilemezse istekler sınırlamasız kabul edilir (fail-open) ve
+    'store_error' olarak sayılır; kabul kontrolü analizleri durdurmamalıdır.
+    """
+
+    def __init__(self, store: AdmissionStore, enabled: bool = True, rate_per_minute: float = 30.0,
+                 burst: int = 10, per_user_limit: int = 4, global_limit: int = 32, retry_after: int = 2,
+                 batch_rate_per_minute: float = 1000.0, batch_burst: int = 500):
+        self.store = store
+        self.enabled = enabled
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.batch_rate = batch_rate_per_minute / 60.0
+        self.batch_burst = batch_burst
+        self.per_user_limit = per_user_limit
+        self.global_limit = global_limit
+        self.retry_after = retry_after
+        self._stats: Dict[str, int] = {'admitted': 0, 'rate_limited': 0, 'user_limit': 0, 'overloaded': 0,
+                                       'too_large': 0, 'store_error': 0}
+
+    def priority(self, analysis_type: str) -> str:
+        return ANALYSIS_PRIORITIES.get(analysis_type, 'normal')
+
+    def global_threshold(self, analysis_type: str) -> int:
+        """Öncelik sınıfının kullanabileceği en fazla global slot"""
+        return max(1, int(self.global_limit * PRIORITY_SHARES[self.priority(analysis_type)]))
+
+    async def acquire(self, user_id, analysis_type: str, cost: int = 1, hold_slot: bool = True,
+                      quota: str = 'request') -> Optional[AdmissionTicket]:
+        """
+        İsteği kabul eder veya AdmissionRejected fırlatır
+
+        hold_slot=False yalnızca hız sınırını uygular (ör. kuyruğa alınan
+        işler). quota='batch' toplu analiz kovasını kullanır. cost burst'ü
+        aşarsa istek 413 ile reddedilir; kırpılsaydı büyük istekler hız
+        sınırını aşmanın yolu olurdu.
+        """
+        if not self.enabled:
+            return None
+        if quota == 'batch':
+            rate, burst, bucket = self.batch_rate, self.batch_burst, f'rate:batch:user:{user_id}'
+        else:
+            rate, burst, bucket = self.rate, self.burst, f'rate:user:{user_id}'
+        if cost > burst:
+            self._count(analysis_type, 'too_large')
+            raise AdmissionRejected(413, 'too_large', f"İstek en fazla {burst} birimlik olabilir ({cost} istendi)", None)
+        # Yalnızca acquire_slots başarıyla döndükten sonra atanır; depo hatasında
+        # alınmamış slot bırakılırsa diğer isteklerin sayaçları düşerdi
+        ticket = None
+        try:
+            if hold_slot:
+                slot = AdmissionTicket(f'inflight:user:{user_id}', GLOBAL_KEY)
+                full = await self.store.acquire_slots(
+                    slot.user_key, self.per_user_limit, slot.global_key, self.global_threshold(analysis_type))
+                if full == 'global':
+                    self._reject(analysis_type, 'overloaded')
+                if full == 'user':
+                    self._reject(analysis_type, 'user_limit')
+                ticket = slot
+            wait = await self.store.take(bucket, rate, burst, cost)
+            if wait > 0:
+                if ticket is not None:
+                    await self.release(ticket)
+                self._reject(analysis_type, 'rate_limited', wait)
+        except AdmissionStoreError as e:
+            logger.warning(f"Kabul kontrolü deposuna ulaşılamadı, istek sınırlamasız kabul ediliyor: {e}")
+            await self.release(ticket)
+            self._count(analysis_type, 'store_error')
+            return None
+        self._count(analysis_type, 'admitted')
+        return ticket
+
+    async def acquire_extra_slots(self, user_id, analysis_type: str, count: int) -> Optional[List[AdmissionTicket]]:
+        """
+        Aynı isteğin paralel işleri (ör. toplu analiz panelleri) için en fazla count ek slot alır
+
+        Beklemez: kullanıcı sınırı veya öncelik sınıfının global payı dolunca
+        alınabilenler döndürülür. Kontrol kapalıysa veya depoya ulaşılamazsa
+        None döner (sınır uygulanmaz).
+        """
+        if not self.enabled:
+            return None
+        tickets: List[AdmissionTicket] = []
+        try:
+            for _ in range(count):
+                slot = AdmissionTicket(f'inflight:user:{user_id}', GLOBAL_KEY)
+                if await self.store.acquire_slots(
+                        slot.user_key, self.per_user_limit, slot.global_key, self.global_threshold(analysis_type)):
+                    break
+                tickets.append(slot)
+        except AdmissionStoreError as e:
+            logger.warning(f"Kabul kontrolü deposuna ulaşılamadı, ek slotlar sınırlamasız veriliyor: {e}")
+            for ticket in tickets:
+                await self.release(ticket)
+            self._count(analysis_type, 'store_error')
+            return None
+        return tickets
+
+    async def release(self, ticket: Optional[AdmissionTicket]):
+        if ticket is None:
+            return
+        try:
+            await self.store.release_slots(ticket.user_key, ticket.global_key)
+        except AdmissionStoreError as e:
+            # Slot anahtarı depoda TTL ile düşer
+            logger.warning(f"Kabul kontrolü slotu bırakılamadı: {e}")
+
+    def _reject(self, analysis_type: str, reason: str, wait: float = 0.0):
+        self._count(analysis_type, reason)
+        if reason == 'overloaded':
+            raise AdmissionRejected(503, reason, "Sistem şu anda yoğun, lütfen daha sonra tekrar deneyin", self.retry_after)
+        if reason == 'user_limit':
+            raise AdmissionRejected(429, reason, "Aynı anda çalışan analiz sınırına ulaştınız, lütfen öncekilerin bitmesini bekleyin",
+                                    self.retry_after)
+        raise AdmissionRejected(429, reason, "İstek sınırı aşıldı, lütfen daha sonra tekrar deneyin", max(1, math.ceil(wait)))
+
+    def _count(self, analysis_type: str, outcome: str):
+        self._stats[outcome] += 1
+        metrics.ADMISSION_DECISIONS.labels(analysis_type=analysis_type, outcome=outcome).inc()
+
+    def get_stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'store': self.store.name,
+            'rate_per_minute': self.rate * 60,
+            'burst': self.burst,
+            'batch_rate_per_minute': self.batch_rate * 60,
+            'batch_burst': self.batch_burst,
+            'per_user_limit': self.per_user_limit,
+            'global_limit': self.global_limit,
+            **self._stats
+        }
+
+# Global kabul kontrolü instance
+admission_controller = AdmissionController(
+    store=create_admission_store(),
+    enabled=settings.ADMISSION_CONTROL_ENABLED,
+    rate_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    burst=settings.RATE_LIMIT_BURST,
+    per_user_limit=settings.LLM_MAX_INFLIGHT_PER_USER,
+    global_limit=settings.LLM_MAX_INFLIGHT_GLOBAL,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+    batch_rate_per_minute=settings.BATCH_RATE_LIMIT_PER_MINUTE,
+    batch_burst=settings.BATCH_RATE_LIMIT_BURST
+)
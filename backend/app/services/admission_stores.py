@@ -0,0 +1,188 @@
+"""
+Kabul kontrolü durum deposu: token bucket ve eşzamanlılık sayaçları
+
+InMemoryAdmissionStore tek süreç içindir. RedisAdmissionStore durumu
+Redis uyumlu bir sunucuda (Redis, Valkey, KeyDB vb.) redis.asyncio ile
+tutar; böylece tüm worker'lar aynı sınırları paylaşır. İşlemler Lua
+betikleriyle atomik yapılır.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+class AdmissionStoreError(Exception):
+    """Depoya ulaşılamadığında veya depo hata döndürdüğünde fırlatılır"""
+
+class AdmissionStore:
+    """
+    Kabul kontrolü deposu için ortak arayüz
+
+    take: token bucket'tan cost kadar token alır; izin verildiyse 0, aksi
+    halde yeterli token birikene kadar beklenecek süreyi (saniye) döndürür.
+    acquire_slots: kullanıcı ve global sayaçları sınırların altındaysa
+    birlikte artırır; başarıda None, aksi halde dolu olanı ('user' veya
+    'global') döndürür.
+    """
+
+    name = 'base'
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        raise NotImplementedError
+
+    async def acquire_slots(self, user_key: str, user_limit: int, global_key: str, global_limit: int) -> Optional[str]:
+        raise NotImplementedError
+
+    async def release_slots(self, user_key: str, global_key: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class InMemoryAdmissionStore(AdmissionStore):
+    """Süreç içi depo; event loop tek iş parçacığında çalıştığı için kilit gerekmez"""
+
+    name = 'memory'
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._counters: Dict[str, int] = {}
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / rate
+        # Ekleme sırası son kullanıma göre tutulur; sınır aşılırsa en eski kova atılır
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            del self._buckets[next(iter(self._buckets))]
+        return retry_after
+
+    async def acquire_slots(self, user_key: str, user_limit: int, global_key: str, global_limit: int) -> Optional[str]:
+        if self._counters.get(global_key, 0) >= global_limit:
+            return 'global'
+        if self._counters.get(user_key, 0) >= user_limit:
+            return 'user'
+        self._counters[global_key] = self._counters.get(global_key, 0) + 1
+        self._counters[user_key] = self._counters.get(user_key, 0) + 1
+        return None
+
+    async def release_slots(self, user_key: str, global_key: str):
+        for key in (user_key, global_key):
+            count = self._counters.get(key, 0) - 1
+            if count > 0:
+                self._counters[key] = count
+            else:
+                self._counters.pop(key, None)
+
+    def in_flight(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+# KEYS[1]=kova; ARGV: rate, burst, cost, now. Ondalıklı sonuç string olarak döner
+_TAKE_SCRIPT = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= cost then tokens = tokens - cost else retry = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(retry)
+"""
+
+# KEYS[1]=kullanıcı, KEYS[2]=global; ARGV: user_limit, global_limit, ttl
+_ACQUIRE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') >= tonumber(ARGV[2]) then return 'global' end
+if tonumber(redis.call('GET', KEYS[1]) or '0') >= tonumber(ARGV[1]) then return 'user' end
+redis.call('INCR', KEYS[2])
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return ''
+"""
+
+_RELEASE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+  if tonumber(redis.call('DECR', key)) <= 0 then redis.call('DEL', key) end
+end
+return 0
+"""
+
+class RedisAdmissionStore(AdmissionStore):
+    """
+    Redis uyumlu sunucuda paylaşılan depo
+
+    Betikler EVALSHA ile çağrılır; sunucuda yoksa (ilk çağrı, yeniden
+    başlatma) redis-py betiği yükleyip tekrarlar. Bağlantı hatası veya zaman
+    aşımında bir kez yeniden bağlanılıp denenir. Sayaç anahtarları her
+    kabulde slot_ttl ile yenilenir; çöken bir worker'ın bırakamadığı slotlar
+    anahtar boşta kaldığında kendiliğinden silinir.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: Optional[str] = None, prefix: str = 'admission:', timeout: float = 0.5,
+                 slot_ttl: int = 300, client=None):
+        # redis yalnızca bu depo seçildiğinde içe aktarılır
+        from redis.exceptions import RedisError
+
+        if client is None:
+            from redis.asyncio import Redis
+            from redis.asyncio.retry import Retry
+            from redis.backoff import ExponentialBackoff
+
+            client = Redis.from_url(
+                url,
+                socket_timeout=timeout,
+                socket_connect_timeout=timeout,
+                retry=Retry(ExponentialBackoff(cap=timeout, base=0.01), retries=1),
+                decode_responses=True
+            )
+        self.client = client
+        self.prefix = prefix
+        self.slot_ttl = slot_ttl
+        self._errors = (RedisError, OSError, asyncio.TimeoutError)
+        self._take = client.register_script(_TAKE_SCRIPT)
+        self._acquire = client.register_script(_ACQUIRE_SCRIPT)
+        self._release = client.register_script(_RELEASE_SCRIPT)
+
+    async def _eval(self, script, keys: List[str], *args):
+        try:
+            return await script(keys=[self.prefix + key for key in keys], args=list(args))
+        except self._errors as e:
+            raise AdmissionStoreError(f"{type(e).__name__}: {e}") from e
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        # Worker'lar arasında ortak saat olarak duvar saati kullanılır
+        return float(await self._eval(self._take, [key], repr(rate), repr(burst), repr(cost), repr(time.time())))
+
+    async def acquire_slots(self, user_key: str, user_limit: int, global_key: str, global_limit: int) -> Optional[str]:
+        result = await self._eval(self._acquire, [user_key, global_key], user_limit, global_limit, self.slot_ttl)
+        return result or None
+
+    async def release_slots(self, user_key: str, global_key: str):
+        await self._eval(self._release, [user_key, global_key])
+
+    async def close(self):
+        await self.client.aclose()
+
+def create_admission_store() -> AdmissionStore:
+    """Ayarlardaki ADMISSION_STORE değerine göre depo oluşturur"""
+    if settings.ADMISSION_STORE == 'memory':
+        return InMemoryAdmissionStore()
+    if settings.ADMISSION_STORE == 'redis':
+        return RedisAdmissionStore(
+            url=settings.ADMISSION_REDIS_URL,
+            timeout=settings.ADMISSION_REDIS_TIMEOUT,
+            slot_ttl=settings.ADMISSION_SLOT_TTL
+        )
+    raise ValueError(f"Bilinmeyen kabul kontrolü deposu: {settings.ADMISSION_STORE}")
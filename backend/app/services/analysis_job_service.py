@@ -0,0 +1,373 @@
+"""
+Öncelikli analiz iş kuyruğu ve SQLite iş kaydı
+
+Her iş, onu kuyruğa alan sürecin sahipliğinde (owner) ve süreli bir
+kirayla (lease) tutulur; sahip süreç kirayı düzenli olarak yeniler. Worker
+işi çalıştırmadan önce atomik bir UPDATE ile sahiplenir, böylece kaydı
+paylaşan süreçlerden yalnızca biri çalıştırır. Kirası dolan işler (süreç
+çöktü veya durdu) başka bir süreç tarafından devralınır; başka sürecin
+çalıştırmakta olduğu işler yeniden kuyruğa alınmaz.
+
+ANALYSIS_JOB_DB_PATH=":memory:" kaydı süreç içinde tutar ve yalnızca tek
+worker'lı dağıtım içindir; birden fazla uvicorn worker'ında işler ve
+GET /analysis/{id} sorguları ortak bir dosya yolu gerektirir.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.database import AnalysisStatus, AnalysisType
+from app.services.llm_service import analysis_outcome, llm_service
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Kuyruk kapasitesi dolduğunda fırlatılır"""
+
+_JOB_COLUMNS = ("analysis_id, user_id, analysis_type, priority, status, input_data, output_data, "
+                "error_message, created_at, completed_at")
+
+class AnalysisJobStore:
+    """
+    Analiz işlerinin SQLite üzerinde saklanması
+
+    Kira zamanları (lease_expires) süreçler arasında karşılaştırıldığı için
+    duvar saatiyle (time.time) tutulur.
+    """
+
+    def __init__(self, db_path: str = ":memory:"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Dosyayı paylaşan süreçlerin yazma kilidi için bekleme süresi
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+        if db_path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+            "analysis_id TEXT PRIMARY KEY, user_id INTEGER, analysis_type TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, status TEXT NOT NULL, input_data TEXT NOT NULL, "
+            "output_data TEXT, error_message TEXT, created_at TEXT NOT NULL, completed_at TEXT, "
+            "owner TEXT, lease_expires REAL NOT NULL DEFAULT 0)"
+        )
+        # Sahiplik sütunları olmadan oluşturulmuş kayıt dosyaları
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analysis_jobs)")}
+        if 'owner' not in columns:
+            self._conn.execute("ALTER TABLE analysis_jobs ADD COLUMN owner TEXT")
+        if 'lease_expires' not in columns:
+            self._conn.execute("ALTER TABLE analysis_jobs ADD COLUMN lease_expires REAL NOT NULL DEFAULT 0")
+        self._conn.commit()
+
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    def _execute_update(self, query: str, params: tuple = ()) -> int:
+        """Değişen satır sayısını döndürür"""
+        with self._lock:
+            count = self._conn.execute(query, params).rowcount
+            self._conn.commit()
+            return count
+
+    async def create(self, job: Dict, owner: str, lease_seconds: float):
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO analysis_jobs (analysis_id, user_id, analysis_type, priority, status, "
+            "input_data, created_at, owner, lease_expires) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job['analysis_id'], job['user_id'], job['analysis_type'], job['priority'],
+                job['status'], json.dumps(job['input_data'], ensure_ascii=False), job['created_at'],
+                owner, time.time() + lease_seconds
+            )
+        )
+
+    async def claim(self, analysis_id: str, owner: str, lease_seconds: float) -> bool:
+        """
+        İşi çalıştırmak üzere atomik olarak sahiplenir
+
+        Yalnızca kendi bekleyen işi veya kirası dolmuş bekleyen/çalışan iş
+        alınabilir; başka süreç aldıysa veya iş bittiyse False döner.
+        """
+        now = time.time()
+        count = await asyncio.to_thread(
+            self._execute_update,
+            "UPDATE analysis_jobs SET status = ?, owner = ?, lease_expires = ? "
+            "WHERE analysis_id = ? AND status IN (?, ?) "
+            "AND ((owner = ? AND status = ?) OR lease_expires < ?)",
+            (
+                AnalysisStatus.RUNNING, owner, now + lease_seconds, analysis_id,
+                AnalysisStatus.PENDING, AnalysisStatus.RUNNING, owner, AnalysisStatus.PENDING, now
+            )
+        )
+        return count == 1
+
+    async def renew_leases(self, owner: str, lease_seconds: float) -> int:
+        """Sahibin bitmemiş tüm işlerinin kirasını uzatır"""
+        return await asyncio.to_thread(
+            self._execute_update,
+            "UPDATE analysis_jobs SET lease_expires = ? WHERE owner = ? AND status IN (?, ?)",
+            (time.time() + lease_seconds, owner, AnalysisStatus.PENDING, AnalysisStatus.RUNNING)
+        )
+
+    async def release(self, owner: str):
+        """Durdurulan sürecin bitmemiş işlerini bekleyen duruma alıp kiralarını bitirir; başka süreç hemen devralır"""
+        await asyncio.to_thread(
+            self._execute_update,
+            "UPDATE analysis_jobs SET status = ?, lease_expires = 0 WHERE owner = ? AND status IN (?, ?)",
+            (AnalysisStatus.PENDING, owner, AnalysisStatus.PENDING, AnalysisStatus.RUNNING)
+        )
+
+    async def update(self, analysis_id: str, status: str, output_data: Optional[Dict] = None,
+                     error_message: Optional[str] = None, owner: Optional[str] = None) -> bool:
+        """owner verilirse iş başka sürece geçtiyse güncellenmez ve False döner"""
+        finished = (AnalysisStatus.COMPLETED, AnalysisStatus.COMPLETED_WITH_FALLBACK, AnalysisStatus.FAILED)
+        completed_at = datetime.now().isoformat() if status in finished else None
+        query = ("UPDATE analysis_jobs SET status = ?, output_data = ?, error_message = ?, completed_at = ? "
+                 "WHERE analysis_id = ?")
+        params = (
+            status,
+            json.dumps(output_data, ensure_ascii=False) if output_data is not None else None,
+            error_message,
+            completed_at,
+            analysis_id
+        )
+        if owner is not None:
+            query += " AND owner = ?"
+            params += (owner,)
+        return await asyncio.to_thread(self._execute_update, query, params) == 1
+
+    async def get(self, analysis_id: str) -> Optional[Dict]:
+        rows = await asyncio.to_thread(
+            self._execute,
+            f"SELECT {_JOB_COLUMNS} FROM analysis_jobs WHERE analysis_id = ?",
+            (analysis_id,)
+        )
+        return self._row_to_job(rows[0]) if rows else None
+
+    async def get_expired(self) -> List[Dict]:
+        """Kirası dolmuş bitmemiş işler (sahibi çöktü veya durdu)"""
+        rows = await asyncio.to_thread(
+            self._execute,
+            f"SELECT {_JOB_COLUMNS} FROM analysis_jobs WHERE status IN (?, ?) AND lease_expires < ? "
+            "ORDER BY created_at",
+            (AnalysisStatus.PENDING, AnalysisStatus.RUNNING, time.time())
+        )
+        return [self._row_to_job(row) for row in rows]
+
+    @staticmethod
+    def _row_to_job(row: tuple) -> Dict:
+        return {
+            'analysis_id': row[0],
+            'user_id': row[1],
+            'analysis_type': row[2],
+            'priority': row[3],
+            'status': row[4],
+            'input_data': json.loads(row[5]),
+            'output_data': json.loads(row[6]) if row[6] else None,
+            'error_message': row[7],
+            'created_at': row[8],
+            'completed_at': row[9]
+        }
+
+class AnalysisJobQueue:
+    """
+    Öncelikli analiz iş kuyruğu
+
+    İşler kaydedilip hemen bir analysis_id ile döner; sabit sayıda worker
+    LLM çalışmasını öncelik sırasına göre (küçük sayı önce) yürütür. Kira
+    lease_seconds / 3 aralıkla yenilenir; aynı döngü kirası dolmuş işleri
+    devralır.
+    """
+
+    def __init__(self, store: AnalysisJobStore, concurrency: int = 4, max_queue_size: int = 1000,
+                 lease_seconds: float = 30.0):
+        self.store = store
+        self.concurrency = concurrency
+        self.max_queue_size = max_queue_size
+        self.lease_seconds = lease_seconds
+        # Kayıttaki sahiplik kimliği; süreç yeniden başlarsa yenisi alınır
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        # Bu süreçte kuyrukta bekleyen ve çalışan işler; devralma taramasında atlanır
+        self._queued_ids: Set[str] = set()
+        self._running_ids: Set[str] = set()
+        self._workers: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._sequence = itertools.count()
+        self._stats = {'claimed': 0, 'skipped': 0, 'recovered': 0}
+        self._handlers: Dict[str, Callable[[Dict], Awaitable[Dict]]] = {
+            AnalysisType.BLOOD_TEST: self._run_blood_test,
+            AnalysisType.RISK_ASSESSMENT: self._run_risk_assessment,
+            AnalysisType.DOCTOR_INSIGHTS: self._run_doctor_insights,
+            AnalysisType.FULL: self._run_full,
+        }
+
+    @property
+    def analysis_types(self) -> List[str]:
+        return list(self._handlers)
+
+    async def start(self):
+        """Worker'ları başlatır ve kirası dolmuş yarım işleri kuyruğa alır"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._queued_ids.clear()
+        await self._recover_expired()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._lease_task = asyncio.create_task(self._maintain_leases())
+        logger.info(f"Analiz iş kuyruğu başlatıldı - {self.concurrency} worker ({self.owner})")
+
+    async def stop(self):
+        """Worker'ları durdurur; bitmemiş işler 'pending' olarak bırakılır ve diğer süreçler hemen devralabilir"""
+        tasks = self._workers + ([self._lease_task] if self._lease_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._lease_task = None
+        await self.store.release(self.owner)
+
+    async def submit(self, user_id: int, analysis_type: str, input_data: Dict, priority: int = 5) -> Dict:
+        """İşi kaydeder ve kuyruğa alır"""
+        if analysis_type not in self._handlers:
+            raise ValueError(f"Desteklenmeyen analiz türü: {analysis_type}")
+        if self._queue is None:
+            raise RuntimeError("Analiz iş kuyruğu başlatılmadı")
+        if self._queue.qsize() >= self.max_queue_size:
+            raise QueueFullError("Analiz kuyruğu dolu")
+
+        job = {
+            'analysis_id': f"analysis_{uuid.uuid4().hex}",
+            'user_id': user_id,
+            'analysis_type': analysis_type,
+            'priority': priority,
+            'status': AnalysisStatus.PENDING,
+            'input_data': input_data,
+            'created_at': datetime.now().isoformat()
+        }
+        await self.store.create(job, self.owner, self.lease_seconds)
+        self._enqueue(priority, job['analysis_id'], analysis_type, input_data)
+        return job
+
+    async def get_job(self, analysis_id: str, user_id: int) -> Optional[Dict]:
+        """Kullanıcıya ait işi döndürür"""
+        job = await self.store.get(analysis_id)
+        if job is None or job['user_id'] != user_id:
+            return None
+        return job
+
+    def get_stats(self) -> Dict:
+        return {
+            'workers': len(self._workers),
+            'queued': self._queue.qsize() if self._queue else 0,
+            'running': len(self._running_ids),
+            'max_queue_size': self.max_queue_size,
+            'owner': self.owner,
+            **self._stats
+        }
+
+    def _enqueue(self, priority: int, analysis_id: str, analysis_type: str, input_data: Dict):
+        self._queued_ids.add(analysis_id)
+        self._queue.put_nowait((priority, next(self._sequence), analysis_id, analysis_type, input_data))
+        metrics.ANALYSIS_JOBS_QUEUED.set(self._queue.qsize())
+
+    async def _recover_expired(self):
+        """Kirası dolmuş işleri kuyruğa alır; çalıştırılmadan önce claim ile sahiplenilir"""
+        for job in await self.store.get_expired():
+            if job['analysis_id'] in self._queued_ids or job['analysis_id'] in self._running_ids:
+                continue
+            self._stats['recovered'] += 1
+            self._enqueue(job['priority'], job['analysis_id'], job['analysis_type'], job['input_data'])
+
+    async def _maintain_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.store.renew_leases(self.owner, self.lease_seconds)
+                await self._recover_expired()
+            except Exception as e:
+                logger.error(f"Analiz işi kiraları yenilenemedi: {e}")
+
+    async def _worker(self):
+        while True:
+            _, _, analysis_id, analysis_type, input_data = await self._queue.get()
+            self._queued_ids.discard(analysis_id)
+            metrics.ANALYSIS_JOBS_QUEUED.set(self._queue.qsize())
+            try:
+                if not await self.store.claim(analysis_id, self.owner, self.lease_seconds):
+                    # Başka süreç aldı veya iş bitti
+                    self._stats['skipped'] += 1
+                    continue
+                self._stats['claimed'] += 1
+                await self._run(analysis_id, analysis_type, input_data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Analiz işi sahiplenilemedi ({analysis_id}): {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, analysis_id: str, analysis_type: str, input_data: Dict):
+        self._running_ids.add(analysis_id)
+        metrics.ANALYSIS_JOBS_RUNNING.inc()
+        try:
+            result = await self._handlers[analysis_type](input_data)
+            status, error_message = analysis_outcome(result)
+            updated = await self.store.update(analysis_id, status, output_data=result,
+                                              error_message=error_message, owner=self.owner)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Analiz işi hatası ({analysis_id}): {e}")
+            updated = await self.store.update(analysis_id, AnalysisStatus.FAILED, error_message=str(e), owner=self.owner)
+        finally:
+            self._running_ids.discard(analysis_id)
+            metrics.ANALYSIS_JOBS_RUNNING.dec()
+        if not updated:
+            logger.warning(f"Analiz işi ({analysis_id}) kirası dolduğu için başka sürece geçti, sonuç yazılmadı")
+
+    async def _run_blood_test(self, input_data: Dict) -> Dict:
+        return await llm_service.analyze_blood_test(
+            test_results=input_data['test_results'],
+            patient_info=input_data['patient_info']
+        )
+
+    async def _run_risk_assessment(self, input_data: Dict) -> Dict:
+        return await llm_service.assess_health_risks(
+            test_results=input_data['test_results'],
+            patient_info=input_data['patient_info']
+        )
+
+    async def _run_doctor_insights(self, input_data: Dict) -> Dict:
+        return await llm_service.generate_doctor_insights(
+            test_results=input_data['test_results'],
+            symptoms=input_data.get('symptoms') or [],
+            patient_info=input_data['patient_info']
+        )
+
+    async def _run_full(self, input_data: Dict) -> Dict:
+        return await llm_service.analyze_full(
+            test_results=input_data['test_results'],
+            symptoms=input_data.get('symptoms') or [],
+            patient_info=input_data['patient_info']
+        )
+
+# Global kuyruk instance
+analysis_job_queue = AnalysisJobQueue(
+    store=AnalysisJobStore(settings.ANALYSIS_JOB_DB_PATH),
+    concurrency=settings.ANALYSIS_WORKER_CONCURRENCY,
+    max_queue_size=settings.ANALYSIS_QUEUE_MAX_SIZE,
+    lease_seconds=settings.ANALYSIS_JOB_LEASE_SECONDS
+)
@@ -0,0 +1,232 @@
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+
+from app.core import database, metrics
+from app.core.config import settings
+from app.models.database import Analysis
+from app.services.llm_service import analysis_outcome
+
+logger = logging.getLogger(__name__)
+
+class AnalysisWriter:
+    """
+    Analiz sonuçlarını arka planda toplu olarak veritabanına yazar
+
+    Kayıtlar bellekte biriktirilir; tampon batch_size'a ulaştığında ya da
+    flush_interval saniye geçtiğinde batch_size'lık bulk insert'lerle yazılır.
+    Yazılamayan batch tamponun başına geri konur ve üstel geri çekilmeyle
+    yeniden denenir. Batch kayıt kaynaklı bir hatayla (ör. yabancı anahtar)
+    veya art arda başarısız olursa satır satır yazılır; yalnızca hatalı
+    satırlar atılır.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0, max_buffer_size: int = 10000,
+                 max_retry_delay: float = 30.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.max_retry_delay = max_retry_delay
+        self._buffer: List[Dict] = []
+        # Yazılmakta olan batch; commit edilene kadar get() tarafından bulunur
+        self._inflight: List[Dict] = []
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+        self._stats = {'written': 0, 'dropped': 0, 'failed': 0, 'flushes': 0, 'requeued': 0}
+
+    async def start(self):
+        """Periyodik flush görevini başlatır"""
+        if self._flush_task is None:
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Flush görevini durdurur ve tampondaki kayıtları (geri çekilmeyi beklemeden) yazar"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush(force=True)
+        if self._buffer:
+            logger.error(f"Kapanışta {len(self._buffer)} analiz kaydı veritabanına yazılamadı")
+
+    def enqueue(self, record: Dict):
+        """Analiz kaydını yazma tamponuna ekler"""
+        if len(self._buffer) >= self.max_buffer_size:
+            self._stats['dropped'] += 1
+            logger.error(f"Analiz yazma tamponu dolu, kayıt atlandı: {record.get('analysis_id')}")
+            return
+        self._buffer.append(record)
+        metrics.ANALYSIS_WRITE_BUFFER.set(len(self._buffer))
+        if len(self._buffer) >= self.batch_size and self._flush_event is not None:
+            self._flush_event.set()
+
+    async def flush(self, force: bool = False):
+        """
+        Tampondaki kayıtları batch_size'lık bulk insert'lerle yazar
+
+        Son yazma başarısız olduysa geri çekilme süresi dolana kadar (force
+        verilmedikçe) bir şey yapılmaz.
+        """
+        async with self._flush_lock:
+            if database.async_session_factory is None:
+                return
+            if not force and time.monotonic() < self._retry_at:
+                return
+            while self._buffer:
+                batch = self._inflight = self._buffer[:self.batch_size]
+                del self._buffer[:len(batch)]
+                metrics.ANALYSIS_WRITE_BUFFER.set(len(self._buffer))
+                try:
+                    written = await self._write_batch(batch)
+                finally:
+                    self._inflight = []
+                if not written:
+                    break
+
+    async def _write_batch(self, batch: List[Dict]) -> bool:
+        """Batch'i yazar; yeniden denenecek kayıt kaldıysa False"""
+        try:
+            await self._insert(batch)
+        except Exception as e:
+            if not self._is_record_error(e) and self._consecutive_failures < 2:
+                logger.error(f"Analiz kayıtları yazılamadı ({len(batch)} kayıt), yeniden denenecek: {e}")
+                self._requeue(batch)
+                return False
+            logger.warning(f"Toplu yazma başarısız ({len(batch)} kayıt), satır satır deneniyor: {e}")
+            return await self._write_rows(batch)
+        self._record_written(len(batch))
+        return True
+
+    async def _write_rows(self, batch: List[Dict]) -> bool:
+        """Kayıtları tek tek yazar; kayıt kaynaklı hatası olan satır atılır"""
+        for index, record in enumerate(batch):
+            try:
+                await self._insert([record])
+            except Exception as e:
+                if self._is_record_error(e):
+                    self._stats['failed'] += 1
+                    logger.error(f"Analiz kaydı reddedildi ve atıldı ({record.get('analysis_id')}): {e}")
+                    continue
+                # Bağlantı kaynaklı hata; kalan kayıtlar sonra denenir
+                logger.error(f"Analiz kayıtları yazılamadı ({len(batch) - index} kayıt), yeniden denenecek: {e}")
+                self._requeue(batch[index:])
+                return False
+            self._record_written(1)
+        return True
+
+    async def _insert(self, records: List[Dict]):
+        with metrics.stage_timer('db_write', analysis_type='all'):
+            async with database.async_session_factory() as session:
+                await session.execute(insert(Analysis), records)
+                await session.commit()
+
+    @staticmethod
+    def _is_record_error(error: Exception) -> bool:
+        """Hata kayıt içeriğinden mi (kısıt ihlali, geçersiz değer) kaynaklanıyor"""
+        if isinstance(error, (IntegrityError, DataError)):
+            return True
+        # Veritabanına gitmeden (parametre derlemede) oluşan hata
+        return isinstance(error, StatementError) and not isinstance(error, DBAPIError)
+
+    def _record_written(self, count: int):
+        self._stats['written'] += count
+        self._stats['flushes'] += 1
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+
+    def _requeue(self, records: List[Dict]):
+        """Kayıtları tamponun başına geri koyar ve bir sonraki denemeyi geciktirir"""
+        self._buffer[:0] = records
+        self._stats['requeued'] += len(records)
+        overflow = len(self._buffer) - self.max_buffer_size
+        if overflow > 0:
+            # Yazma sürerken eklenen en yeni kayıtlar atılır
+            del self._buffer[-overflow:]
+            self._stats['dropped'] += overflow
+            logger.error(f"Analiz yazma tamponu dolu, {overflow} kayıt atlandı")
+        metrics.ANALYSIS_WRITE_BUFFER.set(len(self._buffer))
+        self._consecutive_failures += 1
+        delay = min(self.max_retry_delay, self.flush_interval * (2 ** (self._consecutive_failures - 1)))
+        self._retry_at = time.monotonic() + delay
+
+    async def get(self, analysis_id: str, user_id: int) -> Optional[Dict]:
+        """Analizi önce tampondan ve yazılmakta olan batch'ten, sonra veritabanından getirir"""
+        for record in itertools.chain(reversed(self._buffer), self._inflight):
+            if record['analysis_id'] == analysis_id and record['user_id'] == user_id:
+                return self._to_dict(record)
+
+        if database.async_session_factory is None:
+            return None
+        async with database.async_session_factory() as session:
+            result = await session.execute(
+                select(Analysis).where(Analysis.analysis_id == analysis_id, Analysis.user_id == user_id)
+            )
+            analysis = result.scalar_one_or_none()
+        if analysis is None:
+            return None
+        return self._to_dict({
+            column.name: getattr(analysis, column.name) for column in Analysis.__table__.columns
+        })
+
+    def get_stats(self) -> Dict:
+        return {**self._stats, 'buffered': len(self._buffer)}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    @staticmethod
+    def _to_dict(record: Dict) -> Dict:
+        return {
+            'analysis_id': record['analysis_id'],
+            'analysis_type': record.get('analysis_type'),
+            'status': record.get('status'),
+            'input_data': record.get('input_data'),
+            'output_data': record.get('output_data'),
+            'llm_model_used': record.get('llm_model_used'),
+            'processing_time': record.get('processing_time'),
+            'error_message': record.get('error_message'),
+            'created_at': record['created_at'].isoformat() if record.get('created_at') else None,
+            'completed_at': record['completed_at'].isoformat() if record.get('completed_at') else None
+        }
+
+def build_analysis_record(analysis_id: str, user_id: int, analysis_type: str, analysis_result: Dict,
+                          test_data: Dict, processing_time: Optional[float] = None) -> Dict:
+    """Analysis tablosu için insert kaydı oluşturur; fallback sonuçlar başarısız veya kısmi olarak işaretlenir"""
+    now = datetime.now()
+    status, error_message = analysis_outcome(analysis_result)
+    return {
+        'analysis_id': analysis_id,
+        'user_id': user_id,
+        'patient_id': None,
+        'analysis_type': analysis_type,
+        'status': status,
+        'input_data': test_data,
+        'output_data': analysis_result,
+        'llm_model_used': settings.LLM_MODEL,
+        'processing_time': processing_time,
+        'error_message': error_message,
+        'created_at': now,
+        'completed_at': now
+    }
+
+# Global writer instance
+analysis_writer = AnalysisWriter(
+    batch_size=settings.DB_WRITE_BATCH_SIZE,
+    flush_interval=settings.DB_WRITE_FLUSH_INTERVAL
+)
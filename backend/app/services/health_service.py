@@ -0,0 +1,153 @@
+"""
+Canlılık ve hazır olma kontrolleri
+
+Canlılık (liveness) yalnızca sürecin ve event loop'un yanıt verdiğini
+gösterir; bağımlılıklara dokunmaz. Hazır olma (readiness) veritabanı
+havuzu, LLM devre kesicisi ve kuyrukları, event loop gecikmesi ve
+referans verisini gerçekten kontrol eder. Rapor HEALTH_CACHE_TTL boyunca
+saklanır ve eşzamanlı sondalar tek hesaplamayı bekler; sık sonda
+bağımlılıklara ek yük getirmez.
+
+Her kontrolün durumu 'ok', 'degraded' veya 'fail' olur; 'fail' içeren
+worker hazır değildir (503) ve yük dengeleyici trafiği başka worker'a verir.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core import database
+from app.core.config import settings
+from app.core.loop_monitor import loop_monitor
+from app.services.analysis_job_service import analysis_job_queue
+from app.services.llm_service import llm_service
+from app.services.reference_range_service import reference_range_service
+
+logger = logging.getLogger(__name__)
+
+class HealthService:
+    """Önbellekli hazır olma raporu üretir"""
+
+    def __init__(self, cache_ttl: float = 2.0, db_timeout: float = 1.0, require_database: bool = True,
+                 max_loop_lag: float = 0.5, max_llm_queue_depth: int = 32):
+        self.cache_ttl = cache_ttl
+        self.db_timeout = db_timeout
+        self.require_database = require_database
+        self.max_loop_lag = max_loop_lag
+        self.max_llm_queue_depth = max_llm_queue_depth
+        self._started_at = time.monotonic()
+        self._report: Optional[Tuple[float, Dict]] = None
+        self._pending: Optional[asyncio.Task] = None
+
+    def liveness(self) -> Dict:
+        return {'status': 'alive', 'uptime_seconds': round(time.monotonic() - self._started_at, 1)}
+
+    async def readiness(self) -> Dict:
+        """Son raporu döndürür; süresi dolduysa tek bir yeniden hesaplama başlatır"""
+        cached = self._report
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        task = self._pending
+        if task is None:
+            task = self._pending = asyncio.ensure_future(self._evaluate())
+            task.add_done_callback(lambda _: setattr(self, '_pending', None))
+        # Bir sondanın iptali ortak hesaplamayı iptal etmesin
+        return await asyncio.shield(task)
+
+    async def _evaluate(self) -> Dict:
+        checks = {
+            'database': await self._check_database(),
+            'llm': self._check_llm(),
+            'event_loop': self._check_event_loop(),
+            'reference_data': self._check_reference_data(),
+            'analysis_queue': self._check_analysis_queue()
+        }
+        statuses = {check['status'] for check in checks.values()}
+        if 'fail' in statuses:
+            status = 'not_ready'
+        elif 'degraded' in statuses:
+            status = 'degraded'
+        else:
+            status = 'ready'
+        report = {'status': status, 'ready': status != 'not_ready', 'checked_at': time.time(), 'checks': checks}
+        if status == 'not_ready':
+            failed = [name for name, check in checks.items() if check['status'] == 'fail']
+            logger.warning(f"Worker hazır değil: {', '.join(failed)}")
+        self._report = (time.monotonic(), report)
+        return report
+
+    async def _check_database(self) -> Dict:
+        unavailable = 'fail' if self.require_database else 'degraded'
+        engine = database.engine
+        if engine is None:
+            return {'status': unavailable, 'state': 'not_initialized'}
+        result = {}
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            capacity = pool.size() + settings.DB_MAX_OVERFLOW
+            result.update(checked_out=pool.checkedout(), capacity=capacity)
+            if pool.checkedout() >= capacity:
+                # Ping de bağlantı bekleyeceği için yapılmaz
+                return {'status': 'fail', 'state': 'saturated', **result}
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._ping(engine), self.db_timeout)
+        except Exception as e:
+            logger.warning(f"Veritabanı sağlık kontrolü başarısız: {type(e).__name__}: {e}")
+            return {'status': unavailable, 'state': 'unreachable', **result}
+        return {'status': 'ok', 'state': 'connected', 'latency_ms': round((time.perf_counter() - start) * 1000, 1), **result}
+
+    @staticmethod
+    async def _ping(engine):
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+
+    def _check_llm(self) -> Dict:
+        concurrency = llm_service.get_concurrency_stats()
+        circuit = llm_service.resilience.breaker.state
+        result = {
+            'backend': llm_service.backend.name,
+            'circuit': circuit,
+            'in_flight': concurrency['in_flight'],
+            'max_concurrency': concurrency['max_concurrency'],
+            'queue_depth': concurrency['queue_depth'],
+            'max_queue_depth': self.max_llm_queue_depth
+        }
+        if concurrency['queue_depth'] > self.max_llm_queue_depth:
+            return {'status': 'fail', **result}
+        # Sağlayıcı kesintisi tüm worker'ları etkiler; hepsini devreden çıkarmak yerine
+        # fallback yanıtlarıyla hizmet sürer
+        if not llm_service.is_configured() or circuit != 'closed':
+            return {'status': 'degraded', **result}
+        return {'status': 'ok', **result}
+
+    def _check_event_loop(self) -> Dict:
+        if not loop_monitor.running:
+            return {'status': 'ok', 'monitored': False}
+        stats = loop_monitor.get_stats()
+        status = 'fail' if loop_monitor.max_lag > self.max_loop_lag else 'ok'
+        return {'status': status, 'lag_ms': stats['lag_ms'], 'max_lag_ms': stats['max_lag_ms'],
+                'threshold_ms': round(self.max_loop_lag * 1000, 1)}
+
+    def _check_reference_data(self) -> Dict:
+        version = reference_range_service.version
+        # Yükleme başarısız olduysa boş set kullanılır; tüm değerlendirmeler 'unknown' döner
+        return {'status': 'fail' if version == 'empty' else 'ok', 'version': version}
+
+    def _check_analysis_queue(self) -> Dict:
+        stats = analysis_job_queue.get_stats()
+        result = {'queued': stats['queued'], 'max_queue_size': stats['max_queue_size'], 'workers': stats['workers']}
+        if stats['workers'] == 0 or stats['queued'] >= stats['max_queue_size']:
+            return {'status': 'fail', **result}
+        return {'status': 'ok', **result}
+
+# Global sağlık servisi instance
+health_service = HealthService(
+    cache_ttl=settings.HEALTH_CACHE_TTL,
+    db_timeout=settings.HEALTH_DB_TIMEOUT,
+    require_database=settings.HEALTH_REQUIRE_DATABASE,
+    max_loop_lag=settings.HEALTH_MAX_LOOP_LAG,
+    max_llm_queue_depth=settings.HEALTH_MAX_LLM_QUEUE_DEPTH
+)
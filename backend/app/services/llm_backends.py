@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class LLMBackend:
+    """
+    LLM sağlayıcıları için ortak arayüz
+
+    MedicalLLMService eşzamanlılık, önbellek ve single-flight katmanlarını
+    uygular; backend yalnızca bir prompt için metin üretir.
+    """
+
+    name = 'base'
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def is_configured(self) -> bool:
+        """Backend'in çağrı yapmaya hazır olup olmadığını döndürür"""
+        return True
+
+    def count_tokens(self, text: str) -> int:
+        """Yaklaşık token sayısı (ortalama ~4 karakter/token); ağ çağrısı yapmaz"""
+        return (len(text) + 3) // 4
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Hatanın geçici olup olmadığını döndürür (zaman aşımı, bağlantı hataları)"""
+        # asyncio.TimeoutError (wait_for) Python 3.11'den önce yerleşik TimeoutError'ın alt sınıfı değildir
+        return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Varsayılan olarak tüm yanıtı tek parça halinde döndürür"""
+        yield await self.generate(prompt)
+
+# Geçici sağlayıcı hataları (google.api_core.exceptions)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_GOOGLE_ERRORS = {
+    'ResourceExhausted', 'TooManyRequests', 'InternalServerError', 'ServiceUnavailable',
+    'GatewayTimeout', 'DeadlineExceeded', 'RetryError'
+}
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini backend'i; istemci ilk kullanımda oluşturulur"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str], model_name: str, temperature: float, max_output_tokens: int = 4000):
+        super().__init__(model_name)
+        self.api_key = api_key
+        self.temperature = temperature
+        self.max_output_tokens = max_output_tokens
+        self._genai = None
+        self._model = None
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """
+        Zaman aşımı, 429 ve 5xx hataları geçicidir
+
+        google.api_core hataları HTTP durum kodunu 'code' alanında taşır;
+        sınıf adı kontrolü içe aktarma gerektirmez.
+        """
+        if super().is_retryable(error):
+            return True
+        if getattr(error, 'code', None) in RETRYABLE_STATUS_CODES:
+            return True
+        return type(error).__name__ in RETRYABLE_GOOGLE_ERRORS
+
+    @property
+    def model(self):
+        """
+        Gemini modelini ilk erişimde oluşturur
+
+        google.generativeai içe aktarımı ağırdır; LLM kullanmayan worker'lar
+        ve uç noktalar bu maliyeti hiç ödemez.
+        """
+        if self._model is None:
+            if not self.api_key:
+                raise RuntimeError("GEMINI_API_KEY tanımlı değil")
+            import google.generativeai as genai
+
+            genai.configure(api_key=self.api_key)
+            self._genai = genai
+            self._model = genai.GenerativeModel(self.model_name)
+            logger.info("✅ Gemini client başlatıldı")
+        return self._model
+
+    def _generation_config(self):
+        return self._genai.types.GenerationConfig(
+            temperature=self.temperature,
+            max_output_tokens=self.max_output_tokens,
+            top_p=0.8,
+            top_k=40
+        )
+
+    async def generate(self, prompt: str) -> str:
+        model = self.model
+        response = await model.generate_content_async(prompt, generation_config=self._generation_config())
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        model = self.model
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=self._generation_config(),
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+class FakeLLMError(Exception):
+    """Sahte backend'in yapay olarak ürettiği (geçici, 503 benzeri) hata"""
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Ağ gerektirmeyen, deterministik yerel LLM backend'i (yük testi için)
+
+    Gecikme log-normal dağılımlıdır (medyan latency_ms, yayılım
+    latency_sigma); yanıt süresine token_rate ile üretim süresi eklenir.
+    Yanıt içeriği yalnızca prompt'a bağlıdır ve prompt türünün beklediği
+    JSON şemasına uyar. failure_rate olasılığıyla FakeLLMError fırlatılır;
+    malformed_rate olasılığıyla yanıt markdown bloğuna sarılır ya da yarıda
+    kesilir (JSON ayıklama ve yeniden istek yolunu sınamak için).
+    """
+
+    name = 'fake'
+
+    # Her prompt türünün JSON şablonunda bulunan ayırt edici anahtar
+    PROMPT_MARKERS = (
+        ('risk_assessment', 'genel_risk_değerlendirmesi'),
+        ('doctor_insights', 'differential_diagnosis'),
+        ('patient_education', 'onemli_bulgular'),
+        ('blood_test', 'genel_değerlendirme'),
+    )
+    # Uzun ("... Durum: low)") ve kompakt ("...; 13.5 - 17.5; low") sonuç satırları
+    _TEST_LINE = re.compile(
+        r'^\s*-\s*(?P<name>[^:\n]+):\s*(?P<value>[-\d.]+)[^\n]*?(?:Durum:\s*|;\s*)(?P<status>\w+)\)?[ \t]*$',
+        re.MULTILINE
+    )
+
+    def __init__(self, latency_ms: float = 800.0, latency_sigma: float = 0.3, tokens_per_second: float = 0.0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None, stream_chunks: int = 8,
+                 malformed_rate: float = 0.0):
+        super().__init__('fake-llm')
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self._random = random.Random(seed)
+        self._stats = {'calls': 0, 'failures': 0, 'malformed': 0}
+
+    async def generate(self, prompt: str) -> str:
+        response = self._maybe_malform(self.build_response(prompt))
+        await asyncio.sleep(self._first_token_delay() + self._generation_time(response))
+        self._maybe_fail()
+        return response
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = self._maybe_malform(self.build_response(prompt))
+        await asyncio.sleep(self._first_token_delay())
+        self._maybe_fail()
+        chunk_size = -(-len(response) // self.stream_chunks)
+        for start in range(0, len(response), chunk_size):
+            chunk = response[start:start + chunk_size]
+            await asyncio.sleep(self._generation_time(chunk))
+            yield chunk
+
+    def is_retryable(self, error: BaseException) -> bool:
+        return isinstance(error, FakeLLMError) or super().is_retryable(error)
+
+    def get_stats(self) -> Dict:
+        return dict(self._stats)
+
+    def _first_token_delay(self) -> float:
+        self._stats['calls'] += 1
+        if self.latency_ms <= 0:
+            return 0.0
+        return self._random.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _generation_time(self, text: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return self.count_tokens(text) / self.tokens_per_second
+
+    def _maybe_fail(self):
+        if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+            self._stats['failures'] += 1
+            raise FakeLLMError("Sahte LLM backend hatası")
+
+    def _maybe_malform(self, response: str) -> str:
+        if self.malformed_rate <= 0 or self._random.random() >= self.malformed_rate:
+            return response
+        self._stats['malformed'] += 1
+        if self._random.random() < 0.5:
+            return f"```json\n{response}\n```"
+        return response[:int(len(response) * self._random.uniform(0.5, 0.95))]
+
+    @classmethod
+    def prompt_type(cls, prompt: str) -> str:
+        for prompt_type, marker in cls.PROMPT_MARKERS:
+            if marker in prompt:
+                return prompt_type
+        return 'blood_test'
+
+    def build_response(self, prompt: str) -> str:
+        """Prompt türüne uygun, prompt'a göre deterministik JSON yanıtı üretir"""
+        abnormal = [
+            match.groupdict() for match in self._TEST_LINE.finditer(prompt)
+            if match.group('status') not in ('normal', 'unknown')
+        ]
+        digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8], 16)
+        builders = {
+            'blood_test': self._blood_test_response,
+            'risk_assessment': self._risk_assessment_response,
+            'doctor_insights': self._doctor_insights_response,
+            'patient_education': self._patient_education_response,
+        }
+        payload = builders[self.prompt_type(prompt)](abnormal, digest)
+        return json.dumps(payload, ensure_ascii=False)
+
+    @staticmethod
+    def _overall_status(abnormal: List[Dict]) -> str:
+        if any(item['status'].startswith('critical') for item in abnormal):
+            return 'ciddi'
+        return 'dikkat' if abnormal else 'normal'
+
+    def _blood_test_response(self, abnormal: List[Dict], digest: int) -> Dict:
+        status = self._overall_status(abnormal)
+        return {
+            'genel_değerlendirme': {
+                'genel_durum': status,
+                'acil_durum': status == 'ciddi',
+                'genel_aciklama': f"Sahte analiz #{digest % 10000}: {len(abnormal)} anormal değer",
+                'onemli_not': 'Bu bir yapay zeka önerisidir, kesin tanı için klinik değerlendirme gerekir'
+            },
+            'anormal_degerler': [
+                {
+                    'test_adi': item['name'].strip(),
+                    'deger': item['value'],
+                    'normal_aralik': 'Bilinmiyor',
+                    'durum': item['status'],
+                    'aciklama': 'Sahte backend açıklaması'
+                }
+                for item in abnormal
+            ],
+            'olası_hastalıklar': [],
+            'oneriler': {
+                'doktor_onerileri': ['Doktorunuzla görüşün'],
+                'yasam_tarzi': [],
+                'beslenme': [],
+                'uzmanlik_alani': [],
+                'takip_onerisi': 'Rutin takip'
+            },
+            'hasta_mesaji': 'Sahte backend yanıtı'
+        }
+
+    def _risk_assessment_response(self, abnormal: List[Dict], digest: int) -> Dict:
+        status = {'normal': 'normal', 'dikkat': 'orta_risk', 'ciddi': 'yüksek_risk'}[self._overall_status(abnormal)]
+        return {
+            'genel_risk_değerlendirmesi': {
+                'genel_durum': status,
+                'acil_durum': status == 'yüksek_risk',
+                'genel_aciklama': f"Sahte risk değerlendirmesi #{digest % 10000}",
+                'onemli_not': 'Bu bir yapay zeka önerisidir, kesin değerlendirme için doktorunuza başvurun'
+            },
+            'acil_riskler': [],
+            'kronik_riskler': [],
+            '30_gunluk_tahmin': {
+                'olası_komplikasyonlar': [],
+                'onleyici_tedbirler': [],
+                'takip_onerisi': 'Rutin takip'
+            },
+            'genel_risk_puani': min(100, 10 * len(abnormal)),
+            'hasta_mesaji': 'Sahte backend yanıtı'
+        }
+
+    def _doctor_insights_response(self, abnormal: List[Dict], digest: int) -> Dict:
+        status = self._overall_status(abnormal)
+        return {
+            'genel_klinik_değerlendirme': {
+                'genel_durum': status,
+                'acil_durum': status == 'ciddi',
+                'klinik_aciklama': f"Sahte klinik değerlendirme #{digest % 10000}",
+                'onemli_not': 'Bu bir yapay zeka önerisidir, klinik değerlendirme gerekir'
+            },
+            'differential_diagnosis': [],
+            'ek_testler': [item['name'].strip() for item in abnormal]
+        }
+
+    def _patient_education_response(self, abnormal: List[Dict], digest: int) -> Dict:
+        return {
+            'aciklama': f"Sahte hasta bilgilendirmesi #{digest % 10000}",
+            'onemli_bulgular': '',
+            'oneriler': ''
+        }
+
+def create_llm_backend() -> LLMBackend:
+    """Ayarlardaki LLM_BACKEND değerine göre backend oluşturur"""
+    if settings.LLM_BACKEND == 'gemini':
+        return GeminiBackend(
+            api_key=settings.GEMINI_API_KEY,
+            model_name=settings.LLM_MODEL,
+            temperature=settings.LLM_TEMPERATURE
+        )
+    if settings.LLM_BACKEND == 'fake':
+        return FakeLLMBackend(
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_sigma=settings.FAKE_LLM_LATENCY_SIGMA,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            failure_rate=settings.FAKE_LLM_FAILURE_RATE,
+            malformed_rate=settings.FAKE_LLM_MALFORMED_RATE,
+            seed=settings.FAKE_LLM_SEED
+        )
+    raise ValueError(f"Bilinmeyen LLM backend: {settings.LLM_BACKEND}")
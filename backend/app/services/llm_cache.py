@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """
+    LLM yanıtları için içerik adresli önbellek
+
+    Anahtar; prompt, model adı ve sıcaklık değerinin kanonik SHA-256
+    özetidir. Bellekte boyutu sınırlı bir LRU tutulur, istenirse yanıtlar
+    SQLite dosyasında da saklanır. Tüm kayıtlar TTL sonunda geçersiz olur;
+    süresi dolan disk kayıtları her yazmada silinir.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600, db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # Disk okuma/yazmaları worker thread'lerinde tek bağlantıyı paylaşır
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expired': 0
+        }
+        if self.db_path:
+            self._init_disk_store()
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float) -> str:
+        """Prompt, model ve sıcaklıktan kanonik önbellek anahtarı üretir"""
+        payload = json.dumps(
+            {'prompt': prompt, 'model': model, 'temperature': temperature},
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Önbellekteki yanıtı döndürür, yoksa veya süresi dolmuşsa None"""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                self._stats['memory_hits'] += 1
+                return value
+            del self._entries[key]
+            self._stats['expired'] += 1
+
+        if self.db_path:
+            # Sayaçlar yalnızca loop thread'inde güncellenir
+            disk_entry, expired = await asyncio.to_thread(self._disk_get, key, now)
+            if expired:
+                self._stats['expired'] += 1
+            if disk_entry is not None:
+                self._remember(key, *disk_entry)
+                self._stats['hits'] += 1
+                self._stats['disk_hits'] += 1
+                return disk_entry[1]
+
+        self._stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        """Yanıtı önbelleğe yazar"""
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, expires_at, value)
+        if self.db_path:
+            await asyncio.to_thread(self._disk_set, key, expires_at, value)
+
+    def clear(self):
+        """Bellekteki kayıtları temizler"""
+        self._entries.clear()
+
+    def close(self):
+        """Disk bağlantısını kapatır; sonraki disk erişimleri yeni bağlantı açar"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self) -> Dict:
+        """Önbellek isabet/ıska metrikleri"""
+        lookups = self._stats['hits'] + self._stats['misses']
+        return {
+            **self._stats,
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hit_rate': round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+            'persistent': bool(self.db_path)
+        }
+
+    def _remember(self, key: str, expires_at: float, value: str):
+        """Kaydı LRU'ya ekler, sınır aşılırsa en eski kaydı atar"""
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        """Paylaşılan bağlantıyı döndürür; çağıran _lock'u tutmalıdır"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        return self._conn
+
+    def _init_disk_store(self):
+        """SQLite tablosunu oluşturur"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS llm_cache ("
+                        "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+        except Exception as e:
+            logger.error(f"LLM önbellek veritabanı açılamadı, yalnızca bellek kullanılacak: {e}")
+            self.close()
+            self.db_path = None
+
+    def _disk_get(self, key: str, now: float) -> Tuple[Optional[Tuple[float, str]], bool]:
+        """Worker thread'de çalışır; (kayıt, süresi dolmuş mu) döndürür"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    row = conn.execute(
+                        "SELECT expires_at, value FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is None:
+                        return None, False
+                    if row[0] <= now:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        return None, True
+                    return (row[0], row[1]), False
+        except Exception as e:
+            logger.error(f"LLM önbellek okuma hatası: {e}")
+            return None, False
+
+    def _disk_set(self, key: str, expires_at: float, value: str):
+        """Worker thread'de çalışır; kaydı yazar ve süresi dolan kayıtları siler"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO llm_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                        (key, expires_at, value)
+                    )
+        except Exception as e:
+            logger.error(f"LLM önbellek yazma hatası: {e}")
@@ -0,0 +1,193 @@
+"""
+LLM çıktısından JSON çıkarma, onarma ve şema doğrulama
+
+Model yanıtı markdown blokları veya açıklama metniyle sarılmış, ya da
+max_output_tokens sınırında yarıda kesilmiş olabilir. IncrementalJSONParser
+metni (akışta parça parça) tek geçişte tarar: ilk '{' ile başlayan üst
+düzey nesneyi bulur, istenirse kesilmiş yapıları son tamamlanmış değerden
+kapatarak onarır. parse_analysis sonucu prompt türünün şemasına göre
+doğrular; kesilmiş yanıt onarılmaz, 'truncated' olarak reddedilir (kapatılan
+bir liste anormal değerleri eksik gösterebilir).
+"""
+import copy
+import json
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Kesilmiş yanıtta denenecek en fazla kesme noktası (sondan başa)
+MAX_REPAIR_ATTEMPTS = 32
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+class LLMResponseParseError(ValueError):
+    """LLM yanıtı (yeniden istekten sonra da) şemaya uygun çözülemediğinde fırlatılır"""
+
+class IncrementalJSONParser:
+    """
+    Metin parçalarından üst düzey JSON nesnesini çıkaran artımlı ayrıştırıcı
+
+    Tarama durumu (açık parantez yığını, string içi/kaçış) parçalar
+    arasında korunur; her karakter bir kez işlenir. Nesne kapandıktan
+    sonra gelen metin (ör. kapanış ```) yok sayılır.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        # (metin uzunluğu, yığın): bu noktada kesilip yığın kapatılırsa geçerli JSON olması beklenir
+        self._cut_points = deque(maxlen=MAX_REPAIR_ATTEMPTS)
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    @property
+    def truncated(self) -> bool:
+        """Nesne başladı ama kapanmadan metin bitti"""
+        return self._start is not None and self._end is None
+
+    def feed(self, chunk: str) -> bool:
+        """Parçayı işler; üst düzey nesne tamamlandıysa True döndürür"""
+        if self._end is not None:
+            return True
+        offset = self._length
+        self._parts.append(chunk)
+        self._length += len(chunk)
+        for i, char in enumerate(chunk):
+            position = offset + i
+            if self._start is None:
+                if char == '{':
+                    self._start = position
+                    self._stack.append(char)
+                    self._cut_points.append((position + 1, tuple(self._stack)))
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(char)
+                self._cut_points.append((position + 1, tuple(self._stack)))
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    self._end = position + 1
+                    return True
+                self._cut_points.append((position + 1, tuple(self._stack)))
+            elif char == ',':
+                self._cut_points.append((position, tuple(self._stack)))
+        return False
+
+    def value(self, repair: bool = True) -> Tuple[Optional[Any], bool]:
+        """(nesne, onarıldı mı) döndürür; nesne bulunamazsa (None, False)"""
+        if self._start is None:
+            return None, False
+        text = ''.join(self._parts)
+        if self._end is not None:
+            try:
+                return json.loads(text[self._start:self._end]), False
+            except ValueError:
+                return None, False
+        if not repair:
+            return None, False
+
+        tail = text[self._start:]
+        candidates = []
+        if self._in_string:
+            # Değer string'i içinde kesildiyse string kapatılarak denenir
+            candidates.append(tail + ('\\' if self._escape else '') + '"' + self._closing(self._stack))
+        else:
+            candidates.append(tail.rstrip().rstrip(',') + self._closing(self._stack))
+        for end, stack in reversed(self._cut_points):
+            candidates.append(text[self._start:end] + self._closing(stack))
+        for candidate in candidates:
+            try:
+                return json.loads(candidate), True
+            except ValueError:
+                continue
+        return None, False
+
+    @staticmethod
+    def _closing(stack) -> str:
+        return ''.join(_CLOSERS[opener] for opener in reversed(stack))
+
+def extract_json(text: str, repair: bool = True) -> Tuple[Optional[Any], bool]:
+    """Metindeki ilk JSON nesnesini (gerekirse onararak) döndürür"""
+    parser = IncrementalJSONParser()
+    parser.feed(text or '')
+    return parser.value(repair)
+
+# Prompt türü -> (zorunlu alanlar, eksikse varsayılanla doldurulan alanlar)
+ANALYSIS_SCHEMAS: Dict[str, Tuple[Dict[str, type], Dict[str, Any]]] = {
+    'blood_test': (
+        {'genel_değerlendirme': dict},
+        {'anormal_degerler': [], 'olası_hastalıklar': [], 'oneriler': {}, 'hasta_mesaji': ''}
+    ),
+    'risk_assessment': (
+        {'genel_risk_değerlendirmesi': dict},
+        {'acil_riskler': [], 'kronik_riskler': [], '30_gunluk_tahmin': {}, 'genel_risk_puani': 0, 'hasta_mesaji': ''}
+    ),
+    'doctor_insights': (
+        {'genel_klinik_değerlendirme': dict},
+        {'differential_diagnosis': [], 'ek_testler': []}
+    ),
+    'patient_education': (
+        {'aciklama': str},
+        {'onemli_bulgular': '', 'oneriler': ''}
+    ),
+}
+
+class ParsedResponse(NamedTuple):
+    data: Optional[Dict]
+    # ok | repaired | truncated | invalid | not_json
+    outcome: str
+    problems: List[str]
+
+def parse_analysis(source, prompt_type: str) -> ParsedResponse:
+    """
+    Yanıt metnini veya beslenmiş bir IncrementalJSONParser'ı şemaya göre çözer
+
+    Kesilmiş, zorunlu alanı eksik veya yanlış türde olan yanıtlar data=None
+    ile döner; eksik isteğe bağlı alanlar varsayılanlarla tamamlanıp
+    'repaired' sayılır.
+    """
+    parser = source
+    if not isinstance(source, IncrementalJSONParser):
+        parser = IncrementalJSONParser()
+        parser.feed(source or '')
+    if parser.truncated:
+        return ParsedResponse(None, 'truncated', [])
+    data, _ = parser.value(repair=False)
+    if not isinstance(data, dict):
+        return ParsedResponse(None, 'not_json', [])
+
+    required, optional = ANALYSIS_SCHEMAS[prompt_type]
+    problems = [key for key, expected in required.items() if not isinstance(data.get(key), expected)]
+    if problems:
+        return ParsedResponse(None, 'invalid', problems)
+    missing = [key for key in optional if key not in data]
+    for key in missing:
+        data[key] = copy.deepcopy(optional[key])
+    return ParsedResponse(data, 'repaired' if missing else 'ok', [])
+
+def reask_instruction(parsed: ParsedResponse) -> str:
+    """Başarısız çözümleme için prompt'a eklenecek hedefli düzeltme talimatı"""
+    if parsed.outcome == 'truncated':
+        return "\nÖnceki yanıtın yarıda kesildi. Açıklamaları kısaltarak şemaya uyan JSON'un tamamını döndür.\n"
+    if parsed.outcome == 'invalid':
+        return (f"\nÖnceki yanıtta şu alanlar eksik veya hatalıydı: {', '.join(parsed.problems)}. "
+                "Yalnızca şemaya uyan geçerli JSON döndür.\n")
+    return "\nÖnceki yanıt geçerli JSON değildi. Yalnızca şemaya uyan geçerli JSON döndür.\n"
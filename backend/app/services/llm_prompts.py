@@ -0,0 +1,197 @@
+"""
+Token bütçeli, kompakt LLM prompt'ları
+
+Her prompt sabit bir önek (ortak kurallar + analiz türünün yanıt şeması)
+ve ardından hastaya özgü veriden oluşur. Önek süreç boyunca değişmediği
+için sağlayıcıların prefix önbelleğinden yararlanır. Test sonuçları
+anormaller önce olacak şekilde sıralanır; prompt bütçeyi aşarsa önce
+normal sonuçlar özetlenir/atılır, sonra en düşük öncelikli anormal
+satırlar kırpılır.
+"""
+import json
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+PROMPT_MODES = ('compact', 'verbose')
+# Sıra önemlidir: bütçe aşıldığında listede sağa doğru ilerlenir
+NORMAL_RESULT_MODES = ('full', 'aggregate', 'omit')
+
+# Küçük değer önce; aynı öncelikte giriş sırası korunur
+STATUS_PRIORITY = {'critical_high': 0, 'critical_low': 0, 'high': 1, 'low': 1, 'unknown': 2, 'normal': 3}
+
+COMMON_PREFIX = (
+    "Yalnızca geçerli JSON döndür, başka metin ekleme. Şemada str metin, bool true/false, "
+    "int tam sayı, \"a|b\" seçeneklerden biri demektir. Hastayı korkutmayan, profesyonel bir dil "
+    "ve doğru tıbbi terminoloji kullan; acil durumları net belirt.\n"
+)
+
+TEMPLATES = {
+    'blood_test': (
+        "Rol: deneyimli tıbbi laboratuvar uzmanı. Görev: kan tahlili sonuçlarını analiz et; "
+        "açıklamalar doktor dilinde ama anlaşılır olsun.\n"
+        'Şema: {"genel_değerlendirme":{"genel_durum":"normal|dikkat|ciddi","acil_durum":bool,'
+        '"genel_aciklama":str,"onemli_not":str},"anormal_degerler":[{"test_adi":str,"deger":str,'
+        '"normal_aralik":str,"durum":"normal|düşük|yüksek|kritik_düşük|kritik_yüksek","aciklama":str}],'
+        '"olası_hastalıklar":[str],"oneriler":{"doktor_onerileri":[str],"yasam_tarzi":[str],'
+        '"beslenme":[str],"uzmanlik_alani":[str],"takip_onerisi":str},"hasta_mesaji":str}\n'
+        'onemli_not: "Bu bir yapay zeka önerisidir, kesin tanı için klinik değerlendirme gerekir"\n'
+    ),
+    'risk_assessment': (
+        "Rol: deneyimli tıbbi risk değerlendirme uzmanı. Görev: test sonuçlarına göre sağlık "
+        "risklerini objektif değerlendir.\n"
+        'Şema: {"genel_risk_değerlendirmesi":{"genel_durum":"normal|düşük_risk|orta_risk|yüksek_risk",'
+        '"acil_durum":bool,"genel_aciklama":str,"onemli_not":str},"acil_riskler":[str],'
+        '"kronik_riskler":[str],"30_gunluk_tahmin":{"olası_komplikasyonlar":[str],'
+        '"onleyici_tedbirler":[str],"takip_onerisi":str},"genel_risk_puani":int 0-100,"hasta_mesaji":str}\n'
+        'onemli_not: "Bu bir yapay zeka önerisidir, kesin değerlendirme için doktorunuza başvurun"\n'
+    ),
+    'doctor_insights': (
+        "Rol: deneyimli klinik uzman. Görev: test sonuçları ve semptomlardan doktorlar için klinik "
+        "içgörü üret; diferansiyel tanıları önem sırasına göre sırala.\n"
+        'Şema: {"genel_klinik_değerlendirme":{"genel_durum":"normal|dikkat|ciddi","acil_durum":bool,'
+        '"klinik_aciklama":str,"onemli_not":str},"differential_diagnosis":[str],"ek_testler":[str]}\n'
+        'onemli_not: "Bu bir yapay zeka önerisidir, klinik değerlendirme gerekir"\n'
+    ),
+    'patient_education': (
+        "Rol: deneyimli hasta eğitimi uzmanı. Görev: tanı ve tedavi planına göre hastanın anlayacağı "
+        "seviyede eğitim materyali hazırla; \"Merhaba\", \"endişelenmeyin\" gibi samimi ifadeler kullanma.\n"
+        'Şema: {"aciklama":str,"onemli_bulgular":str,"oneriler":str}\n'
+    ),
+}
+
+class PromptBudgetError(ValueError):
+    """Prompt'un sabit kısmı bile token bütçesine sığmadığında fırlatılır"""
+
+class PromptBuilder:
+    """
+    Analiz türlerine göre kompakt prompt üretir ve token bütçesini uygular
+
+    count_tokens backend'in token sayacıdır; token_budget 0 ise sınır
+    uygulanmaz. verbose modda servis eski uzun şablonları kullanır ve
+    yalnızca bütçeyi aşanlar bu sınıfla yeniden oluşturulur.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], mode: str = 'compact',
+                 normal_results: str = 'aggregate', token_budget: int = 0):
+        if mode not in PROMPT_MODES:
+            raise ValueError(f"Bilinmeyen prompt modu: {mode}")
+        if normal_results not in NORMAL_RESULT_MODES:
+            raise ValueError(f"Bilinmeyen normal sonuç modu: {normal_results}")
+        self.count_tokens = count_tokens
+        self.mode = mode
+        self.normal_results = normal_results
+        self.token_budget = token_budget
+
+    @property
+    def compact(self) -> bool:
+        return self.mode == 'compact'
+
+    @staticmethod
+    def static_prefix(prompt_type: str) -> str:
+        """Analiz türünün hastadan bağımsız, her çağrıda aynı olan öneki"""
+        return COMMON_PREFIX + TEMPLATES[prompt_type]
+
+    def fits(self, prompt: str, prompt_type: str) -> bool:
+        """Hazır bir prompt'un bütçeye sığıp sığmadığını döndürür (sığarsa ölçülür)"""
+        tokens = self.count_tokens(prompt)
+        if self.token_budget and tokens > self.token_budget:
+            logger.info(f"{prompt_type} prompt'u bütçeyi aşıyor ({tokens} > {self.token_budget} token), kompakt biçime geçiliyor")
+            return False
+        metrics.PROMPT_TOKENS.labels(prompt_type=prompt_type).observe(tokens)
+        return True
+
+    def blood_test(self, evaluated_results: List[Dict], patient_info: Dict) -> str:
+        return self._build_with_results('blood_test', self._patient_line(patient_info, with_test_type=True), evaluated_results)
+
+    def risk_assessment(self, evaluated_results: List[Dict], patient_info: Dict) -> str:
+        return self._build_with_results('risk_assessment', self._patient_line(patient_info), evaluated_results)
+
+    def doctor_insights(self, evaluated_results: List[Dict], symptoms: List[str], patient_info: Dict) -> str:
+        header = (
+            self._patient_line(patient_info)
+            + f"Semptomlar: {', '.join(symptoms) if symptoms else 'belirtilmemiş'}\n"
+        )
+        return self._build_with_results('doctor_insights', header, evaluated_results)
+
+    def patient_education(self, diagnosis: str, treatment_plan: Dict, patient_language: str = "tr") -> str:
+        prompt = (
+            self.static_prefix('patient_education')
+            + f"Yanıt dili: {patient_language}\n"
+            + f"Tanı: {diagnosis}\n"
+            + f"Tedavi planı: {json.dumps(treatment_plan, ensure_ascii=False, separators=(',', ':'), default=str)}\n"
+        )
+        return self._finish('patient_education', prompt, trimmed=False)
+
+    @staticmethod
+    def _patient_line(patient_info: Dict, with_test_type: bool = False) -> str:
+        line = f"Hasta: yaş {patient_info.get('age', 'bilinmiyor')}, cinsiyet {patient_info.get('gender') or 'bilinmiyor'}"
+        if with_test_type:
+            line += f", test türü {patient_info.get('test_type') or 'genel'}"
+        return line + "\n"
+
+    @staticmethod
+    def _result_line(result: Dict) -> str:
+        evaluation = result.get('evaluation', {})
+        unit = f" {result['unit']}" if result.get('unit') else ''
+        return (f"- {result['test_name']}: {result['value']}{unit}; "
+                f"{evaluation.get('reference_range') or '-'}; {evaluation.get('status', 'unknown')}")
+
+    @staticmethod
+    def _split_results(evaluated_results: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Sonuçları (önem sırasına göre anormaller, normaller) olarak ayırır"""
+        abnormal, normal = [], []
+        for result in evaluated_results:
+            status = result.get('evaluation', {}).get('status', 'unknown')
+            (normal if status == 'normal' else abnormal).append(result)
+        abnormal.sort(key=lambda result: STATUS_PRIORITY.get(result.get('evaluation', {}).get('status'), 2))
+        return abnormal, normal
+
+    def _render_results(self, abnormal_lines: List[str], normal: List[Dict], normal_mode: str, dropped: int = 0) -> str:
+        lines = ["Sonuçlar (test: değer birim; referans; durum), anormaller önce:"]
+        lines.extend(abnormal_lines)
+        if dropped:
+            lines.append(f"- (+{dropped} düşük öncelikli anormal sonuç bütçe nedeniyle listelenmedi)")
+        if normal:
+            if normal_mode == 'full':
+                lines.extend(self._result_line(result) for result in normal)
+            elif normal_mode == 'aggregate':
+                lines.append(f"Normal aralıkta ({len(normal)}): {', '.join(result['test_name'] for result in normal)}")
+            else:
+                lines.append(f"Normal aralıkta: {len(normal)} test (listelenmedi)")
+        return '\n'.join(lines) + '\n'
+
+    def _build_with_results(self, prompt_type: str, header: str, evaluated_results: List[Dict]) -> str:
+        fixed = self.static_prefix(prompt_type) + header
+        abnormal, normal = self._split_results(evaluated_results)
+        abnormal_lines = [self._result_line(result) for result in abnormal]
+
+        start = NORMAL_RESULT_MODES.index(self.normal_results)
+        for normal_mode in NORMAL_RESULT_MODES[start:]:
+            prompt = fixed + self._render_results(abnormal_lines, normal, normal_mode)
+            if self._within_budget(prompt):
+                return self._finish(prompt_type, prompt, trimmed=normal_mode != self.normal_results)
+
+        # Normal sonuçlar atıldığı halde sığmıyorsa en düşük öncelikli anormal satırlar kırpılır
+        kept = list(abnormal_lines)
+        while kept:
+            kept.pop()
+            prompt = fixed + self._render_results(kept, normal, 'omit', dropped=len(abnormal_lines) - len(kept))
+            if self._within_budget(prompt):
+                return self._finish(prompt_type, prompt, trimmed=True)
+        return self._finish(prompt_type, fixed, trimmed=True)
+
+    def _within_budget(self, prompt: str) -> bool:
+        return not self.token_budget or self.count_tokens(prompt) <= self.token_budget
+
+    def _finish(self, prompt_type: str, prompt: str, trimmed: bool) -> str:
+        tokens = self.count_tokens(prompt)
+        if self.token_budget and tokens > self.token_budget:
+            raise PromptBudgetError(f"{prompt_type} prompt'u token bütçesine sığmıyor ({tokens} > {self.token_budget})")
+        if trimmed:
+            metrics.PROMPT_TRIMS.labels(prompt_type=prompt_type).inc()
+        metrics.PROMPT_TOKENS.labels(prompt_type=prompt_type).observe(tokens)
+        return prompt
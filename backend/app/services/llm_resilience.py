@@ -0,0 +1,297 @@
+"""
+LLM çağrıları için dayanıklılık katmanı: yeniden deneme, hedging, devre kesici
+
+Geçici hatalar (zaman aşımı, 429/5xx, bağlantı hataları) üstel geri çekilme
+ve jitter ile yeniden denenir. İsteğe bağlı hedging, çağrı gözlenen p95
+gecikmesini aştığında ikinci bir istek başlatır ve önce biteni kullanır.
+Devre kesici, sağlayıcı sağlıksızken çağrıları hemen CircuitOpenError ile
+reddeder; servis bu durumda beklemeden fallback yanıtına geçer.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+class CircuitOpenError(Exception):
+    """Devre açıkken yapılan çağrı hemen reddedildiğinde fırlatılır"""
+
+class CircuitBreaker:
+    """
+    Kayan penceredeki hata oranına göre açılan devre kesici
+
+    Son window_size sonuçtan en az min_calls tanesi varken hata oranı
+    failure_threshold'u aşarsa devre open_seconds boyunca açılır. Süre
+    dolunca tek bir deneme çağrısına izin verilir (half_open); başarılıysa
+    devre kapanır, başarısızsa yeniden açılır.
+    """
+
+    def __init__(self, failure_threshold: float = 0.5, window_size: int = 20, min_calls: int = 10,
+                 open_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        # Durum değiştiğinde çağrılır (ör. metrik güncellemesi)
+        self.on_state_change: Optional[Callable[[str], None]] = None
+        self._state = 'closed'
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    def before_call(self) -> bool:
+        """
+        Çağrıya izin verilmiyorsa CircuitOpenError fırlatır
+
+        Dönen değer çağrının half_open deneme çağrısı olup olmadığıdır; sonuç
+        record_* metotlarına aynı değerle bildirilir. Devre açılmadan önce
+        başlamış çağrıların geç gelen sonuçları devrenin durumunu değiştirmez.
+        """
+        if self.state == 'open':
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self._reject(f"LLM devresi açık, {remaining:.0f} sn sonra yeniden denenecek")
+            self.state = 'half_open'
+        if self.state == 'half_open':
+            if self._probe_in_flight:
+                self._reject("LLM devresi yarı açık, deneme çağrısı sürüyor")
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self, probe: bool = False):
+        if probe:
+            self._probe_in_flight = False
+            self._outcomes.clear()
+            self.state = 'closed'
+            logger.info("LLM devresi kapandı, sağlayıcı yeniden sağlıklı")
+        elif self.state != 'closed':
+            return
+        self._outcomes.append(True)
+
+    def record_failure(self, probe: bool = False):
+        if probe:
+            self._probe_in_flight = False
+            self._open()
+            return
+        if self.state != 'closed':
+            return
+        self._outcomes.append(False)
+        if len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.failure_threshold:
+            self._open()
+
+    def record_ignored(self, probe: bool = False):
+        """Sağlıkla ilgisi olmayan hata (ör. geçersiz istek); deneme çağrısı serbest bırakılır"""
+        if probe:
+            self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @state.setter
+    def state(self, state: str):
+        self._state = state
+        if self.on_state_change is not None:
+            self.on_state_change(state)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == 'open'
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._stats['opened'] += 1
+        self.state = 'open'
+        logger.warning(f"LLM devresi açıldı (hata oranı {self.failure_rate():.0%}), çağrılar {self.open_seconds:.0f} sn fallback'e yönlendirilecek")
+
+    def _reject(self, message: str):
+        self._stats['rejected'] += 1
+        raise CircuitOpenError(message)
+
+    def get_stats(self) -> Dict:
+        stats = {
+            'state': self.state,
+            'failure_rate': round(self.failure_rate(), 3),
+            'window_calls': len(self._outcomes),
+            **self._stats
+        }
+        if self.state == 'open':
+            stats['retry_in_seconds'] = round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+        return stats
+
+class LatencyTracker:
+    """Son başarılı çağrıların gecikmesinden yüzdelik değer hesaplar"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Yeterli örnek yoksa None"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+class ResilientCaller:
+    """
+    Tek bir LLM çağrısını devre kesici, yeniden deneme ve hedging ile sarar
+
+    operation her çağrıldığında yeni bir backend isteği başlatmalıdır;
+    çağrı başına zaman aşımı operation içinde uygulanır (kuyrukta bekleme
+    süresi sağlayıcıya yazılmasın). is_retryable backend'in hata sınıflandırmasıdır.
+    can_hedge False döndürürse (ör. eşzamanlılık sınırı dolu) ikinci istek başlatılmaz.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, hedge_enabled: bool = False, hedge_min_delay: float = 1.0,
+                 rng: Optional[random.Random] = None):
+        self.breaker = breaker
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        self._random = rng or random.Random()
+        self._stats = {'retries': 0, 'hedges': 0, 'hedges_won': 0}
+
+    async def call(self, operation: Callable[[], Awaitable[T]], is_retryable: Callable[[BaseException], bool],
+                   backend_name: str, can_hedge: Callable[[], bool] = lambda: True) -> T:
+        probe = self.breaker.before_call()
+        attempt = 1
+        while True:
+            start = time.perf_counter()
+            try:
+                result = await self._attempt(operation, backend_name, can_hedge)
+            except Exception as e:
+                await self._retry_or_raise(e, attempt, is_retryable, backend_name, probe, can_retry=True)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.record_ignored(probe)
+                raise
+            self.breaker.record_success(probe)
+            self.latency.observe(time.perf_counter() - start)
+            return result
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator[T]], is_retryable: Callable[[BaseException], bool],
+                     backend_name: str) -> AsyncIterator[T]:
+        """
+        Akış çağrısını devre kesici ve yeniden deneme ile sarar
+
+        İlk parça gönderildikten sonra yeniden denenemez (istemci yarım
+        yanıtı almıştır); hata olduğu gibi iletilir. Hedging uygulanmaz.
+        """
+        probe = self.breaker.before_call()
+        attempt = 1
+        while True:
+            started = False
+            try:
+                async for chunk in open_stream():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                await self._retry_or_raise(e, attempt, is_retryable, backend_name, probe, can_retry=not started)
+                attempt += 1
+                continue
+            except BaseException:
+                # Tüketici akışı erken kapattı veya iptal etti
+                self.breaker.record_ignored(probe)
+                raise
+            self.breaker.record_success(probe)
+            return
+
+    async def _retry_or_raise(self, error: Exception, attempt: int, is_retryable: Callable[[BaseException], bool],
+                              backend_name: str, probe: bool, can_retry: bool):
+        """
+        Yeniden denenecekse geri çekilme süresi kadar bekler, aksi halde hatayı fırlatır
+
+        Devre kesiciye mantıksal çağrı başına tek sonuç işlenir (denemeler
+        değil); yeniden denemeyle kurtarılan geçici hatalar devreyi açmaz.
+        """
+        if not is_retryable(error):
+            self.breaker.record_ignored(probe)
+            raise error
+        # Başka çağrılar devreyi açtıysa yeniden denenmez
+        if not can_retry or attempt >= self.max_attempts or self.breaker.is_open:
+            self.breaker.record_failure(probe)
+            raise error
+        delay = self.backoff(attempt - 1)
+        self._stats['retries'] += 1
+        metrics.LLM_RETRIES.labels(backend=backend_name).inc()
+        logger.warning(f"LLM çağrısı başarısız ({type(error).__name__}: {error}), {delay:.2f} sn sonra yeniden denenecek "
+                       f"({attempt + 1}/{self.max_attempts})")
+        await asyncio.sleep(delay)
+
+    def backoff(self, attempt: int) -> float:
+        """Tam jitter'lı üstel geri çekilme: [0, min(max_delay, base * 2^attempt)]"""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Hedging kapalıysa veya yeterli gecikme örneği yoksa None"""
+        if not self.hedge_enabled:
+            return None
+        p95 = self.latency.percentile(95)
+        return None if p95 is None else max(self.hedge_min_delay, p95)
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], backend_name: str,
+                       can_hedge: Callable[[], bool]) -> T:
+        delay = self.hedge_delay()
+        if delay is None:
+            return await operation()
+
+        primary = asyncio.ensure_future(operation())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not can_hedge():
+                return await primary
+            hedge = asyncio.ensure_future(operation())
+            self._stats['hedges'] += 1
+            metrics.LLM_HEDGES.labels(backend=backend_name, outcome='launched').inc()
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats['hedges_won'] += 1
+                            metrics.LLM_HEDGES.labels(backend=backend_name, outcome='won').inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Kaybeden (veya dış iptalde her iki) istek iptal edilir
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def get_stats(self) -> Dict:
+        p95 = self.latency.percentile(95)
+        return {
+            'circuit': self.breaker.get_stats(),
+            'max_attempts': self.max_attempts,
+            'hedge_enabled': self.hedge_enabled,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+            **self._stats
+        }
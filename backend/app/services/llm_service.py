@@ -1,44 +1,117 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, AsyncIterator, Tuple
+from contextlib import asynccontextmanager
 import asyncio
 import logging
-import google.generativeai as genai
+from app.core import metrics
 from app.core.config import settings
 from app.services.reference_range_service import reference_range_service
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_backends import LLMBackend, create_llm_backend
+from app.services.llm_json import IncrementalJSONParser, LLMResponseParseError, ParsedResponse, parse_analysis, reask_instruction
+from app.services.llm_prompts import PromptBuilder
+from app.services.llm_resilience import CIRCUIT_STATES, CircuitBreaker, CircuitOpenError, ResilientCaller
+from app.services.llm_templates import TemplateResponder
+from app.models.database import AnalysisStatus, AnalysisType
 
 logger = logging.getLogger(__name__)
 
+# LLM analizi yapılamadığında dönen fallback yanıtlarını işaretleyen anahtar
+FALLBACK_KEY = 'fallback'
+
+def is_fallback_response(result: Dict) -> bool:
+    """Yanıtın tamamen fallback olup olmadığını döndürür (birleşik analizde tüm dallar başarısız)"""
+    return result.get(FALLBACK_KEY) is True
+
+def analysis_outcome(result: Dict) -> Tuple[str, Optional[str]]:
+    """
+    Analiz sonucunun (durum, hata mesajı) ikilisi
+
+    LLM servisi hatada istisna yerine fallback yanıtı döndürür; iş kuyruğu,
+    kayıtlar ve toplu analiz durumu buradan belirler.
+    """
+    if is_fallback_response(result):
+        return AnalysisStatus.FAILED, "LLM analizi tamamlanamadı, fallback yanıtı döndü"
+    failed = result.get('failed_analyses')
+    if failed:
+        return AnalysisStatus.COMPLETED_WITH_FALLBACK, f"Fallback yanıtıyla tamamlanan analizler: {', '.join(failed)}"
+    return AnalysisStatus.COMPLETED, None
+
 class MedicalLLMService:
-    """Tıbbi analiz için LLM servisi (Sadece Gemini)"""
-    def __init__(self):
-        self.gemini_model = None
-        self._initialize_clients()
+    """Tıbbi analiz için LLM servisi (backend: Gemini veya yük testi için sahte backend)"""
+    def __init__(self, backend: Optional[LLMBackend] = None):
+        # Backend verilmezse ayarlardan ilk kullanımda oluşturulur (bkz. backend)
+        self._backend = backend
+        # Eşzamanlı LLM çağrılarını sınırlar; bekleyen ve çalışan çağrılar sayılır
+        self._llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        self._llm_waiting = 0
+        self._llm_in_flight = 0
+        # Aynı prompt için devam eden üretimler (single-flight)
+        self._pending_generations: Dict[str, asyncio.Task] = {}
+        self._coalesced_requests = 0
+        # Zaman aşımı, yeniden deneme, hedging ve devre kesici
+        self.resilience = ResilientCaller(
+            breaker=CircuitBreaker(
+                failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                window_size=settings.LLM_CIRCUIT_WINDOW,
+                min_calls=settings.LLM_CIRCUIT_MIN_CALLS,
+                open_seconds=settings.LLM_CIRCUIT_OPEN_SECONDS
+            ),
+            max_attempts=settings.LLM_RETRY_MAX_ATTEMPTS,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY,
+            hedge_enabled=settings.LLM_HEDGE_ENABLED,
+            hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY
+        )
+        self.prompt_builder = PromptBuilder(
+            count_tokens=lambda text: self.backend.count_tokens(text),
+            mode=settings.LLM_PROMPT_MODE,
+            normal_results=settings.LLM_PROMPT_NORMAL_RESULTS,
+            token_budget=settings.LLM_INPUT_TOKEN_BUDGET
+        )
+        self.template_responder = TemplateResponder(
+            enabled=settings.LLM_TEMPLATE_FAST_PATH,
+            max_abnormal=settings.LLM_TEMPLATE_MAX_ABNORMAL,
+            max_deviation=settings.LLM_TEMPLATE_MAX_DEVIATION
+        )
+        self.response_cache = LLMResponseCache(
+            max_size=settings.LLM_CACHE_MAX_SIZE,
+            ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+            db_path=settings.LLM_CACHE_DB_PATH
+        ) if settings.LLM_CACHE_ENABLED else None
+    
+    @property
+    def backend(self) -> LLMBackend:
+        if self._backend is None:
+            self._backend = create_llm_backend()
+            if not self._backend.is_configured():
+                logger.warning(f"LLM backend ({self._backend.name}) yapılandırılmamış, LLM analizleri fallback yanıtlarıyla dönecek")
+        return self._backend
     
-    def _initialize_clients(self):
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-pro')
-            logger.info("✅ Gemini client başlatıldı")
+    def is_configured(self) -> bool:
+        """LLM backend'inin çağrı yapmaya hazır olup olmadığını döndürür (istemci oluşturmadan)"""
+        return self.backend.is_configured()
 
+    @metrics.analyzed(AnalysisType.BLOOD_TEST)
     async def analyze_blood_test(self, test_results: List[Dict], patient_info: Dict) -> Dict:
         try:
-            evaluated_results = []
-            for test in test_results:
-                evaluation = reference_range_service.evaluate_test_result(
-                    test_name=test['test_name'],
-                    value=test['value'],
-                    age=patient_info['age'],
-                    gender=patient_info.get('gender')
-                )
-                evaluated_results.append({
-                    **test,
-                    'evaluation': evaluation
-                })
-            prompt = self._create_blood_test_prompt(evaluated_results, patient_info)
-            if self.gemini_model:
-                response = await self._call_gemini(prompt)
+            evaluated_results = self._evaluate_results(test_results, patient_info)
+        except Exception as e:
+            logger.error(f"LLM analiz hatası: {e}")
+            return self._get_fallback_response()
+        return await self._analyze_evaluated_blood_test(evaluated_results, patient_info)
+
+    async def _analyze_evaluated_blood_test(self, evaluated_results: List[Dict], patient_info: Dict) -> Dict:
+        """Önceden değerlendirilmiş test sonuçları için kan tahlili analizi"""
+        try:
+            mild = self.template_responder.match(evaluated_results, AnalysisType.BLOOD_TEST)
+            if mild is not None:
+                llm_analysis = self.template_responder.blood_test(evaluated_results, mild)
+            elif self.is_configured():
+                prompt = self._create_blood_test_prompt(evaluated_results, patient_info)
+                response = await self._generate(prompt, AnalysisType.BLOOD_TEST)
+                llm_analysis = await self._resolve_analysis(prompt, response, AnalysisType.BLOOD_TEST)
             else:
-                raise Exception("Gemini LLM client bulunamadı")
-            llm_analysis = self._parse_analysis_response(response)
+                raise Exception("LLM client bulunamadı")
             return {
                 'test_evaluations': evaluated_results,
                 'llm_analysis': llm_analysis,
@@ -48,71 +121,196 @@ class MedicalLLMService:
             logger.error(f"LLM analiz hatası: {e}")
             return self._get_fallback_response()
 
+    @metrics.analyzed(AnalysisType.RISK_ASSESSMENT)
     async def assess_health_risks(self, test_results: List[Dict], patient_info: Dict) -> Dict:
         try:
-            evaluated_results = []
-            for test in test_results:
-                evaluation = reference_range_service.evaluate_test_result(
-                    test_name=test['test_name'],
-                    value=test['value'],
-                    age=patient_info['age'],
-                    gender=patient_info.get('gender')
-                )
-                evaluated_results.append({
-                    **test,
-                    'evaluation': evaluation
-                })
+            evaluated_results = self._evaluate_results(test_results, patient_info)
+            mild = self.template_responder.match(evaluated_results, AnalysisType.RISK_ASSESSMENT)
+            if mild is not None:
+                return self.template_responder.risk_assessment(evaluated_results, mild)
             prompt = self._create_risk_assessment_prompt(evaluated_results, patient_info)
-            if self.gemini_model:
-                response = await self._call_gemini(prompt)
+            if self.is_configured():
+                response = await self._generate(prompt, AnalysisType.RISK_ASSESSMENT)
             else:
-                raise Exception("Gemini LLM client bulunamadı")
-            llm_analysis = self._parse_analysis_response(response)
-            return llm_analysis
+                raise Exception("LLM client bulunamadı")
+            return await self._resolve_analysis(prompt, response, AnalysisType.RISK_ASSESSMENT)
         except Exception as e:
             logger.error(f"LLM risk analiz hatası: {e}")
             return self._get_fallback_risk_response()
 
+    @metrics.analyzed(AnalysisType.DOCTOR_INSIGHTS)
     async def generate_doctor_insights(self, test_results: List[Dict], symptoms: List[str], patient_info: Dict) -> Dict:
         try:
-            evaluated_results = []
-            for test in test_results:
-                evaluation = reference_range_service.evaluate_test_result(
-                    test_name=test['test_name'],
-                    value=test['value'],
-                    age=patient_info['age'],
-                    gender=patient_info.get('gender')
-                )
-                evaluated_results.append({
-                    **test,
-                    'evaluation': evaluation
-                })
+            evaluated_results = self._evaluate_results(test_results, patient_info)
             prompt = self._create_doctor_insights_prompt(evaluated_results, symptoms, patient_info)
-            if self.gemini_model:
-                response = await self._call_gemini(prompt)
+            if self.is_configured():
+                response = await self._generate(prompt, AnalysisType.DOCTOR_INSIGHTS)
             else:
-                raise Exception("Gemini LLM client bulunamadı")
-            llm_analysis = self._parse_analysis_response(response)
-            return llm_analysis
+                raise Exception("LLM client bulunamadı")
+            return await self._resolve_analysis(prompt, response, AnalysisType.DOCTOR_INSIGHTS)
         except Exception as e:
             logger.error(f"LLM doktor içgörü hatası: {e}")
             return self._get_fallback_doctor_response()
 
+    @metrics.analyzed(AnalysisType.FULL)
+    async def analyze_full(self, test_results: List[Dict], symptoms: List[str], patient_info: Dict) -> Dict:
+        """
+        Kan tahlili, risk değerlendirmesi ve doktor içgörülerini birlikte üretir
+        
+        Test sonuçları bir kez değerlendirilir, LLM çağrıları eşzamanlı
+        yapılır. Normal panellerde kan tahlili ve risk dalları şablondan
+        üretilir. Başarısız olan dal kendi fallback yanıtıyla döner.
+        """
+        evaluated_results = self._evaluate_results(test_results, patient_info)
+        analyses = {}
+        mild = self.template_responder.match(evaluated_results, AnalysisType.FULL)
+        if mild is not None:
+            analyses['blood_test'] = self.template_responder.blood_test(evaluated_results, mild)
+            analyses['risk_assessment'] = self.template_responder.risk_assessment(evaluated_results, mild)
+            prompts = {}
+        else:
+            prompts = {
+                'blood_test': self._create_blood_test_prompt(evaluated_results, patient_info),
+                'risk_assessment': self._create_risk_assessment_prompt(evaluated_results, patient_info)
+            }
+        prompts['doctor_insights'] = self._create_doctor_insights_prompt(evaluated_results, symptoms, patient_info)
+        fallbacks = {
+            'blood_test': self._get_fallback_response,
+            'risk_assessment': self._get_fallback_risk_response,
+            'doctor_insights': self._get_fallback_doctor_response
+        }
+        
+        async def run(name: str) -> Dict:
+            return await self._resolve_analysis(prompts[name], await self._generate(prompts[name], name), name)
+        
+        if self.is_configured():
+            results = await asyncio.gather(*(run(name) for name in prompts), return_exceptions=True)
+        else:
+            results = [Exception("LLM client bulunamadı")] * len(prompts)
+        
+        failed = []
+        for name, result in zip(prompts, results):
+            if isinstance(result, BaseException):
+                logger.error(f"LLM birleşik analiz hatası ({name}): {result}")
+                analyses[name] = fallbacks[name]()
+                failed.append(name)
+            else:
+                analyses[name] = result
+        
+        response = {
+            'test_evaluations': evaluated_results,
+            'llm_analysis': analyses['blood_test'],
+            'risk_assessment': analyses['risk_assessment'],
+            'doctor_insights': analyses['doctor_insights'],
+            'summary': self._create_summary(evaluated_results, analyses['blood_test']),
+            'failed_analyses': failed
+        }
+        if len(failed) == len(analyses):
+            response[FALLBACK_KEY] = True
+        return response
+
+    async def analyze_blood_test_batch(self, panels: List[Dict], max_concurrency: int) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Çok sayıda paneli analiz eder; sonuçları tamamlandıkça (index, sonuç) olarak döndürür
+        
+        Tüm paneller tek bir vektörel geçişte değerlendirilir, LLM çağrıları
+        en fazla max_concurrency eşzamanlılıkla yapılır.
+        
+        Args:
+            panels: 'test_results' ve 'patient_info' içeren panel listesi
+            max_concurrency: Aynı anda çalışacak en fazla panel analizi
+        """
+        with metrics.stage_timer('evaluation', AnalysisType.BLOOD_TEST):
+            evaluated_panels = self._evaluate_panels(panels)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(index: int) -> Tuple[int, Dict]:
+            async with semaphore:
+                with metrics.analysis_scope(AnalysisType.BLOOD_TEST):
+                    return index, await self._analyze_evaluated_blood_test(
+                        evaluated_panels[index], panels[index]['patient_info']
+                    )
+        
+        tasks = [asyncio.ensure_future(run(index)) for index in range(len(panels))]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield await completed
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_blood_test_analysis(self, test_results: List[Dict], patient_info: Dict) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Kan tahlili analizini olay akışı olarak üretir
+        
+        Önce referans değerlendirmesi ('evaluation'), ardından LLM metin
+        parçaları ('token') ve en son parse edilmiş analiz ('analysis')
+        gönderilir. Şablon yanıtı verilen panellerde 'token' olayı olmaz.
+        LLM hatasında 'error' ve fallback analiz gönderilir.
+        """
+        with metrics.analysis_scope(AnalysisType.BLOOD_TEST):
+            evaluated_results = self._evaluate_results(test_results, patient_info)
+            yield 'evaluation', {
+                'test_evaluations': evaluated_results,
+                'summary': self._create_summary(evaluated_results, {})
+            }
+        
+            mild = self.template_responder.match(evaluated_results, AnalysisType.BLOOD_TEST)
+            if mild is not None:
+                llm_analysis = self.template_responder.blood_test(evaluated_results, mild)
+            else:
+                try:
+                    if not self.is_configured():
+                        raise Exception("LLM client bulunamadı")
+            
+                    prompt = self._create_blood_test_prompt(evaluated_results, patient_info)
+                    cache_key = LLMResponseCache.make_key(prompt, self.backend.model_name, settings.LLM_TEMPERATURE)
+                    response = await self.response_cache.get(cache_key) if self.response_cache else None
+                    # Yanıt parçalar geldikçe taranır; sonunda yeniden taranması gerekmez
+                    parser = IncrementalJSONParser()
+                    if response is not None:
+                        parser.feed(response)
+                        yield 'token', response
+                        parsed = self._parse_analysis_response(parser, AnalysisType.BLOOD_TEST)
+                    else:
+                        chunks = []
+                        async for chunk in self._call_llm_stream(prompt):
+                            chunks.append(chunk)
+                            parser.feed(chunk)
+                            yield 'token', chunk
+                        parsed = self._parse_analysis_response(parser, AnalysisType.BLOOD_TEST)
+                        if self.response_cache and self._is_cacheable(parsed):
+                            await self.response_cache.set(cache_key, ''.join(chunks))
+            
+                    llm_analysis = await self._resolve_analysis(prompt, parsed, AnalysisType.BLOOD_TEST)
+                except Exception as e:
+                    logger.error(f"LLM akış analiz hatası: {e}")
+                    yield 'error', {'message': 'LLM analizi tamamlanamadı'}
+                    llm_analysis = self._get_fallback_response()
+        
+            yield 'analysis', {
+                'llm_analysis': llm_analysis,
+                'summary': self._create_summary(evaluated_results, llm_analysis)
+            }
+
+    @metrics.analyzed(AnalysisType.PATIENT_EDUCATION)
     async def generate_patient_education(self, diagnosis: str, treatment_plan: Dict, patient_language: str = "tr") -> Dict:
         try:
             prompt = self._create_patient_education_prompt(diagnosis, treatment_plan, patient_language)
-            if self.gemini_model:
-                response = await self._call_gemini(prompt)
+            if self.is_configured():
+                response = await self._generate(prompt, AnalysisType.PATIENT_EDUCATION)
             else:
-                raise Exception("Gemini LLM client bulunamadı")
-            llm_analysis = self._parse_analysis_response(response)
-            return llm_analysis
+                raise Exception("LLM client bulunamadı")
+            return await self._resolve_analysis(prompt, response, AnalysisType.PATIENT_EDUCATION)
         except Exception as e:
             logger.error(f"LLM hasta bilgilendirme hatası: {e}")
             return self._get_fallback_education_response()
 
+    @metrics.timed_stage('prompt_build')
     def _create_blood_test_prompt(self, evaluated_results: List[Dict], patient_info: Dict) -> str:
         """Kan tahlili analizi için prompt oluşturur"""
+        if self.prompt_builder.compact:
+            return self.prompt_builder.blood_test(evaluated_results, patient_info)
         prompt = f"""
         Sen deneyimli bir tıbbi analiz uzmanısın. Aşağıdaki kan tahlili sonuçlarını analiz et ve JSON formatında yanıt ver.
 
@@ -175,10 +373,16 @@ class MedicalLLMService:
         4. Acil durumları net bir şekilde belirt
         5. Doktor dilinde, ancak anlaşılır açıklamalar yap
         """
-        return prompt
+        # Bütçeyi aşan uzun şablon kompakt biçimde yeniden oluşturulur
+        if self.prompt_builder.fits(prompt, 'blood_test'):
+            return prompt
+        return self.prompt_builder.blood_test(evaluated_results, patient_info)
 
+    @metrics.timed_stage('prompt_build')
     def _create_risk_assessment_prompt(self, evaluated_results: List[Dict], patient_info: Dict) -> str:
         """Risk değerlendirmesi için prompt oluşturur"""
+        if self.prompt_builder.compact:
+            return self.prompt_builder.risk_assessment(evaluated_results, patient_info)
         prompt = f"""
         Sen deneyimli bir tıbbi risk değerlendirme uzmanısın. Aşağıdaki test sonuçlarına göre sağlık risklerini değerlendir.
 
@@ -227,10 +431,16 @@ class MedicalLLMService:
         3. Acil durumları net belirt
         4. Hastayı korkutmayan profesyonel dil kullan
         """
-        return prompt
+        # Bütçeyi aşan uzun şablon kompakt biçimde yeniden oluşturulur
+        if self.prompt_builder.fits(prompt, 'risk_assessment'):
+            return prompt
+        return self.prompt_builder.risk_assessment(evaluated_results, patient_info)
 
+    @metrics.timed_stage('prompt_build')
     def _create_doctor_insights_prompt(self, evaluated_results: List[Dict], symptoms: List[str], patient_info: Dict) -> str:
         """Doktor içgörüleri için prompt oluşturur"""
+        if self.prompt_builder.compact:
+            return self.prompt_builder.doctor_insights(evaluated_results, symptoms, patient_info)
         prompt = f"""
         Sen deneyimli bir klinik uzmanısın. Aşağıdaki test sonuçları ve semptomları değerlendirerek doktorlar için klinik içgörüler sağla.
 
@@ -269,10 +479,16 @@ class MedicalLLMService:
         3. Diferansiyel tanıları önem sırasına göre sırala
         4. Doktor dilinde profesyonel açıklamalar yap
         """
-        return prompt
+        # Bütçeyi aşan uzun şablon kompakt biçimde yeniden oluşturulur
+        if self.prompt_builder.fits(prompt, 'doctor_insights'):
+            return prompt
+        return self.prompt_builder.doctor_insights(evaluated_results, symptoms, patient_info)
 
+    @metrics.timed_stage('prompt_build')
     def _create_patient_education_prompt(self, diagnosis: str, treatment_plan: Dict, patient_language: str = "tr") -> str:
         """Hasta eğitimi için prompt oluşturur"""
+        if self.prompt_builder.compact:
+            return self.prompt_builder.patient_education(diagnosis, treatment_plan, patient_language)
         prompt = f"""
         Sen deneyimli bir hasta eğitimi uzmanısın. Aşağıdaki tanı ve tedavi planına göre hasta eğitim materyali hazırla.
 
@@ -294,7 +510,52 @@ class MedicalLLMService:
         4. Profesyonel ama samimi olmayan bir dil kullan
         5. "Merhaba", "endişelenmeyin" gibi samimi ifadeler kullanma
         """
-        return prompt
+        # Bütçeyi aşan uzun şablon kompakt biçimde yeniden oluşturulur
+        if self.prompt_builder.fits(prompt, 'patient_education'):
+            return prompt
+        return self.prompt_builder.patient_education(diagnosis, treatment_plan, patient_language)
+
+    @metrics.timed_stage('evaluation')
+    def _evaluate_results(self, test_results: List[Dict], patient_info: Dict) -> List[Dict]:
+        """Test sonuçlarını referans aralıklarına göre değerlendirir"""
+        evaluated_results = []
+        for test in test_results:
+            evaluation = reference_range_service.evaluate_test_result(
+                test_name=test['test_name'],
+                value=test['value'],
+                age=patient_info['age'],
+                gender=patient_info.get('gender')
+            )
+            evaluated_results.append({
+                **test,
+                'evaluation': evaluation
+            })
+        return evaluated_results
+
+    def _evaluate_panels(self, panels: List[Dict]) -> List[List[Dict]]:
+        """Tüm panellerin test sonuçlarını tek bir evaluate_many çağrısıyla değerlendirir"""
+        test_names, values, ages, genders = [], [], [], []
+        for panel in panels:
+            patient_info = panel['patient_info']
+            for test in panel['test_results']:
+                test_names.append(test['test_name'])
+                values.append(test['value'])
+                ages.append(patient_info['age'])
+                genders.append(patient_info.get('gender'))
+        
+        batch = reference_range_service.evaluate_many(test_names, values, ages, genders)
+        evaluated_panels = []
+        row = 0
+        for panel in panels:
+            evaluated_results = []
+            for test in panel['test_results']:
+                evaluated_results.append({
+                    **test,
+                    'evaluation': batch.record(row)
+                })
+                row += 1
+            evaluated_panels.append(evaluated_results)
+        return evaluated_panels
 
     def _format_test_results(self, evaluated_results: List[Dict]) -> str:
         """Test sonuçlarını formatlar"""
@@ -308,31 +569,193 @@ class MedicalLLMService:
             )
         return '\n'.join(formatted)
     
-    async def _call_gemini(self, prompt: str) -> str:
-        """Google Gemini API çağrısı"""
+    async def _generate(self, prompt: str, prompt_type: str) -> ParsedResponse:
+        """
+        Önbellek ve single-flight üzerinden LLM yanıtı üretir ve çözer
+        
+        Aynı prompt için eşzamanlı gelen çağrılar tek bir üretimi bekler.
+        Hata tüm bekleyenlere iletilir, önbelleğe yazılmaz. Yanıt yalnızca
+        prompt_type şemasına eksiksiz uyarsa önbelleğe alınır.
+        """
+        cache_key = LLMResponseCache.make_key(prompt, self.backend.model_name, settings.LLM_TEMPERATURE)
+        task = self._pending_generations.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate_once(prompt, cache_key, prompt_type))
+            self._pending_generations[cache_key] = task
+            task.add_done_callback(lambda _: self._pending_generations.pop(cache_key, None))
+        else:
+            self._coalesced_requests += 1
+        # Bir bekleyenin iptali ortak üretimi iptal etmesin
+        return await asyncio.shield(task)
+    
+    async def _generate_once(self, prompt: str, cache_key: str, prompt_type: str) -> ParsedResponse:
+        """Önbellek kontrolü yapıp gerekirse LLM backend'ini çağırır; yanıt bir kez çözülür"""
+        if self.response_cache is None:
+            return self._parse_analysis_response(await self._call_llm(prompt), prompt_type)
+        
+        cached = await self.response_cache.get(cache_key)
+        if cached is not None:
+            return self._parse_analysis_response(cached, prompt_type)
+        
+        response = await self._call_llm(prompt)
+        parsed = self._parse_analysis_response(response, prompt_type)
+        # Sadece şemaya eksiksiz uyan yanıtlar saklanır; kesilmiş veya hatalı yanıt tekrar denenebilsin
+        if self._is_cacheable(parsed):
+            await self.response_cache.set(cache_key, response)
+        return parsed
+    
+    @staticmethod
+    def _is_cacheable(parsed: ParsedResponse) -> bool:
+        """Kesilmiş, onarılmış veya şemaya uymayan yanıtlar önbelleğe alınmaz"""
+        return parsed.outcome == 'ok'
+    
+    def get_cache_stats(self) -> Dict:
+        """LLM yanıt önbelleği metrikleri"""
+        if self.response_cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.response_cache.get_stats()}
+    
+    @asynccontextmanager
+    async def _llm_slot(self):
+        """Eşzamanlılık sınırı içinde bir LLM çağrı yuvası ayırır"""
+        self._llm_waiting += 1
+        metrics.LLM_QUEUE_DEPTH.inc()
+        try:
+            with metrics.stage_timer('llm_queue_wait'):
+                await self._llm_semaphore.acquire()
+        finally:
+            self._llm_waiting -= 1
+            metrics.LLM_QUEUE_DEPTH.dec()
+        
+        self._llm_in_flight += 1
+        metrics.LLM_IN_FLIGHT.inc()
         try:
-            response = self.gemini_model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=settings.LLM_TEMPERATURE,
-                    max_output_tokens=4000,
-                    top_p=0.8,
-                    top_k=40
-                )
+            yield
+        finally:
+            self._llm_in_flight -= 1
+            metrics.LLM_IN_FLIGHT.dec()
+            self._llm_semaphore.release()
+    
+    async def _call_llm(self, prompt: str) -> str:
+        """
+        LLM backend çağrısı (event loop'u bloklamaz)
+        
+        Geçici hatalar yeniden denenir; devre açıksa backend çağrılmadan
+        CircuitOpenError fırlatılır ve çağıran fallback yanıtına geçer.
+        """
+        backend = self.backend
+        try:
+            response = await self.resilience.call(
+                lambda: self._call_backend(backend, prompt),
+                is_retryable=backend.is_retryable,
+                backend_name=backend.name,
+                # Hedging yalnızca boş yuva varken; ikinci istek kuyrukta beklemesin
+                can_hedge=lambda: not self._llm_semaphore.locked()
             )
-            return response.text
-        except Exception as e:
-            logger.error(f"Gemini API hatası: {e}")
+        except CircuitOpenError:
+            metrics.LLM_REQUESTS.labels(backend=backend.name, outcome='circuit_open').inc()
             raise
+        self._record_llm_usage(backend, prompt, response)
+        return response
     
-    def _parse_analysis_response(self, response: str) -> Dict:
-        """LLM yanıtını parse eder"""
+    async def _call_backend(self, backend: LLMBackend, prompt: str) -> str:
+        """Tek backend isteği; zaman aşımı kuyrukta bekleme süresini kapsamaz"""
+        async with self._llm_slot():
+            try:
+                with metrics.stage_timer('llm_call'):
+                    return await asyncio.wait_for(backend.generate(prompt), settings.LLM_CALL_TIMEOUT)
+            except Exception as e:
+                self._record_llm_error(backend, e)
+                raise
+    
+    async def _call_llm_stream(self, prompt: str) -> AsyncIterator[str]:
+        """LLM backend akış çağrısı; metin parçalarını geldikçe döndürür"""
+        backend = self.backend
+        chunks = []
         try:
-            import json
-            return json.loads(response)
-        except Exception:
-            logger.error(f"JSON parse hatası: {response}")
-            return self._get_fallback_response()
+            async for chunk in self.resilience.stream(
+                lambda: self._stream_backend(backend, prompt),
+                is_retryable=backend.is_retryable,
+                backend_name=backend.name
+            ):
+                chunks.append(chunk)
+                yield chunk
+        except CircuitOpenError:
+            metrics.LLM_REQUESTS.labels(backend=backend.name, outcome='circuit_open').inc()
+            raise
+        self._record_llm_usage(backend, prompt, ''.join(chunks))
+    
+    async def _stream_backend(self, backend: LLMBackend, prompt: str) -> AsyncIterator[str]:
+        """Tek backend akışı; LLM_CALL_TIMEOUT parçalar arası bekleme sınırıdır"""
+        async with self._llm_slot():
+            try:
+                with metrics.stage_timer('llm_stream'):
+                    chunks = backend.stream(prompt).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), settings.LLM_CALL_TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        yield chunk
+            except Exception as e:
+                self._record_llm_error(backend, e)
+                raise
+    
+    @staticmethod
+    def _record_llm_error(backend: LLMBackend, error: Exception):
+        timed_out = isinstance(error, asyncio.TimeoutError)
+        logger.error(f"LLM API hatası ({backend.name}): {'zaman aşımı' if timed_out else error}")
+        metrics.LLM_REQUESTS.labels(backend=backend.name, outcome='timeout' if timed_out else 'error').inc()
+    
+    @staticmethod
+    def _record_llm_usage(backend: LLMBackend, prompt: str, response: str):
+        """Başarılı LLM çağrısının sayaç ve token metriklerini günceller"""
+        metrics.LLM_REQUESTS.labels(backend=backend.name, outcome='success').inc()
+        metrics.LLM_TOKENS.labels(backend=backend.name, direction='input').inc(backend.count_tokens(prompt))
+        metrics.LLM_TOKENS.labels(backend=backend.name, direction='output').inc(backend.count_tokens(response))
+    
+    def get_resilience_stats(self) -> Dict:
+        """Devre kesici durumu, yeniden deneme ve hedging sayaçları"""
+        return self.resilience.get_stats()
+    
+    def get_fast_path_stats(self) -> Dict:
+        """Şablon hızlı yolunun isabet oranı"""
+        return self.template_responder.get_stats()
+    
+    def get_concurrency_stats(self) -> Dict:
+        """LLM kuyruk derinliği ve çalışan çağrı sayısı"""
+        return {
+            'max_concurrency': settings.LLM_MAX_CONCURRENCY,
+            'in_flight': self._llm_in_flight,
+            'queue_depth': self._llm_waiting,
+            'pending_generations': len(self._pending_generations),
+            'coalesced_requests': self._coalesced_requests
+        }
+    
+    @metrics.timed_stage('response_parse')
+    def _parse_analysis_response(self, response, prompt_type: str) -> ParsedResponse:
+        """LLM yanıtını (metin veya akışta beslenmiş parser) ayıklar ve şemaya göre doğrular"""
+        return parse_analysis(response, prompt_type)
+    
+    async def _resolve_analysis(self, prompt: str, parsed: ParsedResponse, prompt_type: str) -> Dict:
+        """
+        Çözülmüş LLM yanıtının verisini döndürür; veri yoksa tek bir hedefli yeniden istek yapar
+        
+        Yeniden istek de çözülemezse LLMResponseParseError fırlatılır;
+        çağıran taraf kendi fallback yanıtını döndürür.
+        """
+        outcome = parsed.outcome
+        if parsed.data is None and settings.LLM_PARSE_REASK:
+            logger.warning(f"LLM yanıtı çözülemedi ({prompt_type}: {parsed.outcome}), yeniden isteniyor")
+            parsed = await self._generate(prompt + reask_instruction(parsed), prompt_type)
+            outcome = 'reasked'
+        
+        if parsed.data is None:
+            metrics.PARSE_RESULTS.labels(prompt_type=prompt_type, outcome='failed').inc()
+            metrics.PARSE_FAILURES.labels(analysis_type=metrics.current_analysis_type()).inc()
+            raise LLMResponseParseError(f"LLM yanıtı çözülemedi ({prompt_type}: {parsed.outcome})")
+        metrics.PARSE_RESULTS.labels(prompt_type=prompt_type, outcome=outcome).inc()
+        return parsed.data
     
     def _create_summary(self, evaluated_results: List[Dict], llm_analysis: Dict) -> Dict:
         """Test sonuçları ve LLM analizini özetler"""
@@ -345,8 +768,8 @@ class MedicalLLMService:
                            if result['evaluation']['status'] in ['critical_low', 'critical_high'])
         
         # En yüksek risk seviyesini bul
-        max_risk = max((result['evaluation']['risk_level'] for result in evaluated_results), 
-                      key=lambda x: ['normal', 'low', 'high', 'critical'].index(x))
+        max_risk = max((result['evaluation'].get('risk_level', 'normal') for result in evaluated_results), 
+                      key=lambda x: ['normal', 'low', 'high', 'critical'].index(x), default='normal')
         
         return {
             'total_tests': len(evaluated_results),
@@ -358,6 +781,7 @@ class MedicalLLMService:
     
     def _get_fallback_response(self) -> Dict:
         """Fallback yanıt"""
+        metrics.FALLBACK_RESPONSES.labels(analysis_type=metrics.current_analysis_type()).inc()
         return {
             'genel_değerlendirme': {
                 'genel_durum': 'normal',
@@ -374,11 +798,13 @@ class MedicalLLMService:
                 'uzmanlik_alani': [],
                 'takip_onerisi': 'Doktorunuzla görüşün'
             },
-            'hasta_mesaji': 'Analiz sırasında teknik bir hata oluştu. Bu durum endişe verici değildir. Doktorunuzla görüşerek gerekli bilgileri alabilirsiniz.'
+            'hasta_mesaji': 'Analiz sırasında teknik bir hata oluştu. Bu durum endişe verici değildir. Doktorunuzla görüşerek gerekli bilgileri alabilirsiniz.',
+            FALLBACK_KEY: True
         }
     
     def _get_fallback_risk_response(self) -> Dict:
         """Fallback risk yanıtı"""
+        metrics.FALLBACK_RESPONSES.labels(analysis_type=metrics.current_analysis_type()).inc()
         return {
             'genel_risk_değerlendirmesi': {
                 'genel_durum': 'normal',
@@ -394,11 +820,13 @@ class MedicalLLMService:
                 'takip_onerisi': 'Doktorunuzla görüşün'
             },
             'genel_risk_puani': 0,
-            'hasta_mesaji': 'Risk değerlendirmesi sırasında teknik bir hata oluştu. Bu durum endişe verici değildir. Doktorunuzla görüşerek gerekli bilgileri alabilirsiniz.'
+            'hasta_mesaji': 'Risk değerlendirmesi sırasında teknik bir hata oluştu. Bu durum endişe verici değildir. Doktorunuzla görüşerek gerekli bilgileri alabilirsiniz.',
+            FALLBACK_KEY: True
         }
     
     def _get_fallback_doctor_response(self) -> Dict:
         """Fallback doktor yanıtı"""
+        metrics.FALLBACK_RESPONSES.labels(analysis_type=metrics.current_analysis_type()).inc()
         return {
             'genel_klinik_değerlendirme': {
                 'genel_durum': 'normal',
@@ -408,14 +836,18 @@ class MedicalLLMService:
             },
             'differential_diagnosis': [],
             'ek_testler': [],
+            FALLBACK_KEY: True
         }
 
     def _get_fallback_education_response(self) -> Dict:
         """Fallback eğitim yanıtı"""
+        metrics.FALLBACK_RESPONSES.labels(analysis_type=metrics.current_analysis_type()).inc()
         return {
             'aciklama': 'Hasta bilgilendirme sırasında teknik bir hata oluştu.',
             'onemli_bulgular': '',
-            'oneriler': ''
+            'oneriler': '',
+            FALLBACK_KEY: True
         }
 
-llm_service = MedicalLLMService() 
\ No newline at end of file
+llm_service = MedicalLLMService()
+llm_service.resilience.breaker.on_state_change = lambda state: metrics.LLM_CIRCUIT_STATE.set(CIRCUIT_STATES[state])
@@ -0,0 +1,143 @@
+"""
+Normal paneller için LLM'siz şablon yanıtları
+
+Tüm sonuçları referans aralığında (ya da yapılandırılan sınırlar içinde
+hafif sapmalı) olan paneller için LLM çağrısı yapılmaz; kan tahlili ve
+risk değerlendirmesi LLM şemasıyla aynı yapıda, deterministik şablonlardan
+üretilir. Şablon yanıtları 'template_generated': True ile işaretlenir.
+"""
+from typing import Dict, List, Optional
+
+from app.core import metrics
+
+# Kritik ve referanssız sonuçlar her zaman LLM değerlendirmesine gider
+MILD_STATUSES = {'low': 'düşük', 'high': 'yüksek'}
+
+class TemplateResponder:
+    """
+    Şablon hızlı yolunun kriterleri ve yanıt şablonları
+
+    max_abnormal: izin verilen hafif (low/high) sonuç sayısı; 0 yalnızca
+    tamamen normal panelleri kabul eder. max_deviation: hafif sayılmak için
+    en yakın referans sınırından sapmanın referans aralığı genişliğine oranı.
+    """
+
+    def __init__(self, enabled: bool = True, max_abnormal: int = 0, max_deviation: float = 0.1):
+        self.enabled = enabled
+        self.max_abnormal = max_abnormal
+        self.max_deviation = max_deviation
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def match(self, evaluated_results: List[Dict], analysis_type: str) -> Optional[List[Dict]]:
+        """
+        Panel kriterlere uyuyorsa hafif anormal sonuçları (boş olabilir), uymuyorsa None döndürür
+
+        Her çağrı isabet oranı için sayılır.
+        """
+        if not self.enabled:
+            return None
+        mild = self._mild_results(evaluated_results)
+        outcome = 'miss' if mild is None else 'hit'
+        self._stats['misses' if mild is None else 'hits'] += 1
+        metrics.TEMPLATE_RESPONSES.labels(analysis_type=analysis_type, outcome=outcome).inc()
+        return mild
+
+    def get_stats(self) -> Dict:
+        total = self._stats['hits'] + self._stats['misses']
+        return {
+            'enabled': self.enabled,
+            **self._stats,
+            'hit_rate': self._stats['hits'] / total if total else 0.0
+        }
+
+    def _mild_results(self, evaluated_results: List[Dict]) -> Optional[List[Dict]]:
+        if not evaluated_results:
+            return None
+        mild = []
+        for result in evaluated_results:
+            evaluation = result.get('evaluation', {})
+            status = evaluation.get('status')
+            if status == 'normal':
+                continue
+            if status not in MILD_STATUSES or not self._is_mild(evaluation):
+                return None
+            mild.append(result)
+            if len(mild) > self.max_abnormal:
+                return None
+        return mild
+
+    def _is_mild(self, evaluation: Dict) -> bool:
+        low, high, value = evaluation.get('reference_min'), evaluation.get('reference_max'), evaluation.get('value')
+        if low is None or high is None or value is None or high <= low:
+            return False
+        deviation = low - value if value < low else value - high
+        return deviation <= (high - low) * self.max_deviation
+
+    @staticmethod
+    def blood_test(evaluated_results: List[Dict], mild: List[Dict]) -> Dict:
+        """Kan tahlili LLM yanıtıyla aynı şemada şablon analiz"""
+        if mild:
+            status = 'dikkat'
+            description = (f"{len(evaluated_results)} testin {len(evaluated_results) - len(mild)} tanesi referans "
+                           f"aralığında; {len(mild)} test sınıra yakın hafif sapma gösteriyor.")
+            message = ("Sonuçlarınızın büyük çoğunluğu normal. Sınıra yakın değerleri bir sonraki kontrolünüzde "
+                       "doktorunuzla değerlendirebilirsiniz.")
+            follow_up = 'Hafif sapmalı değerler için 3-6 ay içinde kontrol'
+        else:
+            status = 'normal'
+            description = f"{len(evaluated_results)} testin tamamı referans aralığında."
+            message = "Test sonuçlarınızın tamamı normal aralıkta. Rutin kontrollerinize devam edebilirsiniz."
+            follow_up = 'Yıllık rutin kontrol'
+        return {
+            'genel_değerlendirme': {
+                'genel_durum': status,
+                'acil_durum': False,
+                'genel_aciklama': description,
+                'onemli_not': 'Bu otomatik bir değerlendirmedir, kesin tanı için klinik değerlendirme gerekir'
+            },
+            'anormal_degerler': [
+                {
+                    'test_adi': result['test_name'],
+                    'deger': str(result['value']),
+                    'normal_aralik': result['evaluation'].get('reference_range', 'Bilinmiyor'),
+                    'durum': MILD_STATUSES[result['evaluation']['status']],
+                    'aciklama': 'Referans sınırına yakın hafif sapma; tek başına klinik önem taşımayabilir'
+                }
+                for result in mild
+            ],
+            'olası_hastalıklar': [],
+            'oneriler': {
+                'doktor_onerileri': ['Sonuçlarınızı rutin kontrolünüzde doktorunuzla paylaşın'],
+                'yasam_tarzi': ['Düzenli fiziksel aktiviteye devam edin', 'Yeterli uyku ve sıvı alımına dikkat edin'],
+                'beslenme': ['Dengeli ve çeşitli beslenmeye devam edin'],
+                'uzmanlik_alani': [],
+                'takip_onerisi': follow_up
+            },
+            'hasta_mesaji': message,
+            'template_generated': True
+        }
+
+    @staticmethod
+    def risk_assessment(evaluated_results: List[Dict], mild: List[Dict]) -> Dict:
+        """Risk değerlendirmesi LLM yanıtıyla aynı şemada şablon analiz"""
+        return {
+            'genel_risk_değerlendirmesi': {
+                'genel_durum': 'düşük_risk' if mild else 'normal',
+                'acil_durum': False,
+                'genel_aciklama': (f"{len(mild)} test sınıra yakın hafif sapma gösteriyor; belirgin bir risk bulgusu yok."
+                                   if mild else "Test sonuçlarında risk göstergesi bulunmuyor."),
+                'onemli_not': 'Bu otomatik bir değerlendirmedir, kesin değerlendirme için doktorunuza başvurun'
+            },
+            'acil_riskler': [],
+            'kronik_riskler': [],
+            '30_gunluk_tahmin': {
+                'olası_komplikasyonlar': [],
+                'onleyici_tedbirler': ['Sağlıklı yaşam tarzını sürdürün'],
+                'takip_onerisi': 'Hafif sapmalı değerler için 3-6 ay içinde kontrol' if mild else 'Yıllık rutin kontrol'
+            },
+            'genel_risk_puani': 5 * len(mild),
+            'hasta_mesaji': ("Belirgin bir sağlık riski görünmüyor. Sınıra yakın değerleri bir sonraki kontrolünüzde "
+                             "doktorunuzla değerlendirebilirsiniz." if mild else
+                             "Test sonuçlarınıza göre belirgin bir sağlık riski görünmüyor."),
+            'template_generated': True
+        }
@@ -0,0 +1,37 @@
+"""
+Referans aralığı listeleme uç noktaları için hazır yanıtlar
+
+Test, kategori ve kategori bazlı test listeleri her referans verisi
+sürümü için bir kez JSON'a kodlanır, gzip'lenir ve içerik özetinden
+güçlü ETag üretilir. İstek yolunda yalnızca hazır bayt dizileri döner.
+"""
+from typing import Dict, List
+
+from app.core.http_cache import CachedPayload, encode_payload
+
+class ReferenceCatalog:
+    """Bir referans verisi sürümünün listeleme yanıtları (değişmez)"""
+
+    def __init__(self, reference_data: Dict, version: str, gzip_min_size: int = 512):
+        self.version = version
+        blood_tests = reference_data.get('blood_tests', {})
+        all_tests: List[Dict] = []
+        self._by_category: Dict[str, CachedPayload] = {}
+        for category_key, category_data in blood_tests.items():
+            category_tests = []
+            for test_key, test_data in category_data.get('tests', {}).items():
+                all_tests.append({
+                    'key': test_key,
+                    'name': test_data['name'],
+                    'category': category_data['category'],
+                    'unit': test_data['unit']
+                })
+                category_tests.append({'key': test_key, 'name': test_data['name'], 'unit': test_data['unit']})
+            self._by_category[category_key] = encode_payload(category_tests, gzip_min_size)
+        self.tests = encode_payload(all_tests, gzip_min_size)
+        self.categories = encode_payload(list(blood_tests.keys()), gzip_min_size)
+        self._empty = encode_payload([], gzip_min_size)
+
+    def category(self, category: str) -> CachedPayload:
+        """Bilinmeyen kategori için boş liste döner"""
+        return self._by_category.get(category, self._empty)
@@ -1,25 +1,349 @@
+import asyncio
+import hashlib
 import json
+import logging
 import os
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.reference_catalog import ReferenceCatalog
+from app.services.reference_snapshot import SnapshotDataSet, is_snapshot_file
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'medical_reference_ranges.json')
+
+# evaluate_many için durum kodları (BatchEvaluation.status_codes sırası)
+BATCH_STATUSES = ('unknown', 'normal', 'low', 'high', 'critical_low', 'critical_high')
+BATCH_RISK_LEVELS = (None, 'normal', 'high', 'high', 'critical', 'critical')
+
+class ReferenceDataSet:
+    """
+    Referans verisinin derlenmiş, değişmez bir sürümü
+    
+    - test_index: normalize test anahtarı / takma ad -> (kategori, test anahtarı, test verisi)
+    - range_table: (test anahtarı, cinsiyet, yaş grubu) -> referans aralığı bilgisi
+    - age_group_table: tam sayı yaş -> yaş grubu
+    """
+    
+    def __init__(self, reference_data: Dict, version: str):
+        self.reference_data = reference_data
+        self.version = version
+        self.loaded_at = datetime.now().isoformat()
+        self._build_index()
+    
+    def _build_index(self):
+        """Referans verisinden derlenmiş arama tablolarını oluşturur"""
+        blood_tests = self.reference_data.get('blood_tests', {})
+        age_groups = self.reference_data.get('age_groups', {})
+        
+        # Yaş tablosu: ilk eşleşen grup kazanır (scan_age_group ile aynı sıra)
+        max_age = max((int(group['max']) for group in age_groups.values()), default=-1)
+        self.age_group_table: List[str] = [
+            self.scan_age_group(age) for age in range(max_age + 1)
+        ]
+        resolved_groups = set(age_groups) | {'adult'}
+        
+        self.test_index: Dict[str, Tuple[Dict, str, Dict]] = {}
+        self.range_table: Dict[Tuple[str, Optional[str], str], Dict] = {}
+        self.gender_keys: Dict[str, frozenset] = {}
+        
+        # Önce asıl test anahtarları, sonra takma adlar (anahtarlar her zaman önceliklidir)
+        aliases: List[Tuple[str, Tuple[Dict, str, Dict]]] = []
+        for category_data in blood_tests.values():
+            for test_key, test_data in category_data.get('tests', {}).items():
+                record = (category_data, test_key, test_data)
+                self.test_index.setdefault(normalize_test_name(test_key), record)
+                for alias in self._test_aliases(test_data):
+                    aliases.append((alias, record))
+                
+                reference_ranges = test_data.get('reference_ranges', {})
+                self.gender_keys[test_key] = frozenset(reference_ranges.keys())
+                for age_group in resolved_groups:
+                    self.range_table[(test_key, None, age_group)] = self._compile_range(
+                        category_data, test_data, self._select_range(reference_ranges, None, age_group)
+                    )
+                    for gender in reference_ranges:
+                        self.range_table[(test_key, gender, age_group)] = self._compile_range(
+                            category_data, test_data, self._select_range(reference_ranges, gender, age_group)
+                        )
+        
+        for alias, record in aliases:
+            self.test_index.setdefault(alias, record)
+    
+    @staticmethod
+    def _test_aliases(test_data: Dict) -> List[str]:
+        """Test görünen adından ve 'aliases' alanından takma adlar üretir"""
+        names = list(test_data.get('aliases', []))
+        display_name = test_data.get('name', '')
+        if display_name:
+            names.append(display_name)
+            if '(' in display_name and display_name.endswith(')'):
+                base, _, abbreviation = display_name[:-1].partition('(')
+                names.extend([base, abbreviation])
+        return [normalize_test_name(name) for name in names if name.strip()]
+    
+    @staticmethod
+    def _select_range(reference_ranges: Dict, gender: Optional[str], age_group: str) -> Optional[Dict]:
+        """Cinsiyet ve yaş grubuna göre aralık seçer"""
+        if gender and gender in reference_ranges:
+            if age_group in reference_ranges[gender]:
+                return reference_ranges[gender][age_group]
+            return reference_ranges[gender]
+        if age_group in reference_ranges:
+            return reference_ranges[age_group]
+        if 'adult' in reference_ranges:
+            return reference_ranges['adult']
+        # İlk mevcut aralığı al
+        return next(iter(reference_ranges.values()), None)
+    
+    @staticmethod
+    def _compile_range(category_data: Dict, test_data: Dict, range_data: Optional[Dict]) -> Dict:
+        """Arama tablosu için referans aralığı kaydını oluşturur"""
+        return {
+            'test_name': test_data['name'],
+            'unit': test_data['unit'],
+            'reference_range': range_data,
+            'critical_low': test_data.get('critical_low'),
+            'critical_high': test_data.get('critical_high'),
+            'description': test_data.get('description', ''),
+            'category': category_data['category']
+        }
+    
+    def contains(self, test_name: str) -> bool:
+        return normalize_test_name(test_name) in self.test_index
+    
+    def resolve_test_key(self, test_name: str) -> Optional[str]:
+        record = self.test_index.get(normalize_test_name(test_name))
+        return record[1] if record else None
+    
+    def resolve_range(self, test_name: str, age_group: str, gender: Optional[str]) -> Optional[Dict]:
+        """Derlenmiş tablodan referans aralığı kaydını döndürür (kopyalamadan)"""
+        record = self.test_index.get(normalize_test_name(test_name))
+        if record is None:
+            return None
+        
+        test_key = record[1]
+        if not (gender and gender in self.gender_keys[test_key]):
+            gender = None
+        
+        range_data = self.range_table[(test_key, gender, age_group)]
+        if range_data['reference_range'] is None:
+            return None
+        return range_data
+    
+    def get_age_group(self, age: int) -> str:
+        """Yaşa göre yaş grubunu belirler"""
+        if isinstance(age, int) and 0 <= age < len(self.age_group_table):
+            return self.age_group_table[age]
+        return self.scan_age_group(age)
+    
+    def scan_age_group(self, age: int) -> str:
+        """Yaş gruplarını sırayla tarayarak yaş grubunu belirler"""
+        age_groups = self.reference_data.get('age_groups', {})
+        
+        for group_name, group_range in age_groups.items():
+            if group_range['min'] <= age <= group_range['max']:
+                return group_name
+        
+        return 'adult'  # Varsayılan
+    
+    def risk_color(self, risk_level: str) -> str:
+        return self.reference_data.get('risk_levels', {}).get(risk_level, {}).get('color', 'gray')
+
+def normalize_test_name(test_name: str) -> str:
+    """Test adını indeks anahtarı formatına çevirir"""
+    return test_name.strip().lower().replace(' ', '_').replace('-', '_')
+
+def status_message(status: str, value: float, min_val: float, max_val: float) -> str:
+    """Duruma göre mesaj oluşturur (evaluate_test_result ve BatchEvaluation ortak kullanır)"""
+    if status == 'normal':
+        return f"Değer normal aralıkta ({min_val} - {max_val})"
+    elif status == 'low':
+        return f"Değer normal aralığın altında (Normal: {min_val} - {max_val})"
+    elif status == 'high':
+        return f"Değer normal aralığın üstünde (Normal: {min_val} - {max_val})"
+    elif status == 'critical_low':
+        return f"Değer kritik seviyenin altında!"
+    elif status == 'critical_high':
+        return f"Değer kritik seviyenin üstünde!"
+    else:
+        return "Değer değerlendirilemedi"
+
+def validate_reference_data(reference_data: Dict) -> List[str]:
+    """Referans verisindeki yapısal hataları listeler (boş liste: geçerli)"""
+    errors = []
+    blood_tests = reference_data.get('blood_tests')
+    if not isinstance(blood_tests, dict) or not blood_tests:
+        return ["'blood_tests' boş olamaz"]
+    
+    for group_name, group_range in reference_data.get('age_groups', {}).items():
+        if not isinstance(group_range, dict) or 'min' not in group_range or 'max' not in group_range:
+            errors.append(f"Yaş grubu '{group_name}' min/max içermiyor")
+    
+    for category_key, category_data in blood_tests.items():
+        if 'category' not in category_data or not isinstance(category_data.get('tests'), dict):
+            errors.append(f"Kategori '{category_key}' 'category' ve 'tests' içermeli")
+            continue
+        for test_key, test_data in category_data['tests'].items():
+            prefix = f"{category_key}.{test_key}"
+            if 'name' not in test_data or 'unit' not in test_data:
+                errors.append(f"{prefix}: 'name' ve 'unit' zorunludur")
+            reference_ranges = test_data.get('reference_ranges')
+            if not isinstance(reference_ranges, dict) or not reference_ranges:
+                errors.append(f"{prefix}: 'reference_ranges' boş olamaz")
+                continue
+            for range_key, range_data in reference_ranges.items():
+                bounds = [range_data.get('min'), range_data.get('max')] if isinstance(range_data, dict) else []
+                if len(bounds) != 2 or not all(isinstance(bound, (int, float)) for bound in bounds):
+                    errors.append(f"{prefix}.{range_key}: sayısal 'min' ve 'max' zorunludur")
+                elif bounds[0] > bounds[1]:
+                    errors.append(f"{prefix}.{range_key}: 'min' değeri 'max' değerinden büyük")
+    return errors
+
+def load_reference_data_set(file_path: str) -> ReferenceDataSet:
+    """
+    JSON dosyasını doğrulayıp derler; snapshot dosyalarını mmap ile açar
+    
+    Snapshot, oluşturulurken doğrulanmış bir ReferenceDataSet'ten
+    üretildiği için tekrar doğrulanmaz.
+    """
+    if is_snapshot_file(file_path):
+        return SnapshotDataSet(file_path)
+    
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    reference_data = json.loads(raw.decode('utf-8'))
+    
+    errors = validate_reference_data(reference_data)
+    if errors:
+        raise ValueError("Geçersiz referans verisi: " + "; ".join(errors[:10]))
+    
+    version = str(reference_data.get('version') or hashlib.sha256(raw).hexdigest()[:12])
+    return ReferenceDataSet(reference_data, version=version)
 
 class ReferenceRangeService:
-    """Tıbbi referans aralıkları servisi"""
+    """
+    Tıbbi referans aralıkları servisi
     
-    def __init__(self):
-        self.reference_data = self._load_reference_data()
+    Derlenmiş veri tek bir ReferenceDataSet nesnesinde tutulur. Yeniden
+    yükleme yeni sürümü istek yolunun dışında hazırlar ve tek bir atama
+    ile değiştirir; her değerlendirme çağrısı başında aldığı sürümle
+    tamamlanır.
+    """
     
-    def _load_reference_data(self) -> Dict:
-        """Referans aralıkları verisini yükler"""
+    def __init__(self, data_path: Optional[str] = None):
+        self.data_path = data_path or DEFAULT_DATA_PATH
+        self._file_signature: Optional[Tuple[float, int]] = None
+        self._watcher_task: Optional[asyncio.Task] = None
+        # (veri sürümü, listeleme yanıtları); ilk istekte veya yeniden yüklemede hazırlanır
+        self._catalog: Optional[Tuple[ReferenceDataSet, ReferenceCatalog]] = None
         try:
-            file_path = os.path.join(
-                os.path.dirname(__file__), 
-                '..', 'data', 'medical_reference_ranges.json'
-            )
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            self._data = self.load_data_set(self.data_path)
+        except Exception as e:
+            logger.error(f"Referans aralıkları yüklenemedi: {e}")
+            self._data = ReferenceDataSet({}, version='empty')
+    
+    @property
+    def reference_data(self) -> Dict:
+        return self._data.reference_data
+    
+    @property
+    def version(self) -> str:
+        """Kullanılan referans aralığı setinin sürümü"""
+        return self._data.version
+    
+    @property
+    def catalog(self) -> ReferenceCatalog:
+        """Kullanılan sürümün önceden kodlanmış listeleme yanıtları"""
+        data = self._data
+        cached = self._catalog
+        if cached is None or cached[0] is not data:
+            cached = (data, self._build_catalog(data))
+            self._catalog = cached
+        return cached[1]
+    
+    @staticmethod
+    def _build_catalog(data: ReferenceDataSet) -> ReferenceCatalog:
+        return ReferenceCatalog(data.reference_data, data.version, settings.REFERENCE_GZIP_MIN_SIZE)
+    
+    def load_data_set(self, file_path: str) -> ReferenceDataSet:
+        """Dosyayı okur, doğrular ve derlenmiş yeni bir sürüm oluşturur"""
+        signature = self._get_file_signature(file_path)
+        data_set = load_reference_data_set(file_path)
+        self._file_signature = signature
+        return data_set
+    
+    def reload(self, file_path: Optional[str] = None) -> Dict:
+        """
+        Referans verisini yeniden yükler ve atomik olarak devreye alır
+        
+        Doğrulama başarısız olursa ValueError fırlatılır ve mevcut sürüm
+        kullanılmaya devam eder.
+        """
+        if file_path:
+            self.data_path = file_path
+        previous_version = self._data.version
+        data_set = self.load_data_set(self.data_path)
+        # Listeleme yanıtları da istek yolunun dışında hazırlanır
+        catalog = self._build_catalog(data_set)
+        self._data = data_set
+        self._catalog = (data_set, catalog)
+        if data_set.version != previous_version:
+            logger.info(f"Referans aralıkları güncellendi: {previous_version} -> {data_set.version}")
+        return {
+            'version': data_set.version,
+            'previous_version': previous_version,
+            'changed': data_set.version != previous_version,
+            'test_count': sum(len(category.get('tests', {})) for category in data_set.reference_data['blood_tests'].values()),
+            'loaded_at': data_set.loaded_at
+        }
+    
+    def reload_if_changed(self) -> Optional[Dict]:
+        """Dosya değiştiyse yeniden yükler"""
+        signature = self._get_file_signature(self.data_path)
+        if signature == self._file_signature:
+            return None
+        try:
+            return self.reload()
         except Exception as e:
-            print(f"Referans aralıkları yüklenemedi: {e}")
-            return {}
+            logger.error(f"Referans aralıkları yeniden yüklenemedi, mevcut sürüm korunuyor: {e}")
+            # Aynı hatalı dosya tekrar denenmesin; yazım sürüyorsa imza değişir ve tekrar denenir
+            self._file_signature = signature
+            return None
+    
+    def start_watcher(self, interval: float):
+        """Dosyayı periyodik olarak kontrol eden arka plan görevini başlatır"""
+        if interval > 0 and self._watcher_task is None:
+            self._watcher_task = asyncio.create_task(self._watch(interval))
+    
+    async def stop_watcher(self):
+        if self._watcher_task is not None:
+            self._watcher_task.cancel()
+            await asyncio.gather(self._watcher_task, return_exceptions=True)
+            self._watcher_task = None
+    
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            # Okuma ve derleme event loop dışında yapılır
+            await asyncio.to_thread(self.reload_if_changed)
+    
+    @staticmethod
+    def _get_file_signature(file_path: str) -> Optional[Tuple[float, int]]:
+        try:
+            stat = os.stat(file_path)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _normalize_test_name(test_name: str) -> str:
+        """Test adını indeks anahtarı formatına çevirir"""
+        return normalize_test_name(test_name)
     
     def get_test_reference_range(self, test_name: str, age: int, gender: str = None) -> Optional[Dict]:
         """
@@ -33,50 +357,20 @@ class ReferenceRangeService:
         Returns:
             Referans aralığı bilgisi
         """
+        range_data = self._get_reference_range(self._data, test_name, age, gender)
+        return dict(range_data) if range_data else None
+    
+    def _get_reference_range(self, data: ReferenceDataSet, test_name: str, age: int, gender: Optional[str]) -> Optional[Dict]:
+        """Verilen sürümden referans aralığı kaydını döndürür (kopyalamadan)"""
         try:
-            # Test adını normalize et
-            test_name = test_name.lower().replace(' ', '_')
-            
-            # Tüm kategorilerde test ara
-            for category, category_data in self.reference_data.get('blood_tests', {}).items():
-                if test_name in category_data.get('tests', {}):
-                    test_data = category_data['tests'][test_name]
-                    
-                    # Yaş grubunu belirle
-                    age_group = self._get_age_group(age)
-                    
-                    # Referans aralığını bul
-                    reference_ranges = test_data.get('reference_ranges', {})
-                    
-                    # Cinsiyet ve yaş grubuna göre aralık seç
-                    if gender and gender in reference_ranges:
-                        if age_group in reference_ranges[gender]:
-                            range_data = reference_ranges[gender][age_group]
-                        else:
-                            range_data = reference_ranges[gender]
-                    elif age_group in reference_ranges:
-                        range_data = reference_ranges[age_group]
-                    elif 'adult' in reference_ranges:
-                        range_data = reference_ranges['adult']
-                    else:
-                        # İlk mevcut aralığı al
-                        range_data = next(iter(reference_ranges.values()))
-                    
-                    return {
-                        'test_name': test_data['name'],
-                        'unit': test_data['unit'],
-                        'reference_range': range_data,
-                        'critical_low': test_data.get('critical_low'),
-                        'critical_high': test_data.get('critical_high'),
-                        'description': test_data.get('description', ''),
-                        'category': category_data['category']
-                    }
+            if not data.contains(test_name):
+                logger.debug(f"Test referans aralığı bulunamadı: {test_name}")
+                return None
             
-            print(f"Test referans aralığı bulunamadı: {test_name}")
-            return None
+            return data.resolve_range(test_name, data.get_age_group(age), gender)
             
         except Exception as e:
-            print(f"Referans aralığı getirme hatası: {e}")
+            logger.error(f"Referans aralığı getirme hatası: {e}")
             return None
     
     def evaluate_test_result(self, test_name: str, value: float, age: int, gender: str = None) -> Dict:
@@ -92,14 +386,16 @@ class ReferenceRangeService:
         Returns:
             Değerlendirme sonucu
         """
+        data = self._data
         try:
-            reference_data = self.get_test_reference_range(test_name, age, gender)
+            reference_data = self._get_reference_range(data, test_name, age, gender)
             
             if not reference_data:
                 return {
                     'status': 'unknown',
                     'message': 'Referans aralığı bulunamadı',
-                    'value': value
+                    'value': value,
+                    'reference_version': data.version
                 }
             
             min_val = reference_data['reference_range']['min']
@@ -125,7 +421,7 @@ class ReferenceRangeService:
                 risk_level = 'normal'
             
             # Risk seviyesi rengini al
-            risk_color = self.reference_data.get('risk_levels', {}).get(risk_level, {}).get('color', 'gray')
+            risk_color = data.risk_color(risk_level)
             
             return {
                 'status': status,
@@ -141,46 +437,140 @@ class ReferenceRangeService:
                 'test_name': reference_data['test_name'],
                 'category': reference_data['category'],
                 'description': reference_data['description'],
-                'message': self._get_status_message(status, value, min_val, max_val)
+                'message': status_message(status, value, min_val, max_val),
+                'reference_version': data.version
             }
             
         except Exception as e:
-            print(f"Test sonucu değerlendirme hatası: {e}")
+            logger.error(f"Test sonucu değerlendirme hatası: {e}")
             return {
                 'status': 'error',
                 'message': 'Değerlendirme sırasında hata oluştu',
                 'value': value
             }
     
-    def _get_age_group(self, age: int) -> str:
-        """Yaşa göre yaş grubunu belirler"""
-        age_groups = self.reference_data.get('age_groups', {})
+    def evaluate_many(
+        self,
+        test_names: Sequence[str],
+        values: Sequence[float],
+        ages: Union[int, Sequence[int]],
+        genders: Union[Optional[str], Sequence[Optional[str]]] = None
+    ) -> 'BatchEvaluation':
+        """
+        Çok sayıda test sonucunu tek seferde, sütun bazlı değerlendirir
         
-        for group_name, group_range in age_groups.items():
-            if group_range['min'] <= age <= group_range['max']:
-                return group_name
+        Referans aralıkları yalnızca benzersiz (test, cinsiyet, yaş grubu)
+        kombinasyonları için çözülür; durum ve risk seviyesi NumPy
+        karşılaştırmalarıyla hesaplanır.
         
-        return 'adult'  # Varsayılan
-    
-    def _get_status_message(self, status: str, value: float, min_val: float, max_val: float) -> str:
-        """Duruma göre mesaj oluşturur"""
-        if status == 'normal':
-            return f"Değer normal aralıkta ({min_val} - {max_val})"
-        elif status == 'low':
-            return f"Değer normal aralığın altında (Normal: {min_val} - {max_val})"
-        elif status == 'high':
-            return f"Değer normal aralığın üstünde (Normal: {min_val} - {max_val})"
-        elif status == 'critical_low':
-            return f"Değer kritik seviyenin altında!"
-        elif status == 'critical_high':
-            return f"Değer kritik seviyenin üstünde!"
+        Args:
+            test_names: Test adları
+            values: Test değerleri
+            ages: Hasta yaşları (tek değer tüm satırlara uygulanır)
+            genders: Hasta cinsiyetleri (tek değer tüm satırlara uygulanır)
+        
+        Returns:
+            Sütun bazlı değerlendirme sonucu
+        """
+        data = self._data
+        values = np.asarray(values, dtype=float)
+        size = len(values)
+        names = np.asarray(test_names, dtype=object).reshape(-1)
+        if len(names) != size:
+            raise ValueError("test_names ve values aynı uzunlukta olmalıdır")
+        
+        ages = np.broadcast_to(np.asarray(ages), (size,))
+        if genders is None or isinstance(genders, str):
+            genders = np.full(size, genders or '', dtype=object)
         else:
-            return "Değer değerlendirilemedi"
+            genders = np.array([gender or '' for gender in genders], dtype=object)
+        
+        # Yaş grubu kodları: yalnızca benzersiz yaşlar için çözülür
+        age_uniques, age_inverse = np.unique(ages, return_inverse=True)
+        group_names: List[str] = []
+        group_codes: Dict[str, int] = {}
+        unique_age_codes = np.empty(len(age_uniques), dtype=np.int64)
+        for position, age in enumerate(age_uniques.tolist()):
+            group = data.get_age_group(age)
+            if group not in group_codes:
+                group_codes[group] = len(group_names)
+                group_names.append(group)
+            unique_age_codes[position] = group_codes[group]
+        age_codes = unique_age_codes[age_inverse]
+        
+        # Benzersiz kombinasyonları bul
+        name_uniques, name_codes = np.unique(names.astype(str), return_inverse=True)
+        gender_uniques, gender_codes = np.unique(genders.astype(str), return_inverse=True)
+        combined = (
+            name_codes.astype(np.int64) * len(gender_uniques) + gender_codes
+        ) * max(len(group_names), 1) + age_codes
+        combo_keys, combo_index = np.unique(combined, return_inverse=True)
+        
+        combo_count = len(combo_keys)
+        combo_records: List[Optional[Dict]] = []
+        combo_min = np.full(combo_count, np.nan)
+        combo_max = np.full(combo_count, np.nan)
+        combo_critical_low = np.full(combo_count, np.nan)
+        combo_critical_high = np.full(combo_count, np.nan)
+        for position, key in enumerate(combo_keys.tolist()):
+            key, age_code = divmod(key, max(len(group_names), 1))
+            name_code, gender_code = divmod(key, len(gender_uniques))
+            range_data = data.resolve_range(
+                str(name_uniques[name_code]),
+                group_names[age_code],
+                str(gender_uniques[gender_code]) or None
+            )
+            combo_records.append(range_data)
+            if range_data is None:
+                continue
+            combo_min[position] = range_data['reference_range']['min']
+            combo_max[position] = range_data['reference_range']['max']
+            if range_data['critical_low'] is not None:
+                combo_critical_low[position] = range_data['critical_low']
+            if range_data['critical_high'] is not None:
+                combo_critical_high[position] = range_data['critical_high']
+        
+        found = np.array([record is not None for record in combo_records], dtype=bool)[combo_index]
+        reference_min = combo_min[combo_index]
+        reference_max = combo_max[combo_index]
+        critical_low = combo_critical_low[combo_index]
+        critical_high = combo_critical_high[combo_index]
+        
+        # Durumu belirle (evaluate_test_result ile aynı öncelik sırası)
+        with np.errstate(invalid='ignore'):
+            status_codes = np.select(
+                [
+                    ~found,
+                    values <= critical_low,
+                    values >= critical_high,
+                    values < reference_min,
+                    values > reference_max,
+                ],
+                [0, 4, 5, 2, 3],
+                default=1
+            ).astype(np.int8)
+        
+        return BatchEvaluation(
+            data=data,
+            test_names=names,
+            values=values,
+            status_codes=status_codes,
+            reference_min=reference_min,
+            reference_max=reference_max,
+            critical_low=critical_low,
+            critical_high=critical_high,
+            combo_index=combo_index,
+            combo_records=combo_records
+        )
+    
+    def _get_age_group(self, age: int) -> str:
+        """Yaşa göre yaş grubunu belirler"""
+        return self._data.get_age_group(age)
     
     def get_all_tests(self) -> List[Dict]:
         """Tüm testleri listeler"""
         tests = []
-        for category, category_data in self.reference_data.get('blood_tests', {}).items():
+        for category_data in self.reference_data.get('blood_tests', {}).values():
             for test_key, test_data in category_data.get('tests', {}).items():
                 tests.append({
                     'key': test_key,
@@ -202,13 +592,104 @@ class ReferenceRangeService:
             })
         return tests
     
+    def resolve_test_key(self, test_name: str) -> Optional[str]:
+        """Test adı veya takma adından asıl test anahtarını döndürür"""
+        return self._data.resolve_test_key(test_name)
+    
     def validate_test_name(self, test_name: str) -> bool:
         """Test adının geçerli olup olmadığını kontrol eder"""
-        test_name = test_name.lower().replace(' ', '_')
-        for category_data in self.reference_data.get('blood_tests', {}).values():
-            if test_name in category_data.get('tests', {}):
-                return True
-        return False
+        return self._data.contains(test_name)
+
+class BatchEvaluation:
+    """evaluate_many sonucunu sütun bazlı tutar; satır sözlükleri istenirse oluşturulur"""
+    
+    def __init__(
+        self,
+        data: ReferenceDataSet,
+        test_names: np.ndarray,
+        values: np.ndarray,
+        status_codes: np.ndarray,
+        reference_min: np.ndarray,
+        reference_max: np.ndarray,
+        critical_low: np.ndarray,
+        critical_high: np.ndarray,
+        combo_index: np.ndarray,
+        combo_records: List[Optional[Dict]]
+    ):
+        self._data = data
+        self.version = data.version
+        self.test_names = test_names
+        self.values = values
+        self.status_codes = status_codes
+        self.reference_min = reference_min
+        self.reference_max = reference_max
+        self.critical_low = critical_low
+        self.critical_high = critical_high
+        self._combo_index = combo_index
+        self._combo_records = combo_records
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    @property
+    def status(self) -> np.ndarray:
+        """Satır bazlı durum dizisi ('normal', 'low', ...)"""
+        return np.array(BATCH_STATUSES, dtype=object)[self.status_codes]
+    
+    @property
+    def risk_level(self) -> np.ndarray:
+        """Satır bazlı risk seviyesi dizisi (bulunamayan testler için None)"""
+        return np.array(BATCH_RISK_LEVELS, dtype=object)[self.status_codes]
+    
+    @property
+    def abnormal_mask(self) -> np.ndarray:
+        """Normal olmayan (ve referansı bulunan) satırlar"""
+        return self.status_codes >= 2
+    
+    @property
+    def critical_mask(self) -> np.ndarray:
+        """Kritik seviyedeki satırlar"""
+        return self.status_codes >= 4
+    
+    def to_records(self) -> List[Dict]:
+        """Tüm satırları evaluate_test_result ile aynı formatta döndürür"""
+        return [self.record(index) for index in range(len(self))]
+    
+    def record(self, index: int) -> Dict:
+        """Tek bir satırı evaluate_test_result ile aynı formatta döndürür"""
+        value = self.values[index].item()
+        status = BATCH_STATUSES[self.status_codes[index]]
+        if status == 'unknown':
+            return {
+                'status': 'unknown',
+                'message': 'Referans aralığı bulunamadı',
+                'value': value,
+                'reference_version': self.version
+            }
+        
+        reference_data = self._combo_records[self._combo_index[index]]
+        min_val = reference_data['reference_range']['min']
+        max_val = reference_data['reference_range']['max']
+        risk_level = BATCH_RISK_LEVELS[self.status_codes[index]]
+        risk_color = self._data.risk_color(risk_level)
+        
+        return {
+            'status': status,
+            'risk_level': risk_level,
+            'risk_color': risk_color,
+            'value': value,
+            'unit': reference_data['unit'],
+            'reference_range': f"{min_val} - {max_val}",
+            'reference_min': min_val,
+            'reference_max': max_val,
+            'critical_low': reference_data['critical_low'],
+            'critical_high': reference_data['critical_high'],
+            'test_name': reference_data['test_name'],
+            'category': reference_data['category'],
+            'description': reference_data['description'],
+            'message': status_message(status, value, min_val, max_val),
+            'reference_version': self.version
+        }
 
 # Global servis instance
-reference_range_service = ReferenceRangeService() 
\ No newline at end of file
+reference_range_service = ReferenceRangeService(data_path=settings.REFERENCE_DATA_PATH) 
\ No newline at end of file
@@ -0,0 +1,332 @@
+"""
+Referans aralıkları için sıkıştırılmış, bellek eşlemeli (mmap) ikili snapshot
+
+JSON dosyası her worker'da ayrı bir sözlük ağacına dönüştürülür. Snapshot
+ise sayısal değerleri paketlenmiş dizilerde, metinleri tek bir interned
+string tablosunda tutar; dosya mmap ile açıldığından tüm worker'lar aynı
+sayfaları işletim sistemi önbelleğinden paylaşır.
+
+Oluşturma:
+    python -m app.services.reference_snapshot app/data/medical_reference_ranges.json app/data/medical_reference_ranges.snapshot
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'RRSNAP01'
+_HEADER = struct.Struct('<8sI')
+_ALIGNMENT = 8
+
+# Sayısal alan bayrakları: JSON'daki tam sayılar tam sayı olarak geri döner
+_FLAG_LOW_INT = 1
+_FLAG_HIGH_INT = 2
+_FLAG_MISSING = 4
+
+def is_snapshot_file(file_path: str) -> bool:
+    """Dosyanın snapshot formatında olup olmadığını kontrol eder"""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+class _StringTable:
+    """Oluşturma sırasında metinleri tekilleştirir"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        sid = self._ids.get(value)
+        if sid is None:
+            sid = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return sid
+
+def _pack_bounds(low, high) -> Tuple[float, float, int]:
+    flags = 0
+    if isinstance(low, int):
+        flags |= _FLAG_LOW_INT
+    if isinstance(high, int):
+        flags |= _FLAG_HIGH_INT
+    return (
+        float('nan') if low is None else float(low),
+        float('nan') if high is None else float(high),
+        flags
+    )
+
+def _unpack_bound(value: float, is_int: bool):
+    if value != value:  # NaN
+        return None
+    return int(value) if is_int else float(value)
+
+def build_snapshot(data_set, output_path: str):
+    """
+    Derlenmiş bir ReferenceDataSet'ten snapshot dosyası yazar
+
+    Dosya önce geçici bir ada yazılır ve os.replace ile yerine konur;
+    dosyayı izleyen worker'lar yarım yazılmış bir snapshot görmez.
+    """
+    strings = _StringTable()
+    reference_data = data_set.reference_data
+    age_groups = reference_data.get('age_groups', {})
+
+    # Testler (JSON sırası korunur)
+    test_ids: Dict[str, int] = {}
+    test_columns = {name: [] for name in ('key', 'name', 'unit', 'description', 'category_key', 'category')}
+    test_critical_low, test_critical_high, test_flags = [], [], []
+    gender_ids: Dict[str, int] = {}
+    for category_key, category_data in reference_data.get('blood_tests', {}).items():
+        for test_key, test_data in category_data.get('tests', {}).items():
+            if test_key in test_ids:
+                continue
+            test_ids[test_key] = len(test_ids)
+            test_columns['key'].append(strings.intern(test_key))
+            test_columns['name'].append(strings.intern(test_data['name']))
+            test_columns['unit'].append(strings.intern(test_data['unit']))
+            test_columns['description'].append(strings.intern(test_data.get('description', '')))
+            test_columns['category_key'].append(strings.intern(category_key))
+            test_columns['category'].append(strings.intern(category_data['category']))
+            low, high, flags = _pack_bounds(test_data.get('critical_low'), test_data.get('critical_high'))
+            test_critical_low.append(low)
+            test_critical_high.append(high)
+            test_flags.append(flags)
+            for gender in test_data.get('reference_ranges', {}):
+                gender_ids.setdefault(gender, len(gender_ids))
+
+    group_names = sorted(set(age_groups) | {'adult'})
+    group_ids = {name: index for index, name in enumerate(group_names)}
+
+    # Çözülmüş aralık tablosu, arama anahtarına göre sıralı
+    rows = []
+    for (test_key, gender, age_group), range_data in data_set.range_table.items():
+        if test_key not in test_ids:
+            continue
+        gender_slot = 0 if gender is None else gender_ids[gender] + 1
+        key = (test_ids[test_key] * (len(gender_ids) + 1) + gender_slot) * len(group_names) + group_ids[age_group]
+        bounds = range_data['reference_range']
+        if bounds is None:
+            rows.append((key, float('nan'), float('nan'), _FLAG_MISSING))
+        else:
+            rows.append((key, *_pack_bounds(bounds['min'], bounds['max'])))
+    rows.sort()
+
+    aliases = [(strings.intern(alias), test_ids[record[1]]) for alias, record in data_set.test_index.items()]
+    age_table = [group_ids[group] for group in data_set.age_group_table]
+    gender_sids = [strings.intern(gender) for gender in gender_ids]
+    group_sids = [strings.intern(group) for group in group_names]
+
+    encoded = [value.encode('utf-8') for value in strings.strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(value) for value in encoded], out=string_offsets[1:])
+
+    sections = {
+        'string_offsets': string_offsets,
+        'string_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        **{f'test_{name}': np.asarray(values, dtype=np.int32) for name, values in test_columns.items()},
+        'test_critical_low': np.asarray(test_critical_low, dtype=np.float64),
+        'test_critical_high': np.asarray(test_critical_high, dtype=np.float64),
+        'test_flags': np.asarray(test_flags, dtype=np.uint8),
+        'row_key': np.asarray([row[0] for row in rows], dtype=np.int64),
+        'row_min': np.asarray([row[1] for row in rows], dtype=np.float64),
+        'row_max': np.asarray([row[2] for row in rows], dtype=np.float64),
+        'row_flags': np.asarray([row[3] for row in rows], dtype=np.uint8),
+        'age_table': np.asarray(age_table, dtype=np.int32),
+        'alias_name': np.asarray([alias[0] for alias in aliases], dtype=np.int32),
+        'alias_test': np.asarray([alias[1] for alias in aliases], dtype=np.int32),
+        'gender_keys': np.asarray(gender_sids, dtype=np.int32),
+        'group_names': np.asarray(group_sids, dtype=np.int32),
+    }
+
+    # Bölüm konumları meta veride tutulur; meta veri uzunluğu konumları etkilediği için sabitlenene kadar tekrarlanır
+    metadata = {
+        'version': data_set.version,
+        'age_groups': age_groups,
+        'risk_levels': reference_data.get('risk_levels', {}),
+        'gender_count': len(gender_ids),
+        'group_count': len(group_names),
+        'sections': {}
+    }
+    metadata_bytes = b''
+    while len(metadata_bytes) != len(json.dumps(metadata).encode('utf-8')):
+        metadata_bytes = json.dumps(metadata).encode('utf-8')
+        offset = _HEADER.size + len(metadata_bytes)
+        for name, array in sections.items():
+            offset += -offset % _ALIGNMENT
+            metadata['sections'][name] = [offset, array.dtype.str, len(array)]
+            offset += array.nbytes
+    metadata_bytes = json.dumps(metadata).encode('utf-8')
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(metadata_bytes)))
+        f.write(metadata_bytes)
+        for name, array in sections.items():
+            offset = metadata['sections'][name][0]
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(array.tobytes())
+    os.replace(temp_path, output_path)
+
+class SnapshotDataSet:
+    """
+    mmap ile açılmış snapshot üzerinde ReferenceDataSet ile aynı arama arayüzü
+
+    Sayısal diziler dosyanın sayfalarına doğrudan bakan NumPy görünümleridir;
+    worker başına yalnızca ad -> test indeksi sözlüğü ve küçük yaş/cinsiyet
+    tabloları oluşturulur.
+    """
+
+    def __init__(self, file_path: str):
+        with open(file_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, metadata_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Geçersiz snapshot dosyası: {file_path}")
+        metadata = json.loads(self._mmap[_HEADER.size:_HEADER.size + metadata_length].decode('utf-8'))
+
+        self._sections = {
+            name: np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=offset)
+            for name, (offset, dtype, count) in metadata['sections'].items()
+        }
+        self.version = metadata['version']
+        self.loaded_at = datetime.now().isoformat()
+        self._age_groups = metadata['age_groups']
+        self._risk_levels = metadata['risk_levels']
+        self._gender_count = metadata['gender_count']
+        self._group_count = metadata['group_count']
+        self._reference_data: Optional[Dict] = None
+        # Servis modülü bu modülü içe aktardığı için normalizasyon burada alınır
+        from app.services.reference_range_service import normalize_test_name
+        self._normalize = normalize_test_name
+
+        self._group_names = [self._string(sid) for sid in self._sections['group_names'].tolist()]
+        self._group_index = {name: index for index, name in enumerate(self._group_names)}
+        self._gender_index = {
+            self._string(sid): index for index, sid in enumerate(self._sections['gender_keys'].tolist())
+        }
+        self._test_lookup: Dict[str, int] = {}
+        for name_sid, test_index in zip(self._sections['alias_name'].tolist(), self._sections['alias_test'].tolist()):
+            self._test_lookup.setdefault(self._string(name_sid), test_index)
+
+    def _string(self, sid: int) -> str:
+        offsets = self._sections['string_offsets']
+        start, end = int(offsets[sid]), int(offsets[sid + 1])
+        return self._sections['string_blob'][start:end].tobytes().decode('utf-8')
+
+    def contains(self, test_name: str) -> bool:
+        return self._normalize(test_name) in self._test_lookup
+
+    def resolve_test_key(self, test_name: str) -> Optional[str]:
+        test_index = self._test_lookup.get(self._normalize(test_name))
+        return None if test_index is None else self._string(int(self._sections['test_key'][test_index]))
+
+    def resolve_range(self, test_name: str, age_group: str, gender: Optional[str]) -> Optional[Dict]:
+        """Snapshot'tan referans aralığı kaydını oluşturur"""
+        test_index = self._test_lookup.get(self._normalize(test_name))
+        if test_index is None:
+            return None
+
+        group_index = self._group_index.get(age_group)
+        if group_index is None:
+            return None
+        gender_index = self._gender_index.get(gender) if gender else None
+        row = None
+        if gender_index is not None:
+            row = self._find_row(test_index, gender_index + 1, group_index)
+        if row is None:
+            row = self._find_row(test_index, 0, group_index)
+        if row is None or self._sections['row_flags'][row] & _FLAG_MISSING:
+            return None
+
+        row_flags = int(self._sections['row_flags'][row])
+        test_flags = int(self._sections['test_flags'][test_index])
+        return {
+            'test_name': self._string(int(self._sections['test_name'][test_index])),
+            'unit': self._string(int(self._sections['test_unit'][test_index])),
+            'reference_range': {
+                'min': _unpack_bound(float(self._sections['row_min'][row]), row_flags & _FLAG_LOW_INT),
+                'max': _unpack_bound(float(self._sections['row_max'][row]), row_flags & _FLAG_HIGH_INT)
+            },
+            'critical_low': _unpack_bound(float(self._sections['test_critical_low'][test_index]), test_flags & _FLAG_LOW_INT),
+            'critical_high': _unpack_bound(float(self._sections['test_critical_high'][test_index]), test_flags & _FLAG_HIGH_INT),
+            'description': self._string(int(self._sections['test_description'][test_index])),
+            'category': self._string(int(self._sections['test_category'][test_index]))
+        }
+
+    def _find_row(self, test_index: int, gender_slot: int, group_index: int) -> Optional[int]:
+        keys = self._sections['row_key']
+        key = (test_index * (self._gender_count + 1) + gender_slot) * self._group_count + group_index
+        position = int(np.searchsorted(keys, key))
+        if position < len(keys) and keys[position] == key:
+            return position
+        return None
+
+    def get_age_group(self, age: int) -> str:
+        """Yaşa göre yaş grubunu belirler"""
+        age_table = self._sections['age_table']
+        if isinstance(age, int) and 0 <= age < len(age_table):
+            return self._group_names[age_table[age]]
+        return self.scan_age_group(age)
+
+    def scan_age_group(self, age: int) -> str:
+        """Yaş gruplarını sırayla tarayarak yaş grubunu belirler"""
+        for group_name, group_range in self._age_groups.items():
+            if group_range['min'] <= age <= group_range['max']:
+                return group_name
+        return 'adult'  # Varsayılan
+
+    def risk_color(self, risk_level: str) -> str:
+        return self._risk_levels.get(risk_level, {}).get('color', 'gray')
+
+    @property
+    def reference_data(self) -> Dict:
+        """
+        Test kataloğunun sözlük görünümü (ilk erişimde oluşturulur)
+
+        Listeleme uç noktaları için ad, birim ve kategori bilgisi içerir;
+        ham 'reference_ranges' alanları snapshot'ta tutulmaz.
+        """
+        if self._reference_data is None:
+            blood_tests: Dict[str, Dict] = {}
+            sections = self._sections
+            for test_index in range(len(sections['test_key'])):
+                category = blood_tests.setdefault(
+                    self._string(int(sections['test_category_key'][test_index])),
+                    {'category': self._string(int(sections['test_category'][test_index])), 'tests': {}}
+                )
+                test_flags = int(sections['test_flags'][test_index])
+                category['tests'][self._string(int(sections['test_key'][test_index]))] = {
+                    'name': self._string(int(sections['test_name'][test_index])),
+                    'unit': self._string(int(sections['test_unit'][test_index])),
+                    'description': self._string(int(sections['test_description'][test_index])),
+                    'critical_low': _unpack_bound(float(sections['test_critical_low'][test_index]), test_flags & _FLAG_LOW_INT),
+                    'critical_high': _unpack_bound(float(sections['test_critical_high'][test_index]), test_flags & _FLAG_HIGH_INT)
+                }
+            self._reference_data = {
+                'blood_tests': blood_tests,
+                'age_groups': self._age_groups,
+                'risk_levels': self._risk_levels
+            }
+        return self._reference_data
+
+def main(argv: List[str]) -> int:
+    from app.services.reference_range_service import load_reference_data_set
+
+    if len(argv) != 2:
+        print("Kullanım: python -m app.services.reference_snapshot <kaynak.json> <hedef.snapshot>")
+        return 2
+    source_path, output_path = argv
+    data_set = load_reference_data_set(source_path)
+    build_snapshot(data_set, output_path)
+    print(f"Snapshot oluşturuldu: {output_path} (sürüm {data_set.version}, {os.path.getsize(output_path)} bayt)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
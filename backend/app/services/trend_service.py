@@ -0,0 +1,261 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.core import database
+from app.core.config import settings
+from app.models.database import TestResult, TestTrendSummary, TrendFlag
+from app.services.reference_range_service import normalize_test_name, reference_range_service
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400.0
+
+def _parse_date(value: Union[str, datetime, None]) -> Optional[datetime]:
+    """ISO metin veya datetime değerini saat dilimsiz datetime'a çevirir"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+class TrendService:
+    """
+    Hasta test sonuçları için boylamsal trend hesaplama servisi
+
+    Kayıtlı geçmiş için her (hasta, test) çifti bir TestTrendSummary
+    satırında artımlı olarak özetlenir; trend görünümü tüm geçmişi taramaz.
+    """
+
+    def __init__(self, rate_of_change_threshold: float = 0.2):
+        self.rate_of_change_threshold = rate_of_change_threshold
+
+    def test_key(self, test_name: str) -> str:
+        """Test adını trend anahtarına çevirir"""
+        return reference_range_service.resolve_test_key(test_name) or normalize_test_name(test_name)
+
+    def compare_results(self, current_results: List[Dict], previous_results: List[Dict]) -> List[Dict]:
+        """
+        İstekteki güncel ve önceki sonuçlardan test bazında trend çıkarır
+
+        Sonuçlarda 'test_date' yoksa sıra zaman olarak kabul edilir ve eğim
+        ölçüm başına hesaplanır.
+        """
+        series: "OrderedDict[str, List[Tuple[Optional[datetime], float]]]" = OrderedDict()
+        names: Dict[str, str] = {}
+        for result in list(previous_results) + list(current_results):
+            key = self.test_key(result['test_name'])
+            names.setdefault(key, result['test_name'])
+            series.setdefault(key, []).append((_parse_date(result.get('test_date')), float(result['value'])))
+
+        return [
+            {'test_key': key, 'test_name': names[key], **self.compute_series_trend(points)}
+            for key, points in series.items()
+        ]
+
+    def compute_series_trend(self, points: List[Tuple[Optional[datetime], float]]) -> Dict:
+        """Tek bir testin (tarih, değer) serisi için delta, eğim ve değişim bayrağı hesaplar"""
+        dated = all(date is not None for date, _ in points)
+        if dated:
+            points = sorted(points, key=lambda point: point[0])
+            origin = points[0][0]
+            times = [(date - origin).total_seconds() / SECONDS_PER_DAY for date, _ in points]
+        else:
+            times = [float(index) for index in range(len(points))]
+        values = [value for _, value in points]
+
+        sum_t, sum_v = sum(times), sum(values)
+        sum_tt = sum(t * t for t in times)
+        sum_tv = sum(t * v for t, v in zip(times, values))
+        previous = values[-2] if len(values) > 1 else None
+        return self._build_trend(
+            count=len(values),
+            last_value=values[-1],
+            previous_value=previous,
+            sums=(sum_t, sum_v, sum_tt, sum_tv),
+            slope_unit='per_day' if dated else 'per_measurement',
+            min_value=min(values),
+            max_value=max(values)
+        )
+
+    async def record_test_results(self, patient_id: int, results: List[Dict]) -> int:
+        """
+        Test sonuçlarını kaydeder ve trend özetlerini aynı işlemde günceller
+
+        Henüz olmayan özet satırı kilitlenemez; eşzamanlı iki istek aynı
+        satırı oluşturmaya çalışırsa ikincisi unique kısıtına takılır. Bu
+        durumda işlem bir kez yeniden denenir ve satır bu kez kilitlenip
+        güncellenir.
+        """
+        if database.async_session_factory is None:
+            raise RuntimeError("Veritabanı kullanılamıyor")
+        try:
+            return await self._record_test_results(patient_id, results)
+        except IntegrityError as e:
+            logger.info(f"Trend özeti eşzamanlı oluşturuldu, kayıt yeniden deneniyor - Hasta: {patient_id}: {e.orig}")
+            return await self._record_test_results(patient_id, results)
+
+    async def _record_test_results(self, patient_id: int, results: List[Dict]) -> int:
+        now = datetime.now()
+        async with database.async_session_factory() as session:
+            async with session.begin():
+                rows = []
+                for result in results:
+                    rows.append(TestResult(
+                        patient_id=patient_id,
+                        test_name=self.test_key(result['test_name']),
+                        value=float(result['value']),
+                        unit=result.get('unit'),
+                        status=result.get('status'),
+                        test_date=_parse_date(result.get('test_date')) or now
+                    ))
+                session.add_all(rows)
+
+                summaries = await self._lock_summaries(session, patient_id, sorted({row.test_name for row in rows}))
+                for row in sorted(rows, key=lambda row: row.test_date):
+                    summary = summaries.get(row.test_name)
+                    if summary is None:
+                        summary = summaries[row.test_name] = self._new_summary(patient_id, row)
+                        session.add(summary)
+                    else:
+                        self._update_summary(summary, row.test_date, row.value)
+        return len(rows)
+
+    @staticmethod
+    async def _lock_summaries(session, patient_id: int, keys: List[str]) -> Dict[str, TestTrendSummary]:
+        """Var olan özet satırlarını işlem sonuna kadar kilitler"""
+        existing = await session.execute(
+            select(TestTrendSummary)
+            .where(TestTrendSummary.patient_id == patient_id, TestTrendSummary.test_name.in_(keys))
+            .with_for_update()
+        )
+        return {summary.test_name: summary for summary in existing.scalars()}
+
+    async def get_patient_trends(self, patient_id: int) -> List[Dict]:
+        """Hastanın tüm testleri için özet tablodan trendleri döndürür"""
+        if database.async_session_factory is None:
+            return []
+        async with database.async_session_factory() as session:
+            result = await session.execute(
+                select(TestTrendSummary)
+                .where(TestTrendSummary.patient_id == patient_id)
+                .order_by(TestTrendSummary.test_name)
+            )
+            return [self._summary_to_trend(summary) for summary in result.scalars()]
+
+    async def get_test_history(self, patient_id: int, test_name: str, limit: int = 50) -> List[Dict]:
+        """Bir testin son sonuçlarını (patient_id, test_name, test_date) indeksiyle getirir"""
+        if database.async_session_factory is None:
+            return []
+        async with database.async_session_factory() as session:
+            result = await session.execute(
+                select(TestResult.test_date, TestResult.value, TestResult.unit, TestResult.status)
+                .where(TestResult.patient_id == patient_id, TestResult.test_name == self.test_key(test_name))
+                .order_by(TestResult.test_date.desc())
+                .limit(limit)
+            )
+            return [
+                {
+                    'test_date': row.test_date.isoformat() if row.test_date else None,
+                    'value': row.value,
+                    'unit': row.unit,
+                    'status': row.status
+                }
+                for row in result
+            ]
+
+    @staticmethod
+    def _new_summary(patient_id: int, row: TestResult) -> TestTrendSummary:
+        return TestTrendSummary(
+            patient_id=patient_id,
+            test_name=row.test_name,
+            result_count=1,
+            origin_date=row.test_date,
+            first_date=row.test_date,
+            last_date=row.test_date,
+            last_value=row.value,
+            min_value=row.value,
+            max_value=row.value,
+            sum_t=0.0,
+            sum_v=row.value,
+            sum_tt=0.0,
+            sum_tv=0.0
+        )
+
+    @staticmethod
+    def _update_summary(summary: TestTrendSummary, test_date: datetime, value: float):
+        """Özet satırını tek bir yeni sonuçla günceller"""
+        t = (test_date - summary.origin_date).total_seconds() / SECONDS_PER_DAY
+        summary.result_count += 1
+        summary.sum_t += t
+        summary.sum_v += value
+        summary.sum_tt += t * t
+        summary.sum_tv += t * value
+        summary.min_value = min(summary.min_value, value)
+        summary.max_value = max(summary.max_value, value)
+        summary.first_date = min(summary.first_date, test_date)
+
+        if test_date >= summary.last_date:
+            summary.previous_date, summary.previous_value = summary.last_date, summary.last_value
+            summary.last_date, summary.last_value = test_date, value
+        elif summary.previous_date is None or test_date >= summary.previous_date:
+            summary.previous_date, summary.previous_value = test_date, value
+
+    def _summary_to_trend(self, summary: TestTrendSummary) -> Dict:
+        trend = self._build_trend(
+            count=summary.result_count,
+            last_value=summary.last_value,
+            previous_value=summary.previous_value,
+            sums=(summary.sum_t, summary.sum_v, summary.sum_tt, summary.sum_tv),
+            slope_unit='per_day',
+            min_value=summary.min_value,
+            max_value=summary.max_value
+        )
+        return {
+            'test_key': summary.test_name,
+            'first_date': summary.first_date.isoformat() if summary.first_date else None,
+            'last_date': summary.last_date.isoformat() if summary.last_date else None,
+            **trend
+        }
+
+    def _build_trend(self, count: int, last_value: float, previous_value: Optional[float],
+                     sums: Tuple[float, float, float, float], slope_unit: str,
+                     min_value: float, max_value: float) -> Dict:
+        sum_t, sum_v, sum_tt, sum_tv = sums
+        denominator = count * sum_tt - sum_t * sum_t
+        slope = (count * sum_tv - sum_t * sum_v) / denominator if count > 1 and denominator else None
+
+        delta = last_value - previous_value if previous_value is not None else None
+        percent_change = delta / abs(previous_value) if delta is not None and previous_value else None
+        return {
+            'result_count': count,
+            'last_value': last_value,
+            'previous_value': previous_value,
+            'delta': delta,
+            'percent_change': round(percent_change * 100, 2) if percent_change is not None else None,
+            'slope': slope,
+            'slope_unit': slope_unit,
+            'min_value': min_value,
+            'max_value': max_value,
+            'flag': self._rate_of_change_flag(delta, percent_change)
+        }
+
+    def _rate_of_change_flag(self, delta: Optional[float], percent_change: Optional[float]) -> str:
+        if delta is None:
+            return TrendFlag.INSUFFICIENT_DATA
+        if percent_change is not None and abs(percent_change) >= self.rate_of_change_threshold:
+            return TrendFlag.RAPID_INCREASE if delta > 0 else TrendFlag.RAPID_DECREASE
+        if delta > 0:
+            return TrendFlag.INCREASING
+        if delta < 0:
+            return TrendFlag.DECREASING
+        return TrendFlag.STABLE
+
+# Global servis instance
+trend_service = TrendService(rate_of_change_threshold=settings.TREND_RATE_OF_CHANGE_THRESHOLD)
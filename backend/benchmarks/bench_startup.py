@@ -0,0 +1,9 @@
+"""Worker soğuk başlangıcı: app.main'in temiz bir süreçte içe aktarılma süresi"""
+from benchmarks import harness, startup_time
+
+def bench_app_import_time(bench):
+    samples = [startup_time.measure_once('app.main') for _ in range(3)]
+    wall = [sample['wall_seconds'] for sample in samples]
+    # Ağır LLM istemcisi ilk kullanıma kadar yüklenmemeli
+    assert not [name for name in startup_time.LAZY_MODULES if name in samples[-1]['modules']]
+    bench.record('p50_ms', harness.summarize(wall, sum(wall), len(wall)))
@@ -0,0 +1,98 @@
+"""
+Benchmark fixture'ları
+
+    python -m pytest benchmarks                       # ölç ve baseline ile karşılaştırmayı raporla
+    python -m pytest benchmarks --save-baseline       # bu makinenin baseline'ını kaydet
+    python -m pytest benchmarks --check-baseline      # regresyonda testi başarısız say
+    python -m pytest benchmarks --check-baseline --tolerance 0.4
+
+Baseline makine başına benchmarks/.baselines/ altında tutulur; başka bir
+makinede kaydedilmiş sonuçla karşılaştırma yapılmaz.
+"""
+import asyncio
+
+import pytest
+
+from benchmarks import harness
+
+harness.configure_environment()
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark')
+    group.addoption('--baseline', default=harness.default_baseline_path(),
+                    help="Baseline JSON dosyası (varsayılan: bu makineye ait dosya)")
+    group.addoption('--check-baseline', action='store_true', help="Baseline'a göre regresyonda testi başarısız say")
+    group.addoption('--tolerance', type=float, default=harness.DEFAULT_TOLERANCE,
+                    help="Birincil metrikte izin verilen göreli kötüleşme")
+    group.addoption('--save-baseline', action='store_true', help="Sonuçları baseline olarak kaydet")
+
+class BenchmarkSession:
+    """Sonuçları toplar, baseline ile karşılaştırır ve oturum sonunda raporlar"""
+
+    def __init__(self, config):
+        self.baseline_path = config.getoption('--baseline')
+        self.tolerance = config.getoption('--tolerance')
+        self.save = config.getoption('--save-baseline')
+        self.check = config.getoption('--check-baseline')
+        self.baseline = harness.load_baseline(self.baseline_path)
+        self.results = {}
+        self.regressions = {}
+
+    def record(self, name: str, metric: str, stats: dict) -> dict:
+        self.results[name] = {'metric': metric, 'stats': stats}
+        if not self.save:
+            regression = harness.check_regression(name, metric, stats, self.baseline, self.tolerance)
+            if regression:
+                self.regressions[name] = regression
+                if self.check:
+                    pytest.fail(f"Performans regresyonu: {regression}", pytrace=False)
+        return stats
+
+@pytest.fixture(scope='session')
+def benchmark_session(request):
+    session = BenchmarkSession(request.config)
+    request.config._benchmark_session = session
+    yield session
+    if session.save and session.results:
+        harness.save_baseline(session.results, session.baseline_path)
+
+@pytest.fixture
+def bench(benchmark_session, request):
+    """
+    pytest-benchmark tarzı ölçüm: bench(fn, ops_per_call=..., metric=...)
+
+    Sonuç test adıyla kaydedilir ve baseline'daki değerden tolerans kadar
+    kötüyse test başarısız olur.
+    """
+    def run(fn, ops_per_call: int = 1, metric: str = 'ops_per_second', **kwargs) -> dict:
+        stats = harness.run_benchmark(fn, ops_per_call=ops_per_call, **kwargs)
+        return benchmark_session.record(request.node.name, metric, stats)
+    run.record = lambda metric, stats, name=None: benchmark_session.record(name or request.node.name, metric, stats)
+    return run
+
+@pytest.fixture(scope='module')
+def event_loop_runner():
+    """Modül boyunca tek bir event loop; servislerdeki asyncio nesneleri tek loop'a bağlanır"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    session = getattr(config, '_benchmark_session', None)
+    if session is None or not session.results:
+        return
+    terminalreporter.section('benchmark sonuçları')
+    for name, result in session.results.items():
+        line = harness.format_stats(name, result['stats'])
+        expected = session.baseline.get(name, {}).get('value')
+        if expected is not None and not session.save:
+            line += f"  [{result['metric']} baseline {expected:.4g}]"
+        if name in session.regressions:
+            line += "  REGRESYON"
+        terminalreporter.write_line(line)
+    if not session.baseline and not session.save:
+        terminalreporter.write_line(f"Bu makine için baseline yok; kaydetmek için --save-baseline ({session.baseline_path})")
+    elif session.regressions and not session.check:
+        terminalreporter.write_line(f"{len(session.regressions)} regresyon raporlandı; başarısız saymak için --check-baseline")
+    if session.save:
+        terminalreporter.write_line(f"Baseline kaydedildi: {session.baseline_path}")
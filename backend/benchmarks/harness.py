@@ -0,0 +1,165 @@
+"""
+Benchmark yardımcıları: zamanlama, yük üretimi ve baseline karşılaştırması
+
+Her sonuç bir "birincil metrik" ile kaydedilir (ör. ops_per_second veya
+p95_ms); regresyon kontrolü yalnızca bu metrik üzerinden, kayıtlı
+baseline'a göre yüzde tolerans ile yapılır. Mutlak sonuçlar donanıma
+bağlı olduğu için baseline makine başına ayrı dosyada (git dışında) tutulur.
+"""
+import asyncio
+import json
+import logging
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_DIR = os.path.join(BENCHMARK_DIR, '.baselines')
+DEFAULT_TOLERANCE = 0.25
+
+# Büyük değerin iyi olduğu metrikler; diğerleri (süreler) küçük olduğunda iyidir
+HIGHER_IS_BETTER = {'ops_per_second', 'requests_per_second'}
+
+def configure_environment():
+    """
+    Uygulama içe aktarılmadan önce ağ gerektirmeyen benchmark ortamını ayarlar
+
+    Sahte LLM backend'i sabit tohumla çalışır; önbellek ve şablon hızlı
+    yolu kapalıdır ki her istek LLM yolunu ölçsün. Yük tek kullanıcıdan
+    geldiği için kabul kontrolü de kapatılır. Önceden tanımlı ortam
+    değişkenleri korunur.
+    """
+    defaults = {
+        'LLM_BACKEND': 'fake',
+        'FAKE_LLM_LATENCY_MS': '20',
+        'FAKE_LLM_LATENCY_SIGMA': '0.3',
+        'FAKE_LLM_SEED': '0',
+        'LLM_CACHE_ENABLED': 'false',
+        'LLM_TEMPLATE_FAST_PATH': 'false',
+        'ADMISSION_CONTROL_ENABLED': 'false',
+        'REFERENCE_RANGES_RELOAD_INTERVAL': '0',
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'health_analysis_benchmark.sqlite3'),
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    # app.main'deki basicConfig(INFO) bundan sonra etkisiz kalır; istek logları ölçümü bozmasın
+    logging.basicConfig(level=logging.WARNING)
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """Sıralı örneklerden en yakın sıra yöntemiyle yüzdelik değer"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(q / 100 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[index]
+
+def summarize(latencies: List[float], elapsed: float, operations: int) -> Dict:
+    """Saniye cinsinden gecikme örneklerini rapor sözlüğüne çevirir"""
+    ordered = sorted(latencies)
+    return {
+        'operations': operations,
+        'ops_per_second': operations / elapsed if elapsed else 0.0,
+        'mean_ms': sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+def run_benchmark(fn: Callable[[], object], ops_per_call: int = 1, min_time: float = 0.5,
+                  min_rounds: int = 5, warmup_rounds: int = 1) -> Dict:
+    """Fonksiyonu en az min_time saniye ve min_rounds tur boyunca çalıştırır"""
+    for _ in range(warmup_rounds):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < min_rounds or time.perf_counter() - start < min_time:
+        call_start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    stats = summarize([latency / ops_per_call for latency in latencies], elapsed, len(latencies) * ops_per_call)
+    stats['rounds'] = len(latencies)
+    return stats
+
+async def run_load(send: Callable[[int], Awaitable[int]], total_requests: int, concurrency: int) -> Dict:
+    """
+    total_requests isteği en fazla concurrency eşzamanlılıkla gönderir
+
+    send(i) isteği gönderip HTTP durum kodunu döndürmelidir; 2xx dışındaki
+    yanıtlar hata olarak sayılır.
+    """
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < total_requests:
+            index = next_index
+            next_index += 1
+            request_start = time.perf_counter()
+            try:
+                status_code = await send(index)
+            except Exception:
+                status_code = None
+            latencies.append(time.perf_counter() - request_start)
+            if status_code is None or not 200 <= status_code < 300:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stats = summarize(latencies, elapsed, total_requests)
+    stats['requests_per_second'] = stats.pop('ops_per_second')
+    stats['concurrency'] = concurrency
+    stats['errors'] = errors
+    return stats
+
+def host_key() -> str:
+    """Baseline dosyası için makine ve Python sürümü anahtarı"""
+    key = f"{platform.node() or 'host'}-{platform.machine()}-py{sys.version_info[0]}{sys.version_info[1]}"
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+
+def default_baseline_path() -> str:
+    return os.path.join(BASELINE_DIR, f"{host_key()}.json")
+
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(results: Dict[str, Dict], path: str):
+    """Sonuçların birincil metriklerini baseline dosyasına yazar"""
+    baseline = load_baseline(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for name, result in results.items():
+        baseline[name] = {'metric': result['metric'], 'value': round(result['stats'][result['metric']], 6)}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2)
+        f.write('\n')
+
+def check_regression(name: str, metric: str, stats: Dict, baseline: Dict,
+                     tolerance: float = DEFAULT_TOLERANCE) -> Optional[str]:
+    """Sonuç baseline'dan tolerans kadar kötüyse açıklama döndürür"""
+    entry = baseline.get(name)
+    if not entry or entry.get('metric') != metric:
+        return None
+    expected, actual = entry['value'], stats[metric]
+    if metric in HIGHER_IS_BETTER:
+        regressed = actual < expected * (1 - tolerance)
+    else:
+        regressed = actual > expected * (1 + tolerance)
+    if regressed:
+        return f"{name}: {metric} {actual:.4g} (baseline {expected:.4g}, tolerans %{tolerance * 100:.0f})"
+    return None
+
+def format_stats(name: str, stats: Dict) -> str:
+    rate = stats.get('ops_per_second', stats.get('requests_per_second', 0.0))
+    return (f"{name:<48} {rate:>12.1f}/s  mean {stats['mean_ms']:>8.3f} ms  "
+            f"p50 {stats['p50_ms']:>8.3f}  p95 {stats['p95_ms']:>8.3f}  p99 {stats['p99_ms']:>8.3f}")
@@ -0,0 +1,140 @@
+"""
+Analiz API'si için yük üreteci
+
+Varsayılan olarak uygulama süreç içinde (ASGI) sahte LLM backend'iyle
+çalıştırılır; --url verilirse çalışan bir sunucuya HTTP ile istek atılır.
+
+Kullanım (backend dizininden):
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --endpoint blood-test --concurrency 1 8 32 --requests 200
+    python benchmarks/load_test.py --url http://localhost:8000 --endpoint evaluate-test
+    python benchmarks/load_test.py --check-baseline      # regresyonda 1 ile çıkar
+    python benchmarks/load_test.py --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import harness  # noqa: E402
+
+ENDPOINTS = ('evaluate-test', 'blood-test', 'reference-tests')
+
+# Panel içeriği istek sırasına göre değişir; özdeş prompt'lar single-flight ile birleşmesin
+PANEL_TESTS = (
+    ('hemoglobin', 'g/dL', 13.5),
+    ('glucose_fasting', 'mg/dL', 92.0),
+    ('white_blood_cells', 'K/μL', 7.2),
+    ('platelets', 'K/μL', 250.0),
+    ('total_cholesterol', 'mg/dL', 185.0),
+)
+
+def blood_test_payload(index: int) -> Dict:
+    return {
+        'test_results': [
+            {'test_name': name, 'value': round(value * (0.7 + (index * 7 + offset) % 60 / 100), 2), 'unit': unit}
+            for offset, (name, unit, value) in enumerate(PANEL_TESTS)
+        ],
+        'patient_info': {'age': 20 + index % 60, 'gender': 'female' if index % 2 else 'male'},
+    }
+
+def evaluate_test_params(index: int) -> Dict:
+    name, _, value = PANEL_TESTS[index % len(PANEL_TESTS)]
+    return {'test_name': name, 'value': value * (0.5 + index % 100 / 100), 'age': 18 + index % 70,
+            'gender': 'female' if index % 2 else 'male'}
+
+def make_sender(client, endpoint: str):
+    async def send(index: int) -> int:
+        if endpoint == 'evaluate-test':
+            response = await client.post('/api/v1/evaluate-test', params=evaluate_test_params(index))
+        elif endpoint == 'reference-tests':
+            # Panel listesini yoklayan pano: gzip kabul eder, ETag ile yeniden doğrulamaz
+            response = await client.get('/api/v1/reference-ranges/tests', headers={'Accept-Encoding': 'gzip'})
+        else:
+            response = await client.post('/api/v1/analyze/blood-test', json=blood_test_payload(index))
+        return response.status_code
+    return send
+
+@asynccontextmanager
+async def open_client(url: Optional[str] = None):
+    """Verilen sunucuya ya da süreç içi uygulamaya bağlı bir httpx istemcisi açar"""
+    import httpx
+
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            yield client
+        return
+
+    harness.configure_environment()
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(app=app, base_url='http://benchmark', timeout=60) as client:
+            yield client
+
+def result_name(endpoint: str, concurrency: int) -> str:
+    return f"load.{endpoint}.c{concurrency}"
+
+async def run_matrix(client, endpoints: List[str], concurrencies: List[int], total_requests: int) -> Dict[str, Dict]:
+    """Her uç nokta ve eşzamanlılık için yük çalıştırır; sonuçlar isimle döner"""
+    results = {}
+    for endpoint in endpoints:
+        send = make_sender(client, endpoint)
+        await send(0)  # ısınma
+        for concurrency in concurrencies:
+            stats = await harness.run_load(send, total_requests, concurrency)
+            metric = 'p95_ms' if endpoint == 'blood-test' else 'requests_per_second'
+            results[result_name(endpoint, concurrency)] = {'metric': metric, 'stats': stats}
+    return results
+
+async def run(args) -> Dict[str, Dict]:
+    async with open_client(args.url) as client:
+        return await run_matrix(client, args.endpoint, args.concurrency, args.requests)
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Analiz API'si için yük üreteci")
+    parser.add_argument('--url', help="Çalışan sunucu adresi (verilmezse süreç içi uygulama kullanılır)")
+    parser.add_argument('--endpoint', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help="Her eşzamanlılık seviyesi için istek sayısı")
+    parser.add_argument('--json', action='store_true', help="Sonuçları JSON olarak yazdır")
+    parser.add_argument('--baseline', default=harness.default_baseline_path(),
+                        help="Baseline JSON dosyası (varsayılan: bu makineye ait dosya)")
+    parser.add_argument('--tolerance', type=float, default=harness.DEFAULT_TOLERANCE)
+    parser.add_argument('--check-baseline', action='store_true', help="Baseline'a göre regresyonda 1 ile çık")
+    parser.add_argument('--save-baseline', action='store_true', help="Sonuçları baseline olarak kaydet")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            stats = result['stats']
+            print(f"{harness.format_stats(name, stats)}  hata {stats['errors']}")
+
+    if args.save_baseline:
+        harness.save_baseline(results, args.baseline)
+        print(f"Baseline kaydedildi: {args.baseline}")
+        return 0
+
+    exit_code = 0
+    if any(result['stats']['errors'] for result in results.values()):
+        print("HATA: başarısız istekler var")
+        exit_code = 1
+    if args.check_baseline:
+        baseline = harness.load_baseline(args.baseline)
+        for name, result in results.items():
+            regression = harness.check_regression(name, result['metric'], result['stats'], baseline, args.tolerance)
+            if regression:
+                print(f"REGRESYON: {regression}")
+                exit_code = 1
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
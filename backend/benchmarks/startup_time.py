@@ -0,0 +1,94 @@
+"""
+Worker soğuk başlangıç süresi ölçümü
+
+Uygulama modülü ayrı bir Python sürecinde `-X importtime` ile içe aktarılır;
+toplam süre, en pahalı modüller ve google.generativeai'nin başlangıçta
+yüklenip yüklenmediği raporlanır.
+
+Kullanım (backend dizininden):
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 10 --module app.main --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Başlangıçta yüklenmemesi gereken ağır modüller
+LAZY_MODULES = ('google.generativeai',)
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, int]]:
+    """`-X importtime` çıktısını modül -> {self_us, cumulative_us} sözlüğüne çevirir"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules[name.strip()] = {'self_us': int(self_us), 'cumulative_us': int(cumulative_us)}
+    return modules
+
+def measure_once(module: str) -> Dict:
+    """Modülü temiz bir süreçte bir kez içe aktarır"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = BACKEND_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    env.setdefault('GEMINI_API_KEY', '')
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - start)"
+    )
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = parse_importtime(completed.stderr)
+    return {
+        'wall_seconds': float(completed.stdout.strip().splitlines()[-1]),
+        'modules': modules
+    }
+
+def run(module: str, runs: int, top: int) -> Dict:
+    samples = [measure_once(module) for _ in range(runs)]
+    wall = [sample['wall_seconds'] for sample in samples]
+    last = samples[-1]['modules']
+    slowest = sorted(last.items(), key=lambda item: item[1]['cumulative_us'], reverse=True)[:top]
+    return {
+        'module': module,
+        'runs': runs,
+        'wall_seconds_median': statistics.median(wall),
+        'wall_seconds_min': min(wall),
+        'wall_seconds_max': max(wall),
+        'loaded_lazy_modules': [name for name in LAZY_MODULES if name in last],
+        'slowest_imports': [
+            {'module': name, 'cumulative_ms': round(timing['cumulative_us'] / 1000, 2)}
+            for name, timing in slowest
+        ]
+    }
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Uygulama import/soğuk başlangıç süresini ölçer")
+    parser.add_argument('--module', default='app.main')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', action='store_true', help="Sonucu JSON olarak yazdır")
+    args = parser.parse_args(argv)
+
+    result = run(args.module, args.runs, args.top)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['module']}: medyan {result['wall_seconds_median'] * 1000:.1f} ms "
+              f"(min {result['wall_seconds_min'] * 1000:.1f}, max {result['wall_seconds_max'] * 1000:.1f}, {args.runs} çalıştırma)")
+        for item in result['slowest_imports']:
+            print(f"  {item['cumulative_ms']:>9.2f} ms  {item['module']}")
+        if result['loaded_lazy_modules']:
+            print(f"UYARI: başlangıçta yüklenen ağır modüller: {', '.join(result['loaded_lazy_modules'])}")
+    return 1 if result['loaded_lazy_modules'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,70 @@
+"""
+Birim testleri için ortak ayarlar
+
+Uygulama modülleri içe aktarılmadan önce ağ gerektirmeyen ortam ayarlanır:
+sahte LLM backend'i, kapalı önbellek ve kabul kontrolü, geçici SQLite.
+Önceden tanımlı ortam değişkenleri korunur. Betikli LLM yanıtları için
+make_service fixture'ı da burada tanımlıdır.
+"""
+import os
+import tempfile
+
+import pytest
+
+_defaults = {
+    'LLM_BACKEND': 'fake',
+    'FAKE_LLM_LATENCY_MS': '1',
+    'FAKE_LLM_LATENCY_SIGMA': '0',
+    'FAKE_LLM_SEED': '0',
+    'LLM_CACHE_ENABLED': 'false',
+    'LLM_TEMPLATE_FAST_PATH': 'false',
+    'ADMISSION_CONTROL_ENABLED': 'false',
+    'REFERENCE_RANGES_RELOAD_INTERVAL': '0',
+    'LOOP_LAG_INTERVAL': '0',
+    'DATABASE_URL': 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'health_analysis_tests.sqlite3'),
+}
+for _key, _value in _defaults.items():
+    os.environ.setdefault(_key, _value)
+
+# Ayarlar ortamdan okunduğu için uygulama modülleri ortamdan sonra içe aktarılır
+from app.services.llm_backends import LLMBackend  # noqa: E402
+from app.services.llm_cache import LLMResponseCache  # noqa: E402
+from app.services.llm_service import MedicalLLMService  # noqa: E402
+
+class ScriptedBackend(LLMBackend):
+    """Verilen yanıtları sırayla döndüren ve prompt'ları kaydeden sağlayıcı"""
+
+    name = 'scripted'
+
+    def __init__(self, responses):
+        super().__init__('scripted-model')
+        self.responses = list(responses)
+        self.prompts = []
+
+    @property
+    def calls(self) -> int:
+        return len(self.prompts)
+
+    async def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+@pytest.fixture
+def make_service():
+    """Yanıtları sırayla dönen ScriptedBackend ve bellek önbelleğiyle servis üretir"""
+    def factory(*responses) -> MedicalLLMService:
+        service = MedicalLLMService(backend=ScriptedBackend(responses))
+        service.response_cache = LLMResponseCache(max_size=16, ttl_seconds=60)
+        return service
+    return factory
+
+@pytest.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    """Test başına boş bir SQLite veritabanıyla init_db; sonunda kapatılır"""
+    from app.core import database
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, 'DATABASE_URL', f"sqlite:///{tmp_path / 'test.sqlite3'}")
+    assert await database.init_db()
+    yield database
+    await database.close_db()
@@ -0,0 +1,237 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.services.admission_control import AdmissionController, AdmissionRejected
+from app.services.admission_stores import (AdmissionStore, AdmissionStoreError, InMemoryAdmissionStore,
+                                           RedisAdmissionStore)
+
+@pytest.fixture(params=['memory', 'redis'])
+async def store(request):
+    if request.param == 'memory':
+        store = InMemoryAdmissionStore()
+    else:
+        store = RedisAdmissionStore(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+    yield store
+    await store.close()
+
+async def test_token_bucket_allows_burst_then_reports_wait(store):
+    for _ in range(3):
+        assert await store.take('rate:user:1', rate=1.0, burst=3) == 0
+    wait = await store.take('rate:user:1', rate=1.0, burst=3)
+    # Çağrılar arasında geçen süre kadar jeton birikmiş olabilir
+    assert 0.5 < wait <= 1.0
+    # Diğer kullanıcının kovası etkilenmez
+    assert await store.take('rate:user:2', rate=1.0, burst=3) == 0
+
+async def test_token_bucket_refills_over_time(store):
+    assert await store.take('rate:user:1', rate=50.0, burst=1) == 0
+    assert await store.take('rate:user:1', rate=50.0, burst=1) > 0
+    # Redis betiği saati 14 basamakla saklar; tam 1 jetonluk süre yuvarlamaya takılabilir
+    await asyncio.sleep(0.1)
+    assert await store.take('rate:user:1', rate=50.0, burst=1) == 0
+
+async def test_token_bucket_cost_consumes_multiple_tokens(store):
+    assert await store.take('rate:user:1', rate=1.0, burst=5, cost=4) == 0
+    wait = await store.take('rate:user:1', rate=1.0, burst=5, cost=3)
+    assert 1.9 < wait <= 2.0
+
+async def test_in_flight_limits_and_release(store):
+    assert await store.acquire_slots('u1', 2, 'global', 3) is None
+    assert await store.acquire_slots('u1', 2, 'global', 3) is None
+    assert await store.acquire_slots('u1', 2, 'global', 3) == 'user'
+    assert await store.acquire_slots('u2', 2, 'global', 3) is None
+    assert await store.acquire_slots('u3', 2, 'global', 3) == 'global'
+
+    await store.release_slots('u1', 'global')
+    assert await store.acquire_slots('u3', 2, 'global', 3) is None
+    assert await store.acquire_slots('u1', 2, 'global', 3) == 'global'
+
+async def test_release_below_zero_does_not_leave_negative_counters(store):
+    assert await store.acquire_slots('u1', 1, 'global', 1) is None
+    await store.release_slots('u1', 'global')
+    await store.release_slots('u1', 'global')
+    assert await store.acquire_slots('u1', 1, 'global', 1) is None
+    assert await store.acquire_slots('u1', 1, 'global', 1) == 'global'
+
+async def test_unreachable_redis_raises_store_error():
+    store = RedisAdmissionStore(url='redis://127.0.0.1:1/0', timeout=0.05)
+    with pytest.raises(AdmissionStoreError):
+        await store.take('rate:user:1', rate=1.0, burst=1)
+    await store.close()
+
+def make_controller(store=None, **kwargs) -> AdmissionController:
+    options = dict(rate_per_minute=600, burst=10, per_user_limit=2, global_limit=4, retry_after=2)
+    options.update(kwargs)
+    return AdmissionController(store or InMemoryAdmissionStore(), **options)
+
+async def test_controller_per_user_limit_is_429_with_retry_after():
+    controller = make_controller()
+    tickets = [await controller.acquire(1, 'blood_test') for _ in range(2)]
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(1, 'blood_test')
+    assert rejected.value.status_code == 429
+    assert rejected.value.reason == 'user_limit'
+    assert rejected.value.retry_after == 2
+
+    await controller.release(tickets[0])
+    assert await controller.acquire(1, 'blood_test') is not None
+
+async def test_controller_sheds_low_priority_first():
+    controller = make_controller(per_user_limit=10)
+    # patient_education global kapasitenin yarısını kullanabilir
+    for _ in range(2):
+        await controller.acquire(1, 'patient_education')
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(2, 'patient_education')
+    assert rejected.value.status_code == 503
+    await controller.acquire(2, 'blood_test')
+    await controller.acquire(3, 'doctor_insights')
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire(4, 'doctor_insights')
+
+async def test_controller_rate_limit_releases_slot():
+    store = InMemoryAdmissionStore()
+    controller = make_controller(store, rate_per_minute=1, burst=1)
+    ticket = await controller.acquire(1, 'blood_test')
+    await controller.release(ticket)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(1, 'blood_test')
+    assert rejected.value.reason == 'rate_limited'
+    assert rejected.value.retry_after >= 1
+    assert store.in_flight('inflight:user:1') == 0
+
+async def test_controller_fails_open_when_store_is_unavailable():
+    class BrokenStore(AdmissionStore):
+        name = 'broken'
+
+        async def take(self, *args, **kwargs):
+            raise AdmissionStoreError('bağlantı yok')
+
+        async def acquire_slots(self, *args, **kwargs):
+            raise AdmissionStoreError('bağlantı yok')
+
+        async def release_slots(self, *args, **kwargs):
+            raise AdmissionStoreError('bağlantı yok')
+
+    controller = make_controller(BrokenStore())
+    assert await controller.acquire(1, 'blood_test') is None
+    assert controller.get_stats()['store_error'] == 1
+
+async def test_controller_does_not_release_slot_it_never_acquired():
+    class TimingOutStore(InMemoryAdmissionStore):
+        async def acquire_slots(self, *args, **kwargs):
+            raise AdmissionStoreError('zaman aşımı')
+
+    store = TimingOutStore()
+    controller = make_controller(store)
+    # Başka bir isteğin tuttuğu slot
+    await InMemoryAdmissionStore.acquire_slots(store, 'inflight:user:1', 2, 'inflight:global', 4)
+    assert await controller.acquire(1, 'blood_test') is None
+    assert store.in_flight('inflight:user:1') == 1
+    assert store.in_flight('inflight:global') == 1
+
+async def test_controller_releases_slot_when_rate_store_fails():
+    class FailingTakeStore(InMemoryAdmissionStore):
+        async def take(self, *args, **kwargs):
+            raise AdmissionStoreError('zaman aşımı')
+
+    store = FailingTakeStore()
+    assert await make_controller(store).acquire(1, 'blood_test') is None
+    assert store.in_flight('inflight:user:1') == 0
+
+async def test_controller_rejects_cost_above_burst_instead_of_capping():
+    controller = make_controller(burst=3)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(1, 'blood_test', cost=4, hold_slot=False)
+    assert rejected.value.status_code == 413
+    assert rejected.value.retry_after is None
+    assert controller.get_stats()['too_large'] == 1
+    # Reddedilen istek kovadan jeton harcamaz
+    assert await controller.acquire(1, 'blood_test', cost=3, hold_slot=False) is None
+
+async def test_batch_quota_is_separate_from_request_bucket():
+    controller = make_controller(burst=2, batch_rate_per_minute=60, batch_burst=100)
+    assert await controller.acquire(1, 'blood_test', cost=100, hold_slot=False, quota='batch') is None
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(1, 'blood_test', cost=1, hold_slot=False, quota='batch')
+    assert rejected.value.reason == 'rate_limited'
+    # İstek kovası toplu kotadan etkilenmez
+    assert await controller.acquire(1, 'blood_test', cost=2, hold_slot=False) is None
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(1, 'blood_test', cost=101, hold_slot=False, quota='batch')
+    assert rejected.value.status_code == 413
+
+@pytest.fixture
+def batch_admission(monkeypatch):
+    from app.services.admission_control import admission_controller
+
+    monkeypatch.setattr(admission_controller, 'enabled', True)
+    monkeypatch.setattr(admission_controller, 'burst', 2)
+    monkeypatch.setattr(admission_controller, 'batch_burst', 500)
+    monkeypatch.setattr(admission_controller, 'store', InMemoryAdmissionStore())
+    return admission_controller
+
+PANEL = {'test_results': [{'test_name': 'Hemoglobin', 'value': 14.0, 'unit': 'g/dL'}], 'patient_info': {'age': 40}}
+
+async def post_batch(panels: int):
+    import httpx
+
+    from app.main import app
+
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        return await client.post('/api/v1/analyze/batch', json={'panels': [PANEL] * panels})
+
+async def test_batch_larger_than_request_burst_is_accepted(batch_admission):
+    response = await post_batch(20)
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 20
+    # Paneller toplu kotadan düşüldü, istek kovasında yalnızca bir jeton harcandı
+    assert await batch_admission.store.take('rate:user:1', batch_admission.rate, 2) == 0
+    assert await batch_admission.store.take('rate:user:1', batch_admission.rate, 2) > 0
+
+async def test_batch_above_max_panels_is_rejected_with_413(batch_admission, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, 'BATCH_MAX_PANELS', 5)
+    response = await post_batch(6)
+    assert response.status_code == 413
+    assert 'en fazla 5 panel' in response.json()['detail']
+
+def test_admission_control_is_off_by_default(monkeypatch):
+    from app.core.config import Settings
+
+    # Kimlik doğrulama tek bir mock kullanıcı döndürürken kullanıcı başına sınırlar tüm servise uygulanırdı
+    monkeypatch.delenv('ADMISSION_CONTROL_ENABLED', raising=False)
+    assert Settings().ADMISSION_CONTROL_ENABLED is False
+
+async def test_controller_extra_slots_stop_at_user_limit():
+    store = InMemoryAdmissionStore()
+    controller = make_controller(store, per_user_limit=3)
+    ticket = await controller.acquire(1, 'blood_test')
+    extra = await controller.acquire_extra_slots(1, 'blood_test', 7)
+    assert len(extra) == 2
+    assert store.in_flight('inflight:user:1') == 3
+    for slot in [ticket, *extra]:
+        await controller.release(slot)
+    assert store.in_flight('inflight:global') == 0
+    assert await make_controller(enabled=False).acquire_extra_slots(1, 'blood_test', 7) is None
+
+async def test_batch_concurrency_is_bounded_by_user_slots(batch_admission, monkeypatch):
+    from app.services.llm_service import llm_service
+
+    monkeypatch.setattr(batch_admission, 'per_user_limit', 3)
+    seen = []
+
+    async def analyze_blood_test_batch(panels, max_concurrency):
+        seen.append((max_concurrency, batch_admission.store.in_flight('inflight:user:1')))
+        for index in range(len(panels)):
+            yield index, {'llm_analysis': {}}
+
+    monkeypatch.setattr(llm_service, 'analyze_blood_test_batch', analyze_blood_test_batch)
+    response = await post_batch(20)
+    assert response.status_code == 200
+    # BATCH_LLM_CONCURRENCY (8) yerine kullanıcının 3 slotu
+    assert seen == [(3, 3)]
+    assert batch_admission.store.in_flight('inflight:user:1') == 0
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from app.models.database import AnalysisStatus, AnalysisType
+from app.services import analysis_job_service
+from app.services.analysis_job_service import AnalysisJobQueue, AnalysisJobStore
+from app.services.llm_backends import LLMBackend, create_llm_backend
+from app.services.llm_service import MedicalLLMService
+
+class FailingBackend(LLMBackend):
+    """Her çağrıda hata veren sağlayıcı"""
+
+    name = 'failing'
+
+    def __init__(self):
+        super().__init__('failing-model')
+
+    async def generate(self, prompt: str) -> str:
+        raise ValueError('sağlayıcı hatası')
+
+INPUT = {
+    'test_results': [{'test_name': 'Hemoglobin', 'value': 9.0, 'unit': 'g/dL'}],
+    'patient_info': {'age': 40, 'gender': 'female'},
+    'symptoms': ['yorgunluk']
+}
+
+@pytest.fixture
+async def queue():
+    queue = AnalysisJobQueue(AnalysisJobStore(), concurrency=1)
+    await queue.start()
+    yield queue
+    await queue.stop()
+
+async def run_job(queue: AnalysisJobQueue, analysis_type: str):
+    job = await queue.submit(1, analysis_type, INPUT)
+    await queue._queue.join()
+    return await queue.get_job(job['analysis_id'], 1)
+
+@pytest.mark.parametrize('analysis_type', [AnalysisType.BLOOD_TEST, AnalysisType.RISK_ASSESSMENT,
+                                           AnalysisType.DOCTOR_INSIGHTS, AnalysisType.FULL])
+async def test_fallback_result_marks_job_failed(queue, monkeypatch, analysis_type):
+    monkeypatch.setattr(analysis_job_service, 'llm_service', MedicalLLMService(backend=FailingBackend()))
+    job = await run_job(queue, analysis_type)
+    assert job['status'] == AnalysisStatus.FAILED
+    assert 'fallback' in job['error_message']
+    # İstemci yine de genel bilgilendirme yanıtını alır
+    assert job['output_data'] is not None
+    assert job['completed_at'] is not None
+
+async def test_partial_fallback_is_reported(queue, monkeypatch):
+    async def partial(input_data):
+        return {'llm_analysis': {}, 'failed_analyses': ['doctor_insights']}
+    monkeypatch.setitem(queue._handlers, AnalysisType.FULL, partial)
+    job = await run_job(queue, AnalysisType.FULL)
+    assert job['status'] == AnalysisStatus.COMPLETED_WITH_FALLBACK
+    assert 'doctor_insights' in job['error_message']
+
+async def test_successful_analysis_is_completed(queue, monkeypatch):
+    monkeypatch.setattr(analysis_job_service, 'llm_service', MedicalLLMService(backend=create_llm_backend()))
+    job = await run_job(queue, AnalysisType.BLOOD_TEST)
+    assert job['status'] == AnalysisStatus.COMPLETED
+    assert job['error_message'] is None
+    assert 'fallback' not in job['output_data']
+
+async def instant(input_data):
+    return {'llm_analysis': {}}
+
+def shared_queue(path, **kwargs) -> AnalysisJobQueue:
+    queue = AnalysisJobQueue(AnalysisJobStore(str(path)), concurrency=1, **kwargs)
+    queue._handlers = {analysis_type: instant for analysis_type in queue._handlers}
+    return queue
+
+async def test_job_is_claimed_by_a_single_owner(tmp_path):
+    store = AnalysisJobStore(str(tmp_path / 'jobs.sqlite3'))
+    job = {'analysis_id': 'a1', 'user_id': 1, 'analysis_type': AnalysisType.BLOOD_TEST, 'priority': 5,
+           'status': AnalysisStatus.PENDING, 'input_data': INPUT, 'created_at': '2024-01-01T00:00:00'}
+    await store.create(job, 'worker-a', 30)
+    # Kirası sürerken başkasının bekleyen işi alınamaz
+    assert not await store.claim('a1', 'worker-b', 30)
+    assert await store.claim('a1', 'worker-a', 30)
+    assert not await store.claim('a1', 'worker-a', 30)
+    # Kirayı kaybeden sahibin geç sonucu yazılmaz
+    assert not await store.update('a1', AnalysisStatus.COMPLETED, output_data={}, owner='worker-b')
+    assert await store.update('a1', AnalysisStatus.COMPLETED, output_data={}, owner='worker-a')
+
+async def test_running_job_of_another_process_is_not_requeued(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    first = shared_queue(path)
+    job = {'analysis_id': 'a1', 'user_id': 1, 'analysis_type': AnalysisType.BLOOD_TEST, 'priority': 5,
+           'status': AnalysisStatus.PENDING, 'input_data': INPUT, 'created_at': '2024-01-01T00:00:00'}
+    await first.store.create(job, first.owner, 30)
+    assert await first.store.claim('a1', first.owner, 30)
+
+    second = shared_queue(path)
+    await second.start()
+    await second._queue.join()
+    assert second.get_stats()['recovered'] == 0
+    stored = await second.store.get('a1')
+    assert stored['status'] == AnalysisStatus.RUNNING
+    await second.stop()
+    # Durdurulan süreç yalnızca kendi işlerini bırakır
+    assert (await second.store.get('a1'))['status'] == AnalysisStatus.RUNNING
+
+async def test_expired_job_is_taken_over_once(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    crashed = shared_queue(path, lease_seconds=0.01)
+    job = {'analysis_id': 'a1', 'user_id': 1, 'analysis_type': AnalysisType.BLOOD_TEST, 'priority': 5,
+           'status': AnalysisStatus.PENDING, 'input_data': INPUT, 'created_at': '2024-01-01T00:00:00'}
+    await crashed.store.create(job, crashed.owner, 0.01)
+    assert await crashed.store.claim('a1', crashed.owner, 0.01)
+    await asyncio.sleep(0.02)
+
+    queues = [shared_queue(path), shared_queue(path)]
+    for queue in queues:
+        await queue.start()
+    for queue in queues:
+        await queue._queue.join()
+    assert sum(queue.get_stats()['claimed'] for queue in queues) == 1
+    assert (await queues[0].store.get('a1'))['status'] == AnalysisStatus.COMPLETED
+    for queue in queues:
+        await queue.stop()
+
+async def test_jobs_are_visible_and_handed_over_across_workers(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    first, second = shared_queue(path), shared_queue(path)
+    await second.start()
+    # İlk süreç işi kaydeder ama çalıştıramadan durur
+    first._queue = asyncio.PriorityQueue()
+    job = await first.submit(1, AnalysisType.BLOOD_TEST, INPUT)
+    assert (await second.get_job(job['analysis_id'], 1))['status'] == AnalysisStatus.PENDING
+    await first.stop()
+
+    await second._recover_expired()
+    await second._queue.join()
+    assert (await second.get_job(job['analysis_id'], 1))['status'] == AnalysisStatus.COMPLETED
+    await second.stop()
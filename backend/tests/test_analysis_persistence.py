@@ -0,0 +1,171 @@
+import json
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app.core.security import MOCK_USER_ID
+from app.main import app
+from app.models.database import Analysis, AnalysisStatus, User
+from app.services.analysis_persistence_service import AnalysisWriter, build_analysis_record
+from app.services.llm_backends import LLMBackend
+from app.services.llm_service import FALLBACK_KEY
+
+def record(analysis_id: str):
+    return build_analysis_record(analysis_id, MOCK_USER_ID, 'blood_test', {'ok': True}, {'tests': []})
+
+async def count_analyses(database) -> int:
+    async with database.async_session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(Analysis))).scalar_one()
+
+async def test_init_db_seeds_mock_user(sqlite_db):
+    async with sqlite_db.async_session_factory() as session:
+        user = (await session.execute(select(User).where(User.id == MOCK_USER_ID))).scalar_one_or_none()
+    assert user is not None
+
+async def test_failed_batch_is_requeued_with_backoff(sqlite_db):
+    writer = AnalysisWriter(batch_size=10, flush_interval=1.0)
+    real_insert = writer._insert
+    calls = []
+
+    async def flaky_insert(records):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise OperationalError('INSERT', {}, ConnectionError('bağlantı koptu'))
+        await real_insert(records)
+
+    writer._insert = flaky_insert
+    for index in range(3):
+        writer.enqueue(record(f'a{index}'))
+
+    await writer.flush()
+    assert [r['analysis_id'] for r in writer._buffer] == ['a0', 'a1', 'a2']
+    assert writer.get_stats()['requeued'] == 3
+
+    # Geri çekilme süresi dolmadan yeniden denenmez
+    await writer.flush()
+    assert calls == [3]
+
+    await writer.flush(force=True)
+    assert writer._buffer == []
+    assert await count_analyses(sqlite_db) == 3
+    assert writer.get_stats()['written'] == 3
+
+async def test_bad_row_is_dropped_without_losing_batch(sqlite_db):
+    writer = AnalysisWriter(batch_size=10)
+    writer.enqueue(record('dup'))
+    await writer.flush()
+
+    for analysis_id in ('b0', 'dup', 'b1', 'b2'):
+        writer.enqueue(record(analysis_id))
+    await writer.flush()
+
+    stats = writer.get_stats()
+    assert writer._buffer == []
+    assert stats['failed'] == 1
+    assert stats['written'] == 4
+    assert await count_analyses(sqlite_db) == 4
+
+async def test_repeated_failures_fall_back_to_row_by_row(sqlite_db):
+    writer = AnalysisWriter(batch_size=10)
+    real_insert = writer._insert
+
+    async def bulk_fails(records):
+        if len(records) > 1:
+            raise OperationalError('INSERT', {}, RuntimeError('bilinmeyen hata'))
+        await real_insert(records)
+
+    writer._insert = bulk_fails
+    for index in range(3):
+        writer.enqueue(record(f'c{index}'))
+    for _ in range(3):
+        await writer.flush(force=True)
+
+    assert writer._buffer == []
+    assert await count_analyses(sqlite_db) == 3
+
+@pytest.mark.parametrize('pending', [0, 3])
+async def test_requeue_is_bounded_by_max_buffer_size(pending):
+    writer = AnalysisWriter(batch_size=10, max_buffer_size=5)
+    for index in range(pending):
+        writer.enqueue(record(f'new{index}'))
+    writer._requeue([record(f'old{index}') for index in range(4)])
+
+    assert len(writer._buffer) <= 5
+    assert [r['analysis_id'] for r in writer._buffer[:4]] == ['old0', 'old1', 'old2', 'old3']
+    assert writer.get_stats()['dropped'] == max(0, pending + 4 - 5)
+
+async def test_batch_analysis_ids_can_be_fetched():
+    panel = {'test_results': [{'test_name': 'Hemoglobin', 'value': 14.0, 'unit': 'g/dL'}], 'patient_info': {'age': 40}}
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        response = await client.post('/api/v1/analyze/batch', json={'panels': [panel, {**panel, 'panel_id': 'p2'}]})
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 2
+        for line in lines:
+            fetched = await client.get(f"/api/v1/analysis/{line['analysis_id']}")
+            assert fetched.status_code == 200
+            assert fetched.json()['analysis']['output_data'] == line['results']
+
+@pytest.mark.parametrize('path, body, analysis_type', [
+    ('/api/v1/analyze/blood-test', None, 'blood_test'),
+    ('/api/v1/analyze/risk-assessment', None, 'risk_assessment'),
+    ('/api/v1/analyze/doctor-insights', None, 'doctor_insights'),
+    ('/api/v1/analyze/full', None, 'full'),
+    ('/api/v1/analyze/patient-education', {'diagnosis': 'Anemi', 'treatment_plan': {}}, 'patient_education'),
+])
+async def test_analysis_endpoints_persist_processing_time(path, body, analysis_type):
+    panel = {'test_results': [{'test_name': 'Hemoglobin', 'value': 14.0, 'unit': 'g/dL'}], 'patient_info': {'age': 40}}
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        response = await client.post(path, json=body or panel)
+        assert response.status_code == 200
+        fetched = await client.get(f"/api/v1/analysis/{response.json()['analysis_id']}")
+    analysis = fetched.json()['analysis']
+    assert analysis['analysis_type'] == analysis_type
+    assert analysis['processing_time'] > 0
+
+async def test_record_stays_visible_while_its_batch_is_being_written(sqlite_db):
+    writer = AnalysisWriter(batch_size=10)
+    real_insert = writer._insert
+    seen = []
+
+    async def observed_insert(records):
+        seen.append(await writer.get('w1', MOCK_USER_ID))
+        await real_insert(records)
+
+    writer._insert = observed_insert
+    writer.enqueue(record('w1'))
+    await writer.flush()
+    assert seen[0] is not None and seen[0]['analysis_id'] == 'w1'
+    assert writer._inflight == []
+    assert (await writer.get('w1', MOCK_USER_ID))['analysis_id'] == 'w1'
+
+@pytest.mark.parametrize('result, status', [
+    ({'ok': True}, AnalysisStatus.COMPLETED),
+    ({'llm_analysis': {}, 'failed_analyses': ['doctor_insights']}, AnalysisStatus.COMPLETED_WITH_FALLBACK),
+    ({'llm_analysis': {}, FALLBACK_KEY: True}, AnalysisStatus.FAILED),
+])
+def test_record_status_reflects_fallback_results(result, status):
+    built = build_analysis_record('a1', MOCK_USER_ID, 'full', result, {'tests': []})
+    assert built['status'] == status
+    assert (built['error_message'] is None) == (status == AnalysisStatus.COMPLETED)
+
+async def test_batch_panel_with_fallback_result_is_failed(monkeypatch):
+    from app.services.llm_service import llm_service
+
+    class FailingBackend(LLMBackend):
+        name = 'failing'
+
+        async def generate(self, prompt: str) -> str:
+            raise ValueError('sağlayıcı hatası')
+
+    monkeypatch.setattr(llm_service, '_backend', FailingBackend('failing-model'))
+    panel = {'test_results': [{'test_name': 'Hemoglobin', 'value': 9.0, 'unit': 'g/dL'}], 'patient_info': {'age': 40}}
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        response = await client.post('/api/v1/analyze/batch', json={'panels': [panel]})
+        line = json.loads(response.text)
+        assert line['status'] == AnalysisStatus.FAILED
+        assert 'fallback' in line['error']
+        fetched = await client.get(f"/api/v1/analysis/{line['analysis_id']}")
+    assert fetched.json()['analysis']['status'] == AnalysisStatus.FAILED
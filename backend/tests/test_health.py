@@ -0,0 +1,29 @@
+import httpx
+
+from app.core.config import Settings
+from app.main import app
+from app.services.health_service import health_service
+
+def test_database_is_required_only_when_configured(monkeypatch):
+    monkeypatch.delenv('HEALTH_REQUIRE_DATABASE', raising=False)
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    assert Settings().HEALTH_REQUIRE_DATABASE is False
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://db/health_analysis')
+    assert Settings().HEALTH_REQUIRE_DATABASE is True
+    monkeypatch.setenv('HEALTH_REQUIRE_DATABASE', 'false')
+    assert Settings().HEALTH_REQUIRE_DATABASE is False
+
+async def test_health_reports_liveness_when_not_ready(monkeypatch):
+    async def not_ready():
+        return {'status': 'not_ready', 'ready': False, 'checks': {
+            'database': {'status': 'fail', 'state': 'unreachable'},
+            'event_loop': {'status': 'ok'}
+        }}
+    monkeypatch.setattr(health_service, 'readiness', not_ready)
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        health = await client.get('/health')
+        ready = await client.get('/health/ready')
+    assert health.status_code == 200
+    assert health.json()['status'] == 'healthy'
+    assert health.json()['ready'] is False
+    assert ready.status_code == 503
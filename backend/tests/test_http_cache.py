@@ -0,0 +1,187 @@
+import gzip
+import json
+
+import httpx
+import pytest
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.http_cache import accepts_gzip, cached_response, encode_payload, etag_matches
+from app.main import app
+from app.services.reference_range_service import DEFAULT_DATA_PATH, reference_range_service
+
+TESTS_URL = '/api/v1/reference-ranges/tests'
+CATEGORIES_URL = '/api/v1/reference-ranges/categories'
+RELOAD_URL = '/api/v1/reference-ranges/reload'
+
+LARGE = [{'key': f'test_{index}', 'name': 'Test', 'unit': 'mg/dL'} for index in range(50)]
+
+def make_request(**headers) -> Request:
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'path': '/',
+        'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]
+    })
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        yield client
+
+@pytest.mark.parametrize('header, expected', [
+    (None, False),
+    ('', False),
+    ('gzip', True),
+    ('deflate, gzip;q=0.5', True),
+    ('GZIP', True),
+    ('x-gzip', True),
+    ('gzip;q=0', False),
+    ('gzip;q=0.0, *', False),
+    ('br, *', True),
+    ('*;q=0', False),
+    ('identity', False),
+    ('gzip;q=abc', False),
+])
+def test_accepts_gzip(header, expected):
+    assert accepts_gzip(header) is expected
+
+@pytest.mark.parametrize('header, expected', [
+    (None, False),
+    ('', False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"abc-gzip"', True),
+    ('"other", W/"abc-gzip"', True),
+    ('"other" , "abc"', True),
+    ('*', True),
+    (' * ', True),
+    ('"other"', False),
+    ('abc', False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, ('"abc"', '"abc-gzip"', None)) is expected
+
+def test_etag_matches_ignores_missing_variants():
+    assert not etag_matches('"abc-gzip"', ('"abc"', None))
+
+def test_encode_payload_skips_gzip_for_small_bodies():
+    payload = encode_payload(['a'], gzip_min_size=512)
+
+    assert payload.gzip_body is None
+    assert payload.gzip_etag is None
+
+def test_encode_payload_is_deterministic():
+    first, second = encode_payload(LARGE, 0), encode_payload(LARGE, 0)
+
+    assert first == second
+    assert first.gzip_etag == first.etag[:-1] + '-gzip"'
+    assert json.loads(gzip.decompress(first.gzip_body)) == LARGE
+
+def test_cached_response_serves_identity_without_accept_encoding():
+    payload = encode_payload(LARGE, 0)
+
+    response = cached_response(make_request(), payload, max_age=60)
+
+    assert response.status_code == 200
+    assert response.body == payload.body
+    assert response.headers['etag'] == payload.etag
+    assert 'content-encoding' not in response.headers
+    assert response.headers['cache-control'] == 'public, max-age=60'
+    assert response.headers['vary'] == 'Accept-Encoding'
+
+def test_cached_response_serves_gzip_variant():
+    payload = encode_payload(LARGE, 0)
+
+    response = cached_response(make_request(accept_encoding='gzip'), payload, max_age=60)
+
+    assert response.status_code == 200
+    assert response.body == payload.gzip_body
+    assert response.headers['etag'] == payload.gzip_etag
+    assert response.headers['content-encoding'] == 'gzip'
+
+def test_cached_response_falls_back_to_identity_when_gzip_is_not_smaller():
+    payload = encode_payload(['a'], 0)
+
+    response = cached_response(make_request(accept_encoding='gzip'), payload, max_age=60)
+
+    assert response.body == payload.body
+    assert response.headers['etag'] == payload.etag
+    assert 'content-encoding' not in response.headers
+
+@pytest.mark.parametrize('accept_encoding', ['gzip', 'identity'])
+@pytest.mark.parametrize('variant', ['etag', 'gzip_etag'])
+def test_cached_response_returns_304_for_either_variant(accept_encoding, variant):
+    payload = encode_payload(LARGE, 0)
+
+    response = cached_response(
+        make_request(accept_encoding=accept_encoding, if_none_match=getattr(payload, variant)), payload, max_age=60
+    )
+
+    assert response.status_code == 304
+    assert response.body == b''
+    expected_etag = payload.gzip_etag if accept_encoding == 'gzip' else payload.etag
+    assert response.headers['etag'] == expected_etag
+
+def test_cached_response_returns_200_for_stale_etag():
+    payload = encode_payload(LARGE, 0)
+
+    response = cached_response(make_request(if_none_match='"stale"'), payload, max_age=60)
+
+    assert response.status_code == 200
+    assert response.body == payload.body
+
+async def test_tests_endpoint_returns_304_for_matching_etag(client):
+    first = await client.get(TESTS_URL)
+    assert first.status_code == 200
+    assert first.json() == reference_range_service.get_all_tests()
+
+    second = await client.get(TESTS_URL, headers={'If-None-Match': first.headers['etag']})
+
+    assert second.status_code == 304
+    assert second.headers['etag'] == first.headers['etag']
+    assert second.content == b''
+
+async def test_tests_endpoint_respects_gzip_q_zero(client):
+    response = await client.get(TESTS_URL, headers={'Accept-Encoding': 'gzip;q=0'})
+
+    assert response.status_code == 200
+    assert 'content-encoding' not in response.headers
+    assert not response.headers['etag'].endswith('-gzip"')
+    assert response.json() == reference_range_service.get_all_tests()
+
+async def test_tests_endpoint_serves_gzip(client):
+    response = await client.get(TESTS_URL, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['etag'].endswith('-gzip"')
+    # httpx gövdeyi açar
+    assert response.json() == reference_range_service.get_all_tests()
+
+@pytest.fixture
+def restore_reference_data():
+    yield
+    reference_range_service.reload(DEFAULT_DATA_PATH)
+
+async def test_etag_changes_after_reference_reload(client, tmp_path, monkeypatch, restore_reference_data):
+    monkeypatch.setattr(settings, 'ADMIN_API_TOKEN', 'ops-secret')
+    before = await client.get(CATEGORIES_URL)
+
+    with open(DEFAULT_DATA_PATH, encoding='utf-8') as f:
+        reference_data = json.load(f)
+    reference_data['version'] = 'etag-test'
+    reference_data['blood_tests']['extra'] = {'category': 'Ek', 'tests': {
+        'extra_test': {'name': 'Ek Test', 'unit': 'u', 'reference_ranges': {'adult': {'min': 1, 'max': 2}}}
+    }}
+    data_path = tmp_path / 'ranges.json'
+    data_path.write_text(json.dumps(reference_data), encoding='utf-8')
+    reference_range_service.data_path = str(data_path)
+
+    reload_response = await client.post(RELOAD_URL, headers={'X-Admin-Token': 'ops-secret'})
+    assert reload_response.json()['version'] == 'etag-test'
+
+    stale = await client.get(CATEGORIES_URL, headers={'If-None-Match': before.headers['etag']})
+
+    assert stale.status_code == 200
+    assert stale.headers['etag'] != before.headers['etag']
+    assert 'extra' in stale.json()
@@ -0,0 +1,80 @@
+import pytest
+
+from app.core.config import settings
+from app.services.llm_backends import FakeLLMBackend, FakeLLMError, create_llm_backend
+from app.services.llm_json import parse_analysis
+from app.services.llm_service import MedicalLLMService
+
+TEST_RESULTS = [
+    {'test_name': 'Hemoglobin', 'value': 9.0, 'unit': 'g/dL'},
+    {'test_name': 'Glukoz', 'value': 95.0, 'unit': 'mg/dL'}
+]
+PATIENT = {'age': 45, 'gender': 'female'}
+
+def prompts():
+    service = MedicalLLMService(backend=FakeLLMBackend(latency_ms=0))
+    evaluated = service._evaluate_results(TEST_RESULTS, PATIENT)
+    return {
+        'blood_test': service._create_blood_test_prompt(evaluated, PATIENT),
+        'risk_assessment': service._create_risk_assessment_prompt(evaluated, PATIENT),
+        'doctor_insights': service._create_doctor_insights_prompt(evaluated, ['yorgunluk'], PATIENT),
+        'patient_education': service._create_patient_education_prompt('Anemi', {}, 'tr'),
+    }
+
+@pytest.mark.parametrize('prompt_type, prompt', list(prompts().items()))
+async def test_fake_backend_returns_schema_valid_json_for_each_prompt_type(prompt_type, prompt):
+    backend = FakeLLMBackend(latency_ms=0)
+    assert backend.prompt_type(prompt) == prompt_type
+    parsed = parse_analysis(await backend.generate(prompt), prompt_type)
+    assert parsed.data is not None
+    assert parsed.outcome == 'ok'
+
+async def test_fake_backend_is_deterministic():
+    prompt = prompts()['blood_test']
+    first = FakeLLMBackend(latency_ms=5, latency_sigma=0.5, failure_rate=0.3, seed=7)
+    second = FakeLLMBackend(latency_ms=5, latency_sigma=0.5, failure_rate=0.3, seed=7)
+    outcomes = []
+    for backend in (first, second):
+        results = []
+        for _ in range(10):
+            try:
+                results.append(await backend.generate(prompt))
+            except FakeLLMError:
+                results.append('error')
+        outcomes.append(results)
+    assert outcomes[0] == outcomes[1]
+    assert 'error' in outcomes[0]
+    # Yanıt içeriği yalnızca prompt'a bağlıdır
+    assert {result for result in outcomes[0] if result != 'error'} == {first.build_response(prompt)}
+
+async def test_fake_backend_failures_are_retryable():
+    backend = FakeLLMBackend(latency_ms=0, failure_rate=1.0)
+    with pytest.raises(FakeLLMError) as error:
+        await backend.generate('prompt')
+    assert backend.is_retryable(error.value)
+    assert backend.get_stats() == {'calls': 1, 'failures': 1, 'malformed': 0}
+
+async def test_fake_backend_stream_matches_generate():
+    prompt = prompts()['risk_assessment']
+    backend = FakeLLMBackend(latency_ms=0, stream_chunks=5)
+    chunks = [chunk async for chunk in backend.stream(prompt)]
+    assert len(chunks) == 5
+    assert ''.join(chunks) == backend.build_response(prompt)
+
+async def test_malformed_fake_responses_are_detected():
+    prompt = prompts()['blood_test']
+    backend = FakeLLMBackend(latency_ms=0, malformed_rate=1.0, seed=3)
+    for _ in range(10):
+        response = await backend.generate(prompt)
+        assert response != backend.build_response(prompt)
+        parsed = parse_analysis(response, 'blood_test')
+        # Markdown bloğu sorunsuz ayıklanır, yarıda kesilen yanıt reddedilir
+        assert parsed.outcome == ('ok' if response.startswith('```') else 'truncated')
+    assert backend.get_stats()['malformed'] == 10
+
+def test_backend_is_selected_from_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_BACKEND', 'fake')
+    assert isinstance(create_llm_backend(), FakeLLMBackend)
+    monkeypatch.setattr(settings, 'LLM_BACKEND', 'unknown')
+    with pytest.raises(ValueError):
+        create_llm_backend()
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import json
+import sqlite3
+
+from app.core.config import settings
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_service import MedicalLLMService
+
+COMPLETE = json.dumps({
+    'genel_değerlendirme': {'genel_durum': 'dikkat'},
+    'anormal_degerler': [{'test_adi': 'Hemoglobin', 'durum': 'düşük'}],
+    'olası_hastalıklar': [],
+    'oneriler': {},
+    'hasta_mesaji': 'Doktorunuza danışın'
+}, ensure_ascii=False)
+
+async def cached(service: MedicalLLMService, prompt: str):
+    return await service.response_cache.get(
+        LLMResponseCache.make_key(prompt, service.backend.model_name, settings.LLM_TEMPERATURE))
+
+async def test_json_that_fails_schema_validation_is_not_cached(make_service):
+    invalid = json.dumps({'genel_durum': 'normal'})
+    repaired = json.dumps({'genel_değerlendirme': {'genel_durum': 'normal'}}, ensure_ascii=False)
+    complete = COMPLETE
+    service = make_service(invalid, repaired, complete)
+
+    assert (await service._generate('prompt', 'blood_test')).outcome == 'invalid'
+    assert await cached(service, 'prompt') is None
+    assert (await service._generate('prompt', 'blood_test')).outcome == 'repaired'
+    assert await cached(service, 'prompt') is None
+    assert (await service._generate('prompt', 'blood_test')).outcome == 'ok'
+    assert await cached(service, 'prompt') == complete
+    assert (await service._generate('prompt', 'blood_test')).data == json.loads(complete)
+    assert service.backend.calls == 3
+
+async def test_truncated_response_is_not_cached(make_service):
+    truncated = COMPLETE[:COMPLETE.index('anormal_degerler') + 20]
+    service = make_service(truncated, COMPLETE)
+    assert (await service._generate('prompt', 'blood_test')).outcome == 'truncated'
+    assert await cached(service, 'prompt') is None
+
+async def test_truncated_stream_is_not_cached(make_service):
+    truncated = COMPLETE[:COMPLETE.index('anormal_degerler') + 20]
+    service = make_service(truncated, COMPLETE)
+    prompt = service._create_blood_test_prompt([], {})
+    events = [event async for event in service.stream_blood_test_analysis([], {})]
+    assert service.backend.calls == 2
+    assert await cached(service, prompt) is None
+    assert events[-1][1]['llm_analysis'] == json.loads(COMPLETE)
+
+async def test_response_is_parsed_once(monkeypatch, make_service):
+    service = make_service(COMPLETE)
+    parse = service._parse_analysis_response
+    calls = []
+    monkeypatch.setattr(service, '_parse_analysis_response', lambda *args: calls.append(args) or parse(*args))
+    assert await service._resolve_analysis('prompt', await service._generate('prompt', 'blood_test'), 'blood_test') \
+        == json.loads(COMPLETE)
+    assert len(calls) == 1
+
+async def test_response_is_validated_against_its_own_prompt_type(make_service):
+    education = json.dumps({'aciklama': 'Açıklama'}, ensure_ascii=False)
+    service = make_service(education)
+    await service._generate('prompt', 'blood_test')
+    assert await cached(service, 'prompt') is None
+
+async def test_disk_lookup_counts_stats_on_the_loop_thread(tmp_path):
+    cache = LLMResponseCache(ttl_seconds=0.01, db_path=str(tmp_path / 'cache.db'))
+    await cache.set('key', 'value')
+    cache.clear()
+    assert await cache.get('key') == 'value'
+    assert cache.get_stats()['disk_hits'] == 1
+
+    await asyncio.sleep(0.02)
+    cache.clear()
+    stats = dict(cache.get_stats())
+    # Worker thread'de çalışan okuma sayaçlara dokunmaz
+    assert await asyncio.to_thread(cache._disk_get, 'key', 10 ** 12) == (None, True)
+    assert cache.get_stats() == stats
+
+    await cache.set('key', 'value')
+    cache.clear()
+    await asyncio.sleep(0.02)
+    assert await cache.get('key') is None
+    assert cache.get_stats()['expired'] == 1
+
+def disk_keys(path):
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT key FROM llm_cache"))
+
+async def test_disk_writes_prune_expired_rows(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = LLMResponseCache(ttl_seconds=0.01, db_path=path)
+    await cache.set('old', 'value')
+    await asyncio.sleep(0.02)
+    cache.ttl_seconds = 60
+
+    await cache.set('new', 'value')
+
+    assert disk_keys(path) == ['new']
+    cache.close()
+
+async def test_disk_store_reuses_one_connection_until_closed(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = LLMResponseCache(db_path=path)
+    conn = cache._conn
+    for index in range(5):
+        await cache.set(f'key{index}', 'value')
+        cache.clear()
+        assert await cache.get(f'key{index}') == 'value'
+    assert cache._conn is conn
+
+    cache.close()
+    assert cache._conn is None
+    # Kapatıldıktan sonra ilk erişim yeni bağlantı açar
+    cache.clear()
+    assert await cache.get('key0') == 'value'
+    assert cache._conn is not None
+    cache.close()
@@ -0,0 +1,74 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.llm_backends import LLMBackend
+from app.services.llm_service import MedicalLLMService
+
+class GatedBackend(LLMBackend):
+    """gate açılana kadar yanıt vermeyen sağlayıcı; aynı anda çalışan çağrıları sayar"""
+
+    name = 'gated'
+
+    def __init__(self):
+        super().__init__('gated-model')
+        self.gate = asyncio.Event()
+        self.running = 0
+        self.max_running = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.gate.wait()
+            return prompt
+        finally:
+            self.running -= 1
+
+async def wait_until(condition, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.001)
+
+async def test_llm_calls_are_bounded_and_counted(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_MAX_CONCURRENCY', 2)
+    backend = GatedBackend()
+    service = MedicalLLMService(backend=backend)
+
+    calls = [asyncio.ensure_future(service._call_llm(f'prompt {i}')) for i in range(5)]
+    await wait_until(lambda: service.get_concurrency_stats()['queue_depth'] == 3)
+    stats = service.get_concurrency_stats()
+    assert stats['in_flight'] == 2
+    assert stats['max_concurrency'] == 2
+
+    backend.gate.set()
+    assert await asyncio.gather(*calls) == [f'prompt {i}' for i in range(5)]
+    assert backend.max_running == 2
+    stats = service.get_concurrency_stats()
+    assert stats['in_flight'] == 0 and stats['queue_depth'] == 0
+
+async def test_waiting_llm_calls_do_not_block_the_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_MAX_CONCURRENCY', 1)
+    backend = GatedBackend()
+    service = MedicalLLMService(backend=backend)
+    calls = [asyncio.ensure_future(service._call_llm(f'prompt {i}')) for i in range(3)]
+    await wait_until(lambda: backend.running == 1)
+
+    # LLM çağrıları sürerken diğer işler gecikmeden çalışır
+    start = asyncio.get_running_loop().time()
+    await asyncio.sleep(0.01)
+    assert asyncio.get_running_loop().time() - start < 0.5
+
+    backend.gate.set()
+    await asyncio.gather(*calls)
+
+async def test_concurrent_identical_prompts_share_one_generation():
+    backend = GatedBackend()
+    service = MedicalLLMService(backend=backend)
+    calls = [asyncio.ensure_future(service._generate('aynı prompt', 'blood_test')) for _ in range(4)]
+    await wait_until(lambda: backend.running == 1)
+    backend.gate.set()
+    results = await asyncio.gather(*calls)
+    assert all(result is results[0] for result in results)
+    assert backend.max_running == 1
+    assert service.get_concurrency_stats()['coalesced_requests'] == 3
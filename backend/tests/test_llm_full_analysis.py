@@ -0,0 +1,73 @@
+import httpx
+import pytest
+
+from app.main import app
+from app.models.database import AnalysisStatus
+from app.services.llm_backends import FakeLLMBackend
+from app.services.llm_service import FALLBACK_KEY, MedicalLLMService, analysis_outcome, is_fallback_response
+
+TESTS = [{'test_name': 'hemoglobin', 'value': 9.0}, {'test_name': 'glucose_fasting', 'value': 130}]
+PATIENT = {'age': 40, 'gender': 'male'}
+
+class PartlyFailingBackend(FakeLLMBackend):
+    """Verilen prompt türlerinde hata fırlatan sahte sağlayıcı"""
+
+    def __init__(self, failing_types):
+        super().__init__(latency_ms=0)
+        self.failing_types = set(failing_types)
+
+    async def generate(self, prompt: str) -> str:
+        if self.prompt_type(prompt) in self.failing_types:
+            # Yeniden denenmeyen hata; devre kesici eşiğine takılmaz
+            raise ValueError('sağlayıcı hatası')
+        return await super().generate(prompt)
+
+async def analyze(*failing_types):
+    service = MedicalLLMService(backend=PartlyFailingBackend(failing_types))
+    return await service.analyze_full(TESTS, ['yorgunluk'], PATIENT)
+
+async def test_full_analysis_without_failures():
+    response = await analyze()
+
+    assert response['failed_analyses'] == []
+    assert FALLBACK_KEY not in response
+    assert analysis_outcome(response) == (AnalysisStatus.COMPLETED, None)
+
+@pytest.mark.parametrize('failing', [
+    ('doctor_insights',),
+    ('blood_test', 'risk_assessment'),
+])
+async def test_partial_failure_lists_failed_branches_without_fallback_flag(failing):
+    response = await analyze(*failing)
+
+    assert sorted(response['failed_analyses']) == sorted(failing)
+    assert FALLBACK_KEY not in response
+    assert not is_fallback_response(response)
+    status, error_message = analysis_outcome(response)
+    assert status == AnalysisStatus.COMPLETED_WITH_FALLBACK
+    assert all(name in error_message for name in failing)
+    # Başarılı dallar gerçek LLM yanıtıdır
+    if 'doctor_insights' not in failing:
+        assert 'differential_diagnosis' in response['doctor_insights']
+
+async def test_all_branches_failing_marks_response_as_fallback():
+    response = await analyze('blood_test', 'risk_assessment', 'doctor_insights')
+
+    assert sorted(response['failed_analyses']) == ['blood_test', 'doctor_insights', 'risk_assessment']
+    assert response[FALLBACK_KEY] is True
+    assert analysis_outcome(response)[0] == AnalysisStatus.FAILED
+
+async def test_full_endpoint_reports_partial_status(monkeypatch):
+    from app.services.llm_service import llm_service
+
+    monkeypatch.setattr(llm_service, '_backend', PartlyFailingBackend({'risk_assessment'}))
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        response = await client.post('/api/v1/analyze/full', json={
+            'test_results': [{'test_name': 'Hemoglobin', 'value': 9.0, 'unit': 'g/dL'}],
+            'patient_info': {'age': 40}
+        })
+
+    body = response.json()
+    assert body['status'] == 'partial'
+    assert body['analysis']['failed_analyses'] == ['risk_assessment']
+    assert FALLBACK_KEY not in body['analysis']
@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.llm_json import (IncrementalJSONParser, LLMResponseParseError, extract_json, parse_analysis,
+                                   reask_instruction)
+
+ANALYSIS = {
+    'genel_değerlendirme': {'genel_durum': 'dikkat', 'ozet': 'Hafif anemi, "demir" eksikliği olası'},
+    'anormal_degerler': [{'test': 'Hemoglobin', 'durum': 'düşük'}, {'test': 'Ferritin', 'durum': 'düşük'}],
+    'olası_hastalıklar': [],
+    'oneriler': {'yasam_tarzi': ['Demirden zengin beslenme']},
+    'hasta_mesaji': 'Doktorunuza danışın'
+}
+TEXT = json.dumps(ANALYSIS, ensure_ascii=False)
+
+def test_markdown_fence_and_surrounding_text_are_ignored():
+    wrapped = f"İşte analiz:\n```json\n{TEXT}\n```\nBaşka sorunuz varsa yazın {{}}"
+    assert extract_json(wrapped) == (ANALYSIS, False)
+    assert parse_analysis(wrapped, 'blood_test') == (ANALYSIS, 'ok', [])
+
+def test_truncated_inside_string_is_closed():
+    cut = TEXT.index('Doktorunuza') + 5
+    data, repaired = extract_json(TEXT[:cut])
+    assert repaired
+    assert data['hasta_mesaji'] == 'Dokto'
+    assert data['anormal_degerler'] == ANALYSIS['anormal_degerler']
+
+def test_truncated_after_comma_drops_the_incomplete_member():
+    cut = TEXT.index('{"test": "Ferritin"')
+    data, repaired = extract_json(TEXT[:cut])
+    assert repaired
+    assert data == {'genel_değerlendirme': ANALYSIS['genel_değerlendirme'],
+                    'anormal_degerler': [{'test': 'Hemoglobin', 'durum': 'düşük'}]}
+
+def test_truncated_inside_key_falls_back_to_last_complete_value():
+    cut = TEXT.index('"oneriler"') + 4
+    data, repaired = extract_json(TEXT[:cut])
+    assert repaired
+    assert 'oneriler' not in data
+    assert data['olası_hastalıklar'] == []
+
+def test_repair_can_be_disabled():
+    assert extract_json(TEXT[:-10], repair=False) == (None, False)
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 17])
+@pytest.mark.parametrize('text', [f"```json\n{TEXT}\n```", TEXT[:len(TEXT) // 2]])
+def test_chunked_feed_matches_whole_text(text, chunk_size):
+    parser = IncrementalJSONParser()
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    assert parser.value() == extract_json(text)
+    assert parser.complete != parser.truncated
+
+def test_feed_stops_after_the_object_closes():
+    parser = IncrementalJSONParser()
+    assert not parser.feed('{"a": [1, ')
+    assert parser.feed('2]}')
+    assert parser.feed(' sonra gelen metin {')
+    assert parser.value() == ({'a': [1, 2]}, False)
+
+def test_missing_required_key_is_invalid():
+    parsed = parse_analysis(json.dumps({'genel_durum': 'normal'}), 'blood_test')
+    assert parsed == (None, 'invalid', ['genel_değerlendirme'])
+    assert 'genel_değerlendirme' in reask_instruction(parsed)
+
+def test_required_key_with_wrong_type_is_invalid():
+    parsed = parse_analysis(json.dumps({'aciklama': ['liste']}), 'patient_education')
+    assert parsed.outcome == 'invalid'
+    assert parsed.problems == ['aciklama']
+
+def test_truncated_before_required_key_is_truncated():
+    parsed = parse_analysis('{"genel_değerlendirme": ', 'blood_test')
+    assert parsed.data is None
+    assert parsed.outcome == 'truncated'
+
+@pytest.mark.parametrize('cut', [
+    TEXT.index('"anormal_degerler"') + len('"anormal_degerler":'),
+    TEXT.index('{"test": "Ferritin"'),
+    TEXT.index('Ferritin'),
+    len(TEXT) - 1
+])
+def test_truncated_response_produces_no_data(cut):
+    # Kapatılan liste anormal değerleri eksik gösterebilir; onarılmış yanıt kullanılmaz
+    assert parse_analysis(TEXT[:cut], 'blood_test') == (None, 'truncated', [])
+
+async def test_truncated_response_is_reasked(monkeypatch, make_service):
+    monkeypatch.setattr(settings, 'LLM_PARSE_REASK', True)
+    service = make_service(TEXT[:TEXT.index('Ferritin')], TEXT)
+    assert await service._resolve_analysis('prompt', await service._generate('prompt', 'blood_test'), 'blood_test') == ANALYSIS
+    assert 'yarıda kesildi' in service.backend.prompts[1]
+
+def test_missing_optional_keys_are_filled():
+    parsed = parse_analysis(json.dumps({'aciklama': 'Açıklama'}), 'patient_education')
+    assert parsed.outcome == 'repaired'
+    assert parsed.data == {'aciklama': 'Açıklama', 'onemli_bulgular': '', 'oneriler': ''}
+
+@pytest.mark.parametrize('text', ['', 'Üzgünüm, yardımcı olamıyorum.', '[1, 2, 3]'])
+def test_non_json_is_not_json(text):
+    assert parse_analysis(text, 'blood_test') == (None, 'not_json', [])
+
+async def test_invalid_response_is_reasked_once(monkeypatch, make_service):
+    monkeypatch.setattr(settings, 'LLM_PARSE_REASK', True)
+    service = make_service(json.dumps({'genel_durum': 'normal'}), TEXT)
+    assert await service._resolve_analysis('prompt', await service._generate('prompt', 'blood_test'), 'blood_test') == ANALYSIS
+    assert len(service.backend.prompts) == 2
+    assert service.backend.prompts[1].startswith('prompt')
+    assert 'genel_değerlendirme' in service.backend.prompts[1]
+
+async def test_second_invalid_response_raises(monkeypatch, make_service):
+    monkeypatch.setattr(settings, 'LLM_PARSE_REASK', True)
+    service = make_service('JSON değil', 'yine JSON değil')
+    with pytest.raises(LLMResponseParseError):
+        await service._resolve_analysis('prompt', await service._generate('prompt', 'blood_test'), 'blood_test')
+    assert len(service.backend.prompts) == 2
+
+async def test_reask_can_be_disabled(monkeypatch, make_service):
+    monkeypatch.setattr(settings, 'LLM_PARSE_REASK', False)
+    service = make_service('JSON değil')
+    with pytest.raises(LLMResponseParseError):
+        await service._resolve_analysis('prompt', await service._generate('prompt', 'blood_test'), 'blood_test')
+    assert len(service.backend.prompts) == 1
@@ -0,0 +1,82 @@
+import pytest
+
+from app.services.llm_prompts import PromptBudgetError, PromptBuilder
+
+PATIENT = {'age': 40, 'gender': 'female'}
+
+def result(name, status, value=1.0):
+    return {'test_name': name, 'value': value, 'unit': 'mg/dL',
+            'evaluation': {'status': status, 'reference_range': '1 - 2'}}
+
+# Satırlar bütçe notundan uzun olsun; her adım prompt'u gerçekten kısaltır
+RESULTS = [
+    result('Sodyum', 'normal'),
+    result('Ferritin (serum demir deposu göstergesi)', 'low'),
+    result('Potasyum', 'normal'),
+    result('Klorür', 'normal'),
+    result('Kalsiyum', 'normal'),
+    result('Glukoz (açlık plazma glukozu ölçümü)', 'critical_high'),
+    result('Alanin Aminotransferaz (ALT) serum aktivitesi', 'high'),
+]
+FIXED = PromptBuilder.static_prefix('blood_test') + "Hasta: yaş 40, cinsiyet female, test türü genel\n"
+
+def build(budget, normal_results='full'):
+    # Karakter sayısı token sayacı yerine geçer
+    builder = PromptBuilder(count_tokens=len, normal_results=normal_results, token_budget=budget)
+    return builder.blood_test(RESULTS, PATIENT)
+
+def prompt_length(normal_results):
+    return len(build(0, normal_results))
+
+def test_unlimited_budget_lists_abnormal_results_first():
+    prompt = build(0)
+
+    lines = [line for line in prompt.splitlines() if line.startswith('- ')]
+    assert [line.split(' ')[1].rstrip(':') for line in lines] == [
+        'Glukoz', 'Ferritin', 'Alanin', 'Sodyum', 'Potasyum', 'Klorür', 'Kalsiyum'
+    ]
+
+def test_full_mode_is_kept_when_it_fits():
+    prompt = build(prompt_length('full'))
+
+    assert '- Sodyum: 1.0 mg/dL; 1 - 2; normal' in prompt
+
+def test_falls_back_to_aggregated_normal_results():
+    prompt = build(prompt_length('full') - 1)
+
+    assert prompt == build(0, 'aggregate')
+    assert 'Normal aralıkta (4): Sodyum, Potasyum, Klorür, Kalsiyum' in prompt
+    assert '- Glukoz (' in prompt
+
+def test_falls_back_to_omitting_normal_results():
+    prompt = build(prompt_length('aggregate') - 1)
+
+    assert prompt == build(0, 'omit')
+    assert 'Normal aralıkta: 4 test (listelenmedi)' in prompt
+    assert 'Sodyum' not in prompt
+    assert '- Alanin' in prompt
+
+def test_drops_lowest_priority_abnormal_lines_last():
+    prompt = build(prompt_length('omit') - 1)
+
+    assert '- Glukoz (' in prompt
+    assert '- Ferritin (' in prompt
+    assert '- Alanin' not in prompt
+    assert '(+1 düşük öncelikli anormal sonuç bütçe nedeniyle listelenmedi)' in prompt
+    assert len(prompt) <= prompt_length('omit') - 1
+
+def test_returns_fixed_part_when_no_result_line_fits():
+    prompt = build(len(FIXED))
+
+    assert prompt == FIXED
+
+def test_raises_when_fixed_part_does_not_fit():
+    builder = PromptBuilder(count_tokens=len, token_budget=len(FIXED) - 1)
+
+    with pytest.raises(PromptBudgetError):
+        builder.blood_test(RESULTS, PATIENT)
+
+def test_starts_from_configured_normal_mode():
+    prompt = build(prompt_length('full'), normal_results='omit')
+
+    assert 'Normal aralıkta: 4 test (listelenmedi)' in prompt
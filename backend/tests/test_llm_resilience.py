@@ -0,0 +1,247 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services.llm_backends import LLMBackend
+from app.services.llm_resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+from app.services.llm_service import MedicalLLMService
+
+class HangingBackend(LLMBackend):
+    """Hiç yanıt vermeyen sağlayıcı"""
+
+    name = 'hanging'
+
+    def __init__(self):
+        super().__init__('hanging-model')
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(3600)
+
+def make_caller(**kwargs) -> ResilientCaller:
+    breaker = CircuitBreaker(min_calls=kwargs.pop('min_calls', 3), window_size=kwargs.pop('window_size', 3),
+                             open_seconds=kwargs.pop('open_seconds', 30))
+    return ResilientCaller(breaker, base_delay=0.001, max_delay=0.002, **kwargs)
+
+def test_asyncio_timeout_is_retryable():
+    backend = LLMBackend('model')
+    assert backend.is_retryable(asyncio.TimeoutError())
+    assert backend.is_retryable(ConnectionResetError())
+    assert not backend.is_retryable(ValueError())
+
+async def test_timeouts_are_retried_and_open_the_circuit(monkeypatch):
+    monkeypatch.setattr(settings, 'LLM_CALL_TIMEOUT', 0.01)
+    backend = HangingBackend()
+    service = MedicalLLMService(backend=backend)
+    service.resilience = make_caller(max_attempts=3)
+
+    for _ in range(3):
+        with pytest.raises(asyncio.TimeoutError):
+            await service._call_llm('prompt')
+    assert backend.calls == 9
+    assert service.resilience.breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        await service._call_llm('prompt')
+    assert backend.calls == 9
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure(breaker.before_call())
+    assert breaker.state == 'open'
+
+def test_late_result_of_call_admitted_before_opening_does_not_change_half_open_state():
+    breaker = CircuitBreaker(min_calls=3, window_size=3, open_seconds=0)
+    late = breaker.before_call()
+    open_breaker(breaker)
+
+    probe = breaker.before_call()
+    assert probe and breaker.state == 'half_open'
+    # Devre açılmadan önce başlamış çağrının geç gelen başarısı
+    breaker.record_success(late)
+    assert breaker.state == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_failure(probe)
+    assert breaker.state == 'open'
+
+def test_probe_success_closes_and_ignored_probe_allows_another():
+    breaker = CircuitBreaker(min_calls=3, window_size=3, open_seconds=0)
+    open_breaker(breaker)
+
+    probe = breaker.before_call()
+    breaker.record_ignored(probe)
+    assert breaker.state == 'half_open'
+
+    probe = breaker.before_call()
+    breaker.record_success(probe)
+    assert breaker.state == 'closed'
+    assert breaker.failure_rate() == 0.0
+
+def retryable(error: BaseException) -> bool:
+    return isinstance(error, ConnectionError)
+
+def test_breaker_opens_above_threshold_and_half_opens_after_open_seconds():
+    breaker = CircuitBreaker(failure_threshold=0.5, window_size=4, min_calls=4, open_seconds=0.05)
+    states = []
+    breaker.on_state_change = states.append
+    for success in (True, False, True):
+        (breaker.record_success if success else breaker.record_failure)(breaker.before_call())
+    # min_calls dolmadan devre açılmaz
+    assert breaker.state == 'closed'
+    breaker.record_failure(breaker.before_call())
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.get_stats()['rejected'] == 1
+
+    time.sleep(0.06)
+    assert breaker.before_call()
+    assert breaker.state == 'half_open'
+    assert states == ['open', 'half_open']
+
+def test_failure_rate_below_threshold_keeps_breaker_closed():
+    breaker = CircuitBreaker(failure_threshold=0.5, window_size=10, min_calls=4)
+    for index in range(20):
+        probe = breaker.before_call()
+        # Her dört çağrıdan biri başarısız
+        (breaker.record_failure if index % 4 == 3 else breaker.record_success)(probe)
+    assert breaker.state == 'closed'
+    assert 0 < breaker.failure_rate() < 0.5
+    assert breaker.get_stats()['opened'] == 0
+
+async def test_transient_error_is_retried_then_succeeds():
+    caller = make_caller(max_attempts=3)
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionResetError('bağlantı koptu')
+        return 'yanıt'
+
+    assert await caller.call(operation, retryable, 'test') == 'yanıt'
+    assert len(calls) == 2
+    assert caller.get_stats()['retries'] == 1
+    # Kurtarılan hata devreye başarı olarak işlenir
+    assert caller.breaker.failure_rate() == 0.0
+
+async def test_non_retryable_error_is_raised_without_retry():
+    caller = make_caller(max_attempts=3)
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        raise ValueError('geçersiz istek')
+
+    with pytest.raises(ValueError):
+        await caller.call(operation, retryable, 'test')
+    assert len(calls) == 1
+    assert caller.get_stats()['retries'] == 0
+    assert caller.breaker.get_stats()['window_calls'] == 0
+
+def test_backoff_is_bounded_full_jitter():
+    caller = ResilientCaller(CircuitBreaker(), base_delay=0.5, max_delay=4.0, rng=random.Random(1))
+    for attempt in range(8):
+        cap = min(4.0, 0.5 * 2 ** attempt)
+        delays = [caller.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= cap for delay in delays)
+        # Jitter tüm aralığa yayılır
+        assert max(delays) > cap * 0.8 and min(delays) < cap * 0.2
+
+def make_hedging_caller() -> ResilientCaller:
+    caller = make_caller(hedge_enabled=True, hedge_min_delay=0.01)
+    for _ in range(caller.latency.min_samples):
+        caller.latency.observe(0.01)
+    return caller
+
+async def test_hedge_wins_against_slow_primary_and_primary_is_cancelled():
+    caller = make_hedging_caller()
+    cancelled = []
+
+    async def operation():
+        index = len(cancelled)
+        cancelled.append(False)
+        try:
+            await asyncio.sleep(3600 if index == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled[index] = True
+            raise
+        return f"yanıt-{index}"
+
+    assert await caller.call(operation, retryable, 'test') == 'yanıt-1'
+    await asyncio.sleep(0)
+    assert cancelled == [True, False]
+    stats = caller.get_stats()
+    assert stats['hedges'] == 1 and stats['hedges_won'] == 1
+
+async def test_hedge_is_not_launched_when_not_allowed():
+    caller = make_hedging_caller()
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        await asyncio.sleep(0.03)
+        return 'yanıt'
+
+    assert await caller.call(operation, retryable, 'test', can_hedge=lambda: False) == 'yanıt'
+    assert len(calls) == 1
+    assert caller.get_stats()['hedges'] == 0
+
+async def test_external_cancellation_cancels_primary_and_hedge():
+    caller = make_hedging_caller()
+    started = asyncio.Event()
+    cancelled = []
+
+    async def operation():
+        cancelled.append(False)
+        index = len(cancelled) - 1
+        if index == 1:
+            started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled[index] = True
+            raise
+
+    task = asyncio.create_task(caller.call(operation, retryable, 'test'))
+    await asyncio.wait_for(started.wait(), 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+    assert cancelled == [True, True]
+    assert caller.breaker.get_stats()['window_calls'] == 0
+
+async def test_stream_is_retried_before_but_not_after_the_first_chunk():
+    caller = make_caller(max_attempts=3)
+    opened = []
+
+    async def failing_before_first_chunk():
+        opened.append(1)
+        if len(opened) == 1:
+            raise ConnectionResetError('bağlantı koptu')
+        yield 'a'
+        yield 'b'
+
+    assert [chunk async for chunk in caller.stream(failing_before_first_chunk, retryable, 'test')] == ['a', 'b']
+    assert len(opened) == 2
+
+    opened.clear()
+    received = []
+
+    async def failing_after_first_chunk():
+        opened.append(1)
+        yield 'a'
+        raise ConnectionResetError('bağlantı koptu')
+
+    with pytest.raises(ConnectionResetError):
+        async for chunk in caller.stream(failing_after_first_chunk, retryable, 'test'):
+            received.append(chunk)
+    assert received == ['a']
+    assert len(opened) == 1
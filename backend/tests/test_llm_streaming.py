@@ -0,0 +1,62 @@
+import json
+
+import httpx
+
+from app.main import app
+from app.services.llm_backends import LLMBackend
+
+STREAM_URL = '/api/v1/analyze/blood-test/stream'
+PANEL = {'test_results': [{'test_name': 'Hemoglobin', 'value': 9.0, 'unit': 'g/dL'}], 'patient_info': {'age': 40}}
+
+class BrokenStreamBackend(LLMBackend):
+    """Birkaç parça gönderdikten sonra kopan akış"""
+
+    name = 'broken-stream'
+
+    async def stream(self, prompt: str):
+        yield '{"genel_değerlendirme": '
+        raise ValueError('bağlantı koptu')
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+async def stream_events():
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        response = await client.post(STREAM_URL, json=PANEL)
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    return parse_events(response.text)
+
+def event_names(events):
+    """Ardışık 'token' olaylarını tek ada indirger"""
+    names = []
+    for name, _ in events:
+        if not (name == 'token' and names and names[-1] == 'token'):
+            names.append(name)
+    return names
+
+async def test_stream_sends_evaluation_tokens_analysis_then_done():
+    events = await stream_events()
+
+    assert event_names(events) == ['evaluation', 'token', 'analysis', 'done']
+    evaluation = events[0][1]
+    assert evaluation['test_evaluations'][0]['evaluation']['status'] == 'low'
+    streamed = ''.join(data for name, data in events if name == 'token')
+    analysis = events[-2][1]['llm_analysis']
+    assert json.loads(streamed)['genel_değerlendirme'] == analysis['genel_değerlendirme']
+    assert events[-1] == ('done', {})
+
+async def test_stream_failure_sends_error_then_fallback_analysis(monkeypatch):
+    from app.services.llm_service import FALLBACK_KEY, llm_service
+
+    monkeypatch.setattr(llm_service, '_backend', BrokenStreamBackend('broken-model'))
+
+    events = await stream_events()
+
+    assert event_names(events) == ['evaluation', 'token', 'error', 'analysis', 'done']
+    assert dict(events)['error'] == {'message': 'LLM analizi tamamlanamadı'}
+    assert dict(events)['analysis']['llm_analysis'][FALLBACK_KEY] is True
@@ -0,0 +1,140 @@
+import pytest
+
+from app.services.llm_backends import FakeLLMBackend
+from app.services.llm_service import MedicalLLMService
+from app.services.llm_templates import TemplateResponder
+
+def result(status, value, low=10.0, high=20.0, name='Test'):
+    return {
+        'test_name': name,
+        'value': value,
+        'evaluation': {
+            'status': status,
+            'value': value,
+            'reference_min': low,
+            'reference_max': high,
+            'reference_range': f"{low} - {high}"
+        }
+    }
+
+NORMAL = result('normal', 15.0)
+
+class RecordingBackend(FakeLLMBackend):
+    """Çağrılan prompt türlerini kaydeden sahte sağlayıcı"""
+
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.prompt_types = []
+
+    async def generate(self, prompt: str) -> str:
+        self.prompt_types.append(self.prompt_type(prompt))
+        return await super().generate(prompt)
+
+def test_all_normal_panel_matches_with_no_mild_results():
+    responder = TemplateResponder(max_abnormal=0)
+
+    assert responder.match([NORMAL, NORMAL], 'blood_test') == []
+    assert responder.get_stats()['hits'] == 1
+
+def test_empty_panel_goes_to_llm():
+    responder = TemplateResponder(max_abnormal=3)
+
+    assert responder.match([], 'blood_test') is None
+    assert responder.get_stats() == {'enabled': True, 'hits': 0, 'misses': 1, 'hit_rate': 0.0}
+
+def test_disabled_responder_never_matches_or_counts():
+    responder = TemplateResponder(enabled=False)
+
+    assert responder.match([NORMAL], 'blood_test') is None
+    assert responder.get_stats()['misses'] == 0
+
+@pytest.mark.parametrize('status', ['critical_low', 'critical_high', 'unknown', 'error'])
+def test_critical_and_unevaluated_results_go_to_llm(status):
+    responder = TemplateResponder(max_abnormal=5, max_deviation=10.0)
+
+    assert responder.match([NORMAL, result(status, 15.0)], 'blood_test') is None
+
+def test_max_abnormal_limits_mild_results():
+    mild = [result('low', 9.5), result('high', 20.5)]
+
+    assert TemplateResponder(max_abnormal=0).match([NORMAL, mild[0]], 'blood_test') is None
+    assert TemplateResponder(max_abnormal=1).match([NORMAL, *mild], 'blood_test') is None
+    assert TemplateResponder(max_abnormal=2).match([NORMAL, *mild], 'blood_test') == mild
+
+@pytest.mark.parametrize('value, expected', [
+    (9.0, True),    # alt sınırdan tam %10 sapma
+    (8.9, False),
+    (21.0, True),   # üst sınırdan tam %10 sapma
+    (21.1, False),
+])
+def test_max_deviation_is_relative_to_range_width(value, expected):
+    responder = TemplateResponder(max_abnormal=1, max_deviation=0.1)
+    status = 'low' if value < 10 else 'high'
+
+    matched = responder.match([result(status, value)], 'blood_test')
+
+    assert (matched is not None) is expected
+
+@pytest.mark.parametrize('low, high, value', [
+    (None, 20.0, 9.5),
+    (10.0, None, 9.5),
+    (10.0, 20.0, None),
+    (10.0, 10.0, 9.9),   # genişliği olmayan aralık
+])
+def test_missing_or_degenerate_bounds_are_not_mild(low, high, value):
+    responder = TemplateResponder(max_abnormal=1, max_deviation=1.0)
+
+    assert responder.match([result('low', value, low, high)], 'blood_test') is None
+
+def test_templates_list_mild_results_in_llm_schema():
+    mild = [result('low', 9.5, name='Hemoglobin')]
+    evaluated = [NORMAL, *mild]
+
+    blood_test = TemplateResponder.blood_test(evaluated, mild)
+    risk = TemplateResponder.risk_assessment(evaluated, mild)
+
+    assert blood_test['template_generated'] is True
+    assert blood_test['genel_değerlendirme']['genel_durum'] == 'dikkat'
+    assert blood_test['anormal_degerler'] == [{
+        'test_adi': 'Hemoglobin',
+        'deger': '9.5',
+        'normal_aralik': '10.0 - 20.0',
+        'durum': 'düşük',
+        'aciklama': 'Referans sınırına yakın hafif sapma; tek başına klinik önem taşımayabilir'
+    }]
+    assert risk['template_generated'] is True
+    assert risk['genel_risk_değerlendirmesi']['genel_durum'] == 'düşük_risk'
+    assert risk['genel_risk_puani'] == 5
+    assert TemplateResponder.blood_test([NORMAL], [])['genel_değerlendirme']['genel_durum'] == 'normal'
+
+def make_service(max_abnormal=1):
+    backend = RecordingBackend()
+    service = MedicalLLMService(backend=backend)
+    service.template_responder = TemplateResponder(max_abnormal=max_abnormal, max_deviation=0.1)
+    return service, backend
+
+PATIENT = {'age': 40, 'gender': 'male'}
+
+async def test_analyze_full_templates_only_blood_test_and_risk():
+    service, backend = make_service()
+    # Hemoglobin 13.5 - 17.5: 13.2 hafif düşük
+    tests = [{'test_name': 'hemoglobin', 'value': 13.2}, {'test_name': 'glucose_fasting', 'value': 90}]
+
+    response = await service.analyze_full(tests, ['yorgunluk'], PATIENT)
+
+    assert backend.prompt_types == ['doctor_insights']
+    assert response['llm_analysis']['template_generated'] is True
+    assert response['risk_assessment']['template_generated'] is True
+    assert 'template_generated' not in response['doctor_insights']
+    assert response['failed_analyses'] == []
+
+async def test_analyze_full_calls_llm_for_every_branch_when_panel_does_not_match():
+    service, backend = make_service()
+    # 12.9 sınırdan %10'dan fazla sapıyor
+    tests = [{'test_name': 'hemoglobin', 'value': 12.9}, {'test_name': 'glucose_fasting', 'value': 90}]
+
+    response = await service.analyze_full(tests, [], PATIENT)
+
+    assert sorted(backend.prompt_types) == ['blood_test', 'doctor_insights', 'risk_assessment']
+    assert 'template_generated' not in response['llm_analysis']
+    assert 'template_generated' not in response['risk_assessment']
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import time
+
+from app.core.loop_monitor import LoopLagMonitor, LoopMonitorMiddleware
+
+def blocking_handler(seconds: float):
+    """Loop'u bloklayan senkron çağrı (yığın izinde görünmesi beklenir)"""
+    time.sleep(seconds)
+
+async def test_watchdog_reports_blocking_call_and_active_requests(caplog):
+    monitor = LoopLagMonitor(interval=0, block_threshold=0.05)
+    caplog.set_level(logging.WARNING, logger='app.core.loop_monitor')
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        monitor.request_started(1, 'POST /api/v1/analyze/full')
+        blocking_handler(0.3)
+        monitor.request_finished(1)
+        # Bloklama bitince pong toplam süreyi loglar
+        await asyncio.sleep(0.1)
+    finally:
+        await monitor.stop()
+
+    messages = [record.getMessage() for record in caplog.records]
+    reports = [message for message in messages if "yanıt vermiyor" in message]
+    assert len(reports) == 1
+    assert 'POST /api/v1/analyze/full' in reports[0]
+    assert 'blocking_handler' in reports[0]
+    assert 'time.sleep(seconds)' in reports[0]
+    assert any(message.startswith('Event loop') and message.endswith('sn bloklandı') for message in messages)
+
+    stats = monitor.get_stats()
+    assert stats['blocks'] == 1
+    assert stats['longest_block_ms'] >= 250
+    assert stats['block_detection'] is False
+
+async def test_watchdog_stays_quiet_on_a_healthy_loop(caplog):
+    monitor = LoopLagMonitor(interval=0, block_threshold=0.1)
+    caplog.set_level(logging.WARNING, logger='app.core.loop_monitor')
+    monitor.start()
+    try:
+        for _ in range(30):
+            await asyncio.sleep(0.01)
+    finally:
+        await monitor.stop()
+
+    assert not caplog.records
+    assert monitor.get_stats()['blocks'] == 0
+
+async def test_middleware_tracks_requests_while_they_run():
+    monitor = LoopLagMonitor(interval=0)
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(dict(monitor._active_requests))
+
+    await LoopMonitorMiddleware(app, monitor)({'type': 'http', 'method': 'GET', 'path': '/health'}, None, None)
+
+    assert [name for name, _ in seen[0].values()] == ['GET /health']
+    assert monitor._active_requests == {}
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import httpx
+
+from app.main import app
+
+async def test_metrics_endpoint_exposes_prometheus_text():
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        await client.get('/health/live')
+        response = await client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'http_request_duration_seconds_bucket{' in response.text
+    assert '# TYPE llm_circuit_state gauge' in response.text
+
+def run_worker(code: str, multiproc_dir) -> str:
+    env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(multiproc_dir)}
+    result = subprocess.run([sys.executable, '-c', f"from app.core import metrics\n{code}"], check=True,
+                            capture_output=True, text=True, env=env)
+    return result.stdout
+
+def test_multiprocess_mode_aggregates_all_workers(tmp_path):
+    increment = "metrics.LLM_RETRIES.labels(backend='fake').inc(2)"
+    run_worker(increment, tmp_path)
+    run_worker(increment, tmp_path)
+    text = run_worker("print(metrics.render().decode())", tmp_path)
+    assert 'llm_retries_total{backend="fake"} 4.0' in text
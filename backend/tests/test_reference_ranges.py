@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from app.services.reference_range_service import (
+    DEFAULT_DATA_PATH,
+    ReferenceDataSet,
+    ReferenceRangeService,
+    status_message,
+)
+
+GENDERS = ('male', 'female', None, '', 'F', 'other', 'Male')
+# Yaş grubu sınırları ve tablonun dışındaki yaşlar
+AGES = (0, 1, 2, 3, 6, 7, 12, 13, 18, 19, 40, 64, 65, 66, 120, 121, 150)
+
+@pytest.fixture(scope='module')
+def service():
+    return ReferenceRangeService(data_path=DEFAULT_DATA_PATH)
+
+def _test_names(data: ReferenceDataSet):
+    """Asıl anahtarlar, görünen adlar, kısaltmalar ve bilinmeyen testler"""
+    names = ['bilinmeyen_test', 'Glukoz X', '']
+    for category_data in data.reference_data['blood_tests'].values():
+        for test_key, test_data in category_data['tests'].items():
+            names.append(test_key)
+            names.append(test_key.upper().replace('_', ' '))
+            names.append(test_data['name'])
+            if '(' in test_data['name']:
+                names.append(test_data['name'].rsplit('(', 1)[1].rstrip(')'))
+    return names
+
+def _random_rows(service, count, seed=0):
+    rng = random.Random(seed)
+    data = service._data
+    names = _test_names(data)
+    rows = []
+    for _ in range(count):
+        test_name = rng.choice(names)
+        age = rng.choice(AGES) if rng.random() < 0.5 else rng.randint(0, 100)
+        gender = rng.choice(GENDERS)
+        range_data = data.resolve_range(test_name, data.get_age_group(age), gender) if data.contains(test_name) else None
+        if range_data is None:
+            value = rng.uniform(0, 200)
+        else:
+            bounds = [range_data['reference_range']['min'], range_data['reference_range']['max']]
+            bounds += [bound for bound in (range_data['critical_low'], range_data['critical_high']) if bound is not None]
+            # Sınır değerlerinin kendisi ve çevresi
+            value = rng.choice(bounds) if rng.random() < 0.3 else rng.uniform(min(bounds) * 0.5, max(bounds) * 1.5 + 1)
+        rows.append((test_name, float(value), age, gender))
+    return rows
+
+def test_evaluate_many_matches_evaluate_test_result(service):
+    rows = _random_rows(service, 5000)
+    test_names, values, ages, genders = zip(*rows)
+
+    records = service.evaluate_many(test_names, values, ages, genders).to_records()
+
+    expected = [service.evaluate_test_result(*row) for row in rows]
+    assert records == expected
+    statuses = {record['status'] for record in records}
+    assert statuses == {'unknown', 'normal', 'low', 'high', 'critical_low', 'critical_high'}
+
+def test_evaluate_many_broadcasts_scalar_age_and_gender(service):
+    rows = _random_rows(service, 200, seed=1)
+    test_names, values = [row[0] for row in rows], [row[1] for row in rows]
+
+    records = service.evaluate_many(test_names, values, 70, 'female').to_records()
+
+    assert records == [service.evaluate_test_result(name, value, 70, 'female') for name, value in zip(test_names, values)]
+
+def test_status_message_covers_every_status():
+    assert status_message('normal', 5, 1, 10) == "Değer normal aralıkta (1 - 10)"
+    assert status_message('low', 0, 1, 10) == "Değer normal aralığın altında (Normal: 1 - 10)"
+    assert status_message('critical_high', 99, 1, 10) == "Değer kritik seviyenin üstünde!"
+    assert status_message('unknown', 5, 1, 10) == "Değer değerlendirilemedi"
+
+def test_index_resolves_keys_names_and_abbreviations(service):
+    data = service._data
+
+    assert data.resolve_test_key('hemoglobin') == 'hemoglobin'
+    assert data.resolve_test_key(' Hemoglobin ') == 'hemoglobin'
+    assert data.resolve_test_key('Hemoglobin (Hb)') == 'hemoglobin'
+    assert data.resolve_test_key('Hb') == 'hemoglobin'
+    assert data.resolve_test_key('bilinmeyen_test') is None
+    assert not data.contains('bilinmeyen_test')
+
+def test_index_prefers_test_keys_over_aliases():
+    reference_data = {
+        'age_groups': {'adult': {'min': 18, 'max': 65}},
+        'blood_tests': {
+            'a': {'category': 'A', 'tests': {
+                'alpha': {'name': 'Alpha', 'unit': 'u', 'aliases': ['beta'],
+                          'reference_ranges': {'adult': {'min': 1, 'max': 2}}},
+            }},
+            'b': {'category': 'B', 'tests': {
+                'beta': {'name': 'Beta', 'unit': 'u',
+                         'reference_ranges': {'adult': {'min': 3, 'max': 4}}},
+            }},
+        },
+    }
+    data = ReferenceDataSet(reference_data, version='test')
+
+    assert data.resolve_test_key('beta') == 'beta'
+    assert data.resolve_range('beta', 'adult', None)['reference_range'] == {'min': 3, 'max': 4}
+
+def test_age_group_table_matches_scan(service):
+    data = service._data
+    for age in range(-2, 130):
+        assert data.get_age_group(age) == data.scan_age_group(age)
+
+def test_range_table_matches_direct_selection(service):
+    data = service._data
+    for category_data in data.reference_data['blood_tests'].values():
+        for test_key, test_data in category_data['tests'].items():
+            reference_ranges = test_data['reference_ranges']
+            for age_group in list(data.reference_data['age_groups']) + ['adult']:
+                for gender in GENDERS:
+                    expected = ReferenceDataSet._select_range(reference_ranges, gender, age_group)
+                    resolved = data.resolve_range(test_key, age_group, gender)
+                    assert resolved['reference_range'] == expected
+                    assert resolved['test_name'] == test_data['name']
+                    assert resolved['category'] == category_data['category']
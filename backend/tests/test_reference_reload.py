@@ -0,0 +1,25 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.main import app
+
+RELOAD_URL = '/api/v1/reference-ranges/reload'
+
+@pytest.fixture
+async def client():
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        yield client
+
+async def test_reload_is_disabled_without_admin_token(client, monkeypatch):
+    monkeypatch.setattr(settings, 'ADMIN_API_TOKEN', '')
+    response = await client.post(RELOAD_URL, headers={'X-Admin-Token': ''})
+    assert response.status_code == 403
+
+async def test_reload_requires_matching_admin_token(client, monkeypatch):
+    monkeypatch.setattr(settings, 'ADMIN_API_TOKEN', 'ops-secret')
+    assert (await client.post(RELOAD_URL)).status_code == 401
+    assert (await client.post(RELOAD_URL, headers={'X-Admin-Token': 'wrong'})).status_code == 401
+    response = await client.post(RELOAD_URL, headers={'X-Admin-Token': 'ops-secret'})
+    assert response.status_code == 200
+    assert response.json()['status'] == 'success'
@@ -0,0 +1,124 @@
+import copy
+import os
+
+import pytest
+
+from app.services.reference_range_service import (
+    DEFAULT_DATA_PATH,
+    ReferenceDataSet,
+    ReferenceRangeService,
+    load_reference_data_set,
+)
+from app.services.reference_snapshot import MAGIC, SnapshotDataSet, build_snapshot, is_snapshot_file
+
+GENDERS = ('male', 'female', None, 'other')
+AGES = (0, 1, 4, 10, 15, 18, 40, 65, 90, 130)
+
+@pytest.fixture(scope='module')
+def json_data():
+    return load_reference_data_set(DEFAULT_DATA_PATH)
+
+@pytest.fixture
+def snapshot_path(tmp_path, json_data):
+    path = str(tmp_path / 'ranges.snapshot')
+    build_snapshot(json_data, path)
+    return path
+
+def _rows(data):
+    """Tüm testler için aralık sınırlarında ve dışında değerler"""
+    rows = []
+    for category_data in data.reference_data['blood_tests'].values():
+        for test_key, test_data in category_data['tests'].items():
+            for age in AGES:
+                for gender in GENDERS:
+                    bounds = data.resolve_range(test_key, data.get_age_group(age), gender)['reference_range']
+                    for value in (bounds['min'] - 1, bounds['min'], bounds['max'], bounds['max'] + 1):
+                        rows.append((test_key, float(value), age, gender))
+            rows.append((test_data['name'], 1.0, 40, None))
+    rows.append(('bilinmeyen_test', 1.0, 40, None))
+    return rows
+
+def test_snapshot_roundtrip_matches_json(json_data, snapshot_path):
+    json_service = ReferenceRangeService(data_path=DEFAULT_DATA_PATH)
+    snapshot_service = ReferenceRangeService(data_path=snapshot_path)
+
+    assert is_snapshot_file(snapshot_path)
+    assert isinstance(snapshot_service._data, SnapshotDataSet)
+    assert snapshot_service.version == json_service.version
+    assert snapshot_service.get_all_tests() == json_service.get_all_tests()
+
+    rows = _rows(json_data)
+    assert [snapshot_service.evaluate_test_result(*row) for row in rows] == [
+        json_service.evaluate_test_result(*row) for row in rows
+    ]
+    columns = list(zip(*rows))
+    assert snapshot_service.evaluate_many(*columns).to_records() == json_service.evaluate_many(*columns).to_records()
+
+def test_snapshot_keeps_integer_bounds(snapshot_path):
+    reference_data = {
+        'age_groups': {'adult': {'min': 18, 'max': 65}},
+        'blood_tests': {'a': {'category': 'A', 'tests': {
+            'alpha': {'name': 'Alpha', 'unit': 'u', 'critical_high': 9,
+                      'reference_ranges': {'adult': {'min': 1, 'max': 2.5}}},
+        }}},
+    }
+    build_snapshot(ReferenceDataSet(reference_data, version='types'), snapshot_path)
+    snapshot = load_reference_data_set(snapshot_path)
+
+    range_data = snapshot.resolve_range('alpha', 'adult', None)
+
+    assert range_data['reference_range'] == {'min': 1, 'max': 2.5}
+    assert type(range_data['reference_range']['min']) is int
+    assert type(range_data['reference_range']['max']) is float
+    assert type(range_data['critical_high']) is int
+    assert range_data['critical_low'] is None
+
+def test_reload_picks_up_swapped_snapshot(json_data, snapshot_path):
+    service = ReferenceRangeService(data_path=snapshot_path)
+    before = service.evaluate_test_result('glucose_fasting', 95, 40)
+    assert service.reload_if_changed() is None
+
+    reference_data = copy.deepcopy(json_data.reference_data)
+    reference_data['blood_tests']['biochemistry']['tests']['glucose_fasting']['reference_ranges']['adult'] = {
+        'min': 100, 'max': 120
+    }
+    build_snapshot(ReferenceDataSet(reference_data, version='swapped'), snapshot_path)
+    # Aynı saniye içinde yazılan dosya da yeni imza ile görülsün
+    stat = os.stat(snapshot_path)
+    os.utime(snapshot_path, (stat.st_atime, stat.st_mtime + 5))
+
+    result = service.reload_if_changed()
+
+    assert result['previous_version'] == json_data.version
+    assert result['version'] == 'swapped'
+    assert before['status'] == 'normal'
+    after = service.evaluate_test_result('glucose_fasting', 95, 40)
+    assert after['status'] == 'low'
+    assert after['reference_version'] == 'swapped'
+
+def test_bad_magic_is_rejected(tmp_path, snapshot_path):
+    with open(snapshot_path, 'rb') as f:
+        payload = f.read()
+    corrupt_path = str(tmp_path / 'corrupt.snapshot')
+    with open(corrupt_path, 'wb') as f:
+        f.write(b'RRSNAP99' + payload[len(MAGIC):])
+
+    assert not is_snapshot_file(corrupt_path)
+    with pytest.raises(ValueError):
+        SnapshotDataSet(corrupt_path)
+    with pytest.raises(ValueError):
+        load_reference_data_set(corrupt_path)
+
+def test_reload_keeps_current_version_when_snapshot_is_corrupt(json_data, snapshot_path):
+    service = ReferenceRangeService(data_path=snapshot_path)
+    with open(snapshot_path, 'rb') as f:
+        payload = f.read()
+    with open(f"{snapshot_path}.tmp", 'wb') as f:
+        f.write(b'XXXXXXXX' + payload[len(MAGIC):])
+    os.replace(f"{snapshot_path}.tmp", snapshot_path)
+    stat = os.stat(snapshot_path)
+    os.utime(snapshot_path, (stat.st_atime, stat.st_mtime + 5))
+
+    assert service.reload_if_changed() is None
+    assert service.version == json_data.version
+    assert service.evaluate_test_result('glucose_fasting', 95, 40)['status'] == 'normal'
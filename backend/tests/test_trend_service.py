@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.models import database as models
+from app.services.trend_service import TrendService
+
+async def test_record_updates_incremental_summary(sqlite_db):
+    service = TrendService()
+    await service.record_test_results(1, [{'test_name': 'Hemoglobin', 'value': 12.0, 'test_date': '2024-01-01'}])
+    await service.record_test_results(1, [{'test_name': 'hemoglobin', 'value': 15.0, 'test_date': '2024-01-11'}])
+    trends = await service.get_patient_trends(1)
+    assert len(trends) == 1
+    assert trends[0]['result_count'] == 2
+    assert trends[0]['delta'] == 3.0
+    assert abs(trends[0]['slope'] - 0.3) < 1e-9
+
+async def test_concurrently_created_summary_is_retried_as_update(sqlite_db, monkeypatch):
+    service = TrendService()
+    # Başka bir istek özet satırını bu işlem kilitlemeden önce oluşturmuş olsun
+    await service.record_test_results(1, [{'test_name': 'Hemoglobin', 'value': 12.0, 'test_date': '2024-01-01'}])
+
+    lock_summaries = TrendService._lock_summaries
+    calls = []
+
+    async def racing_lock(session, patient_id, keys):
+        calls.append(keys)
+        if len(calls) == 1:
+            return {}
+        return await lock_summaries(session, patient_id, keys)
+
+    monkeypatch.setattr(TrendService, '_lock_summaries', staticmethod(racing_lock))
+    recorded = await service.record_test_results(1, [{'test_name': 'Hemoglobin', 'value': 15.0,
+                                                      'test_date': datetime(2024, 1, 11)}])
+    assert recorded == 1
+    assert len(calls) == 2
+
+    async with sqlite_db.async_session_factory() as session:
+        summaries = (await session.execute(select(models.TestTrendSummary))).scalars().all()
+    assert len(summaries) == 1
+    assert summaries[0].result_count == 2
+    history = await service.get_test_history(1, 'Hemoglobin')
+    # İlk denemenin sonuçları geri alındı; sonuç bir kez kaydedildi
+    assert [item['value'] for item in history] == [15.0, 12.0]